@@ -4,16 +4,21 @@ import os
 import importlib
 from pathlib import Path
 
+from .utils import metrics, node_manifest
+
 # 节点映射
 NODE_CLASS_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS = {}
+# 节点名 -> 导入该节点的模块（用于生成按需加载清单）
+NODE_MODULES = {}
 
 def auto_register_nodes():
-    """自动扫描并注册 nodes 目录下的所有节点"""
+    """自动扫描并注册 nodes 目录下的所有节点，返回加载失败的模块列表"""
     nodes_dir = Path(__file__).parent / "nodes"
+    failures = []
     
     if not nodes_dir.exists():
-        return
+        return failures
     
     # 直接加载根级别的模块（script_generator.py, sora2.py）
     for node_file in nodes_dir.glob("*.py"):
@@ -27,8 +32,10 @@ def auto_register_nodes():
             name_map = getattr(mod, "NODE_DISPLAY_NAME_MAPPINGS", {})
             NODE_CLASS_MAPPINGS.update(cls_map)
             NODE_DISPLAY_NAME_MAPPINGS.update(name_map)
+            NODE_MODULES.update(dict.fromkeys(cls_map, module_path))
             print(f"[ComfyUI_KuAi_Power] Loaded {len(cls_map)} nodes from {node_file.stem}")
         except Exception as e:
+            failures.append(module_path)
             print(f"[ComfyUI_KuAi_Power] Failed to load {node_file.name}: {e}")
     
     # 遍历子目录（脚本生成, NanoBanana, Sora2）
@@ -46,8 +53,10 @@ def auto_register_nodes():
                 name_map = getattr(mod, "NODE_DISPLAY_NAME_MAPPINGS", {})
                 NODE_CLASS_MAPPINGS.update(cls_map)
                 NODE_DISPLAY_NAME_MAPPINGS.update(name_map)
+                NODE_MODULES.update(dict.fromkeys(cls_map, module_path))
                 print(f"[ComfyUI_KuAi_Power] Loaded {len(cls_map)} nodes from {category_dir.name}")
             except Exception as e:
+                failures.append(module_path)
                 print(f"[ComfyUI_KuAi_Power] Failed to load {category_dir.name}: {e}")
                 import traceback
                 traceback.print_exc()
@@ -70,12 +79,68 @@ def auto_register_nodes():
                             NODE_CLASS_MAPPINGS[attr_name] = attr
                             display_name = attr_name
                             NODE_DISPLAY_NAME_MAPPINGS[attr_name] = display_name
+                            NODE_MODULES[attr_name] = module_path
                             print(f"[ComfyUI_KuAi_Power] Auto-registered: {attr_name}")
                 except Exception as e:
+                    failures.append(module_path)
                     print(f"[ComfyUI_KuAi_Power] Failed to load {node_file.name}: {e}")
 
+    return failures
+
+def lazy_register_nodes():
+    """按清单注册代理节点，真实模块在节点第一次执行时导入；清单不可用时返回 False"""
+    manifest = node_manifest.load_manifest(Path(__file__).parent)
+    if manifest is None:
+        return False
+
+    loader = node_manifest.ModuleLoader(__name__)
+    for name, entry in manifest["nodes"].items():
+        NODE_CLASS_MAPPINGS[name] = node_manifest.make_proxy(name, entry, loader.load)
+        NODE_DISPLAY_NAME_MAPPINGS[name] = entry["display_name"]
+        NODE_MODULES[name] = entry["module"]
+
+    # 上次导入失败的模块（如缺少依赖）每次启动重新尝试，成功后写回清单
+    failed = []
+    for module_path in manifest.get("failed", []):
+        try:
+            mod = importlib.import_module(module_path, package=__name__)
+        except Exception as e:
+            failed.append(module_path)
+            print(f"[ComfyUI_KuAi_Power] Failed to load {module_path.lstrip('.')}: {e}")
+            continue
+        cls_map = getattr(mod, "NODE_CLASS_MAPPINGS", {})
+        NODE_CLASS_MAPPINGS.update(cls_map)
+        NODE_DISPLAY_NAME_MAPPINGS.update(getattr(mod, "NODE_DISPLAY_NAME_MAPPINGS", {}))
+        NODE_MODULES.update(dict.fromkeys(cls_map, module_path))
+        print(f"[ComfyUI_KuAi_Power] Loaded {len(cls_map)} nodes from {module_path.lstrip('.')}")
+    if failed != manifest.get("failed", []):
+        save_manifest(failed)
+    return True
+
+def save_manifest(failed):
+    try:
+        node_manifest.save_manifest(node_manifest.build_manifest(
+            Path(__file__).parent, NODE_CLASS_MAPPINGS, NODE_MODULES, NODE_DISPLAY_NAME_MAPPINGS, failed))
+    except Exception as e:
+        print(f"[ComfyUI_KuAi_Power] 节点清单写入失败: {e}")
+
+def register_nodes():
+    """注册节点：优先使用按需加载清单，否则完整导入并生成清单"""
+    if not node_manifest.lazy_enabled():
+        auto_register_nodes()
+        return False
+    if lazy_register_nodes():
+        return True
+
+    save_manifest(auto_register_nodes())
+    return False
+
 # 自动注册所有节点
-auto_register_nodes()
+LAZY_LOADED = register_nodes()
+
+# 指标导出：ComfyUI 中注册 /kuai/metrics（Prometheus）与 /kuai/metrics.json，配置 KUAI_METRICS_FILE 时定期写文件
+metrics.register_routes()
+metrics.start_file_exporter()
 
 # 前端扩展
 WEB_DIRECTORY = "./web"
@@ -83,5 +148,8 @@ WEB_DIRECTORY = "./web"
 # 导出
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
 
-print(f"[ComfyUI_KuAi_Power] Total loaded: {len(NODE_CLASS_MAPPINGS)} nodes")
-print(f"[ComfyUI_KuAi_Power] Nodes: {list(NODE_CLASS_MAPPINGS.keys())}")
+if LAZY_LOADED:
+    print(f"[ComfyUI_KuAi_Power] Total loaded: {len(NODE_CLASS_MAPPINGS)} nodes (按需加载)")
+else:
+    print(f"[ComfyUI_KuAi_Power] Total loaded: {len(NODE_CLASS_MAPPINGS)} nodes")
+    print(f"[ComfyUI_KuAi_Power] Nodes: {list(NODE_CLASS_MAPPINGS.keys())}")
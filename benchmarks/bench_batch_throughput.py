@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""批量处理吞吐基准：用离线模拟服务器（mock_api.py）驱动批量处理器，测量端到端吞吐
+
+每个场景启动一个新的模拟服务器，生成 N 行 CSV，经 CSV 句柄交给真实的批量处理节点
+（api_base 指向模拟服务器，等待完成并下载媒体），统计：
+
+- 吞吐：完成行数 / 总耗时，折算为 行/小时
+- 行耗时 p50 / p95：客户端处理单行的耗时（限流等待、重试、提交、轮询，不含后台下载）
+- HTTP：各接口调用次数、状态码分布、服务端耗时 p50 / p95（含注入的延迟）
+
+限流与重试沿用插件配置（RATE_LIMIT_RPM、HTTP_RETRY 等环境变量），结果反映真实设置下的表现；
+--rpm 可临时覆盖 RATE_LIMIT_RPM。nanobanana 场景需要 torch，缺少时跳过。
+
+用法:
+    python benchmarks/bench_batch_throughput.py [--scenarios sora2,grok,nanobanana] [--rows 20]
+        [--in-flight 4] [--latency 0.05] [--render-seconds 3] [--rate-limit-rate 0.05]
+        [--failure-rate 0.02] [--rpm 0] [--json 结果.json] [--verbose]
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from dataclasses import asdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+PACKAGE = "ComfyUI_KuAi_Power"
+sys.path.insert(0, BENCH_DIR)
+
+from mock_api import MockApiServer, MockConfig, percentile  # noqa: E402
+
+
+def _sora2_rows(n):
+    return [{"prompt": f"第 {i} 个镜头：海边日落", "model": "sora-2", "duration_sora2": "10",
+             "output_prefix": f"sora_{i:04d}"} for i in range(1, n + 1)]
+
+
+def _grok_rows(n):
+    return [{"prompt": f"第 {i} 个镜头：城市夜景", "aspect_ratio": "3:2", "size": "720P",
+             "output_prefix": f"grok_{i:04d}"} for i in range(1, n + 1)]
+
+
+def _nanobanana_rows(n):
+    return [{"task_type": "generate", "prompt": f"第 {i} 张：一只橘猫", "model_name": "gemini-2.5-flash-image",
+             "seed": str(i), "output_prefix": f"nano_{i:04d}"} for i in range(1, n + 1)]
+
+
+# 场景: (模块, 类, 生成 CSV 行, 处理器参数, 判断单行是否完成)
+SCENARIOS = {
+    "sora2": ("nodes.Sora2.batch_processor", "Sora2BatchProcessor", _sora2_rows,
+              lambda a: dict(wait_for_completion=True, poll_interval=a.poll_interval, max_wait_time=a.max_wait,
+                             max_in_flight=a.in_flight, download_media=True),
+              lambda info: info.get("final_status") == "completed"),
+    "grok": ("nodes.Grok.batch_processor", "GrokBatchProcessor", _grok_rows,
+             lambda a: dict(wait_for_completion=True, poll_interval=a.poll_interval, max_wait_time=a.max_wait,
+                            download_media=True),
+             lambda info: info.get("status") == "completed"),
+    "nanobanana": ("nodes.NanoBanana.batch_processor", "NanoBananaBatchProcessor", _nanobanana_rows,
+                   lambda a: dict(max_in_flight=a.in_flight),
+                   lambda info: True),
+}
+
+
+def import_package():
+    """以包的形式注册插件目录（不执行顶层 __init__.py，避免注册全部节点）"""
+    if PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PACKAGE)
+        pkg.__path__ = [ROOT]
+        sys.modules[PACKAGE] = pkg
+    return importlib.import_module(f"{PACKAGE}.utils.batch_tasks")
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def time_rows(processor, done):
+    """包装 _process_single_task，记录每行的客户端耗时与是否完成"""
+    original = processor._process_single_task
+    rows, lock = [], threading.Lock()
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = original(*args, **kwargs)
+            ok = done(result) if isinstance(result, dict) else True
+            return result
+        finally:
+            with lock:
+                rows.append((time.perf_counter() - started, ok))
+
+    processor._process_single_task = timed
+    return rows
+
+
+def run_scenario(name, args, config, batch_tasks):
+    module_name, class_name, make_rows, make_kwargs, done = SCENARIOS[name]
+    try:
+        module = importlib.import_module(f"{PACKAGE}.{module_name}")
+    except ImportError as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+
+    processor = getattr(module, class_name)()
+    row_times = time_rows(processor, done)
+
+    with tempfile.TemporaryDirectory() as work, MockApiServer(config) as server:
+        csv_path = os.path.join(work, f"{name}.csv")
+        write_csv(csv_path, make_rows(args.rows))
+        handle = batch_tasks.make_handle(csv_path)
+        kwargs = dict(make_kwargs(args), api_key="mock-key", api_base=server.base_url,
+                      output_dir=os.path.join(work, "output"), resume=False)
+
+        log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        error = None
+        started = time.perf_counter()
+        with log:
+            try:
+                processor.process_batch(handle, **kwargs)
+            except Exception as e:
+                error = str(e)
+        wall = time.perf_counter() - started
+        stats = server.stats()
+
+    durations = [seconds for seconds, _ in row_times]
+    completed = sum(1 for _, ok in row_times if ok)
+    return {
+        "rows": args.rows,
+        "completed": completed,
+        "wall_seconds": wall,
+        "rows_per_hour": completed / wall * 3600 if wall > 0 else 0.0,
+        "row_p50": percentile(durations, 0.5),
+        "row_p95": percentile(durations, 0.95),
+        "http_calls": stats["total_calls"],
+        "calls": stats["calls"],
+        "statuses": stats["statuses"],
+        "http_latency": stats["latency"],
+        "error": error,
+    }
+
+
+def print_result(name, result):
+    if "skipped" in result:
+        print(f"\n{name}: 跳过（{result['skipped']}）")
+        return
+    print(f"\n{name}: {result['completed']}/{result['rows']} 行完成，耗时 {result['wall_seconds']:.1f}s，"
+          f"{result['rows_per_hour']:.0f} 行/小时")
+    print(f"  行耗时 p50 {result['row_p50']:.2f}s / p95 {result['row_p95']:.2f}s，"
+          f"HTTP 调用 {result['http_calls']} 次（每行 {result['http_calls'] / max(1, result['rows']):.1f} 次）")
+    if result["error"]:
+        print(f"  ❌ {result['error']}")
+    print(f"  {'接口':<48}{'次数':>6}{'p50':>10}{'p95':>10}  状态码")
+    for endpoint, count in sorted(result["calls"].items()):
+        latency = result["http_latency"].get(endpoint, {})
+        codes = ", ".join(f"{key.rsplit(' ', 1)[1]}×{n}" for key, n in sorted(result["statuses"].items())
+                          if key.rsplit(" ", 1)[0] == endpoint)
+        print(f"  {endpoint:<48}{count:>6}{latency.get('p50', 0) * 1000:>8.1f}ms"
+              f"{latency.get('p95', 0) * 1000:>8.1f}ms  {codes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument("--rows", type=int, default=20, help="每个场景的 CSV 行数")
+    parser.add_argument("--in-flight", type=int, default=4, help="支持并发的处理器同时处理的行数")
+    parser.add_argument("--poll-interval", type=int, default=1, help="视频任务轮询间隔（秒）")
+    parser.add_argument("--max-wait", type=int, default=120, help="单个视频任务最长等待（秒）")
+    parser.add_argument("--rpm", type=float, default=None, help="覆盖 RATE_LIMIT_RPM（0 表示不限流）")
+    defaults = MockConfig(render_seconds=3.0)
+    for name, value in asdict(defaults).items():
+        if name != "seed":
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value,
+                                help="模拟服务器参数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default="", help="把结果写入 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="显示批量处理器的日志")
+    args = parser.parse_args()
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in names if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}（可选 {', '.join(SCENARIOS)}）")
+
+    # 插件缓存（渲染耗时统计、结果缓存、下载索引）放在临时目录，不影响本机数据
+    cache = tempfile.TemporaryDirectory()
+    os.environ["KUAI_CACHE_DIR"] = cache.name
+    if not args.verbose:
+        os.environ.setdefault("KUAI_LOG_LEVEL", "ERROR")
+    if args.rpm is not None:
+        os.environ["RATE_LIMIT_RPM"] = f"{args.rpm:g}"
+    batch_tasks = import_package()
+    settings = importlib.import_module(f"{PACKAGE}.config").settings
+
+    config = MockConfig(**{name: getattr(args, name) for name in asdict(defaults)})
+    print(f"模拟服务器: {json.dumps(asdict(config), ensure_ascii=False)}")
+    print(f"插件配置: RATE_LIMIT_RPM={settings.RATE_LIMIT_RPM:g} RATE_LIMIT_BURST={settings.RATE_LIMIT_BURST} "
+          f"HTTP_RETRY={settings.HTTP_RETRY}")
+
+    results = {}
+    try:
+        for name in names:
+            results[name] = run_scenario(name, args, config, batch_tasks)
+            print_result(name, results[name])
+    finally:
+        cache.cleanup()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": asdict(config), "results": results}, f, ensure_ascii=False, indent=2)
+    return 1 if any(r.get("error") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""IMAGE ↔ 图片转换微基准：对比旧写法与 utils.image_convert 的耗时和峰值内存
+
+用法:
+    python benchmarks/bench_image_convert.py [--width 3840] [--height 2160] [--batch 4] [--repeat 3]
+
+峰值内存由 tracemalloc 统计（numpy 的数组分配会被计入）。
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import image_convert
+
+
+def legacy_to_uint8(images):
+    return np.clip(images * 255.0, 0, 255).astype(np.uint8)
+
+
+def legacy_decode(data):
+    pil_image = Image.open(io.BytesIO(data)).convert("RGB")
+    return (np.array(pil_image).astype(np.float32) / 255.0)[None,]
+
+
+def measure(fn, *args, repeat=3):
+    """返回 (最短耗时秒, 峰值新增内存字节, 结果)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+        result = None
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    result = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak - base, result
+
+
+def report(name, legacy, new, output_bytes):
+    (t_old, m_old, _), (t_new, m_new, _) = legacy, new
+    mb = 1024 * 1024
+    print(f"\n{name}")
+    print(f"  旧写法:   {t_old * 1000:8.1f} ms   峰值 {m_old / mb:8.1f} MB")
+    print(f"  新实现:   {t_new * 1000:8.1f} ms   峰值 {m_new / mb:8.1f} MB")
+    print(f"  输出本身: {output_bytes / mb:8.1f} MB；"
+          f"临时内存节省 {(m_old - m_new) / mb:.1f} MB，速度 {t_old / max(t_new, 1e-9):.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IMAGE 转换微基准")
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = rng.random((args.batch, args.height, args.width, 3), dtype=np.float32)
+    print(f"输入: [{args.batch}, {args.height}, {args.width}, 3] float32，"
+          f"{images.nbytes / 1024 / 1024:.1f} MB")
+
+    legacy = measure(legacy_to_uint8, images, repeat=args.repeat)
+    new = measure(image_convert.tensor_to_uint8, images, repeat=args.repeat)
+    assert np.array_equal(legacy_to_uint8(images), image_convert.tensor_to_uint8(images))
+    report("IMAGE → uint8（整批）", legacy, new, images.size)
+
+    buffer = io.BytesIO()
+    Image.fromarray(image_convert.tensor_to_uint8(images[0])).save(buffer, "PNG", compress_level=1)
+    data = buffer.getvalue()
+    legacy = measure(legacy_decode, data, repeat=args.repeat)
+    new = measure(image_convert.decode_to_tensor, data, repeat=args.repeat)
+    assert np.array_equal(legacy_decode(data), np.asarray(image_convert.decode_to_tensor(data)))
+    report("PNG 字节 → IMAGE", legacy, new, images[0].nbytes)
+
+
+if __name__ == "__main__":
+    main()
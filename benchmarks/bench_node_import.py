@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""插件导入耗时基准：对比完整导入与按需加载清单
+
+每次测量都在新的 Python 进程中导入插件（与 ComfyUI 启动时相同），记录导入耗时
+以及 torch / numpy / PIL / requests / pydantic_settings 是否被导入。
+
+用法:
+    python benchmarks/bench_node_import.py [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "numpy", "PIL", "requests", "pydantic_settings")
+
+# 在子进程中执行：以包的形式导入插件目录，输出耗时和已导入的重量级模块
+PROBE = """
+import importlib.util, json, sys, time
+root, heavy = sys.argv[1], sys.argv[2].split(",")
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("ComfyUI_KuAi_Power", root + "/__init__.py",
+                                              submodule_search_locations=[root])
+mod = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = mod
+spec.loader.exec_module(mod)
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "nodes": len(mod.NODE_CLASS_MAPPINGS), "lazy": mod.LAZY_LOADED,
+                  "heavy": [name for name in heavy if name in sys.modules]}))
+"""
+
+
+def run_once(env):
+    proc = subprocess.run([sys.executable, "-c", PROBE, ROOT, ",".join(HEAVY_MODULES)],
+                          env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure(env, repeat):
+    runs = [run_once(env) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["seconds"])
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache:
+        env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+        env["KUAI_CACHE_DIR"] = cache
+
+        eager = measure(dict(env, KUAI_LAZY_NODES="0"), args.repeat)
+        # 第一次按需加载启动会完整导入并生成清单
+        first = run_once(dict(env, KUAI_LAZY_NODES="1"))
+        lazy = measure(dict(env, KUAI_LAZY_NODES="1"), args.repeat)
+
+    print(f"{'模式':<16}{'耗时':>10}{'节点数':>8}  已导入的重量级模块")
+    for label, result in (("完整导入", eager), ("首次生成清单", first), ("按需加载", lazy)):
+        print(f"{label:<16}{result['seconds'] * 1000:>8.1f}ms{result['nodes']:>8}  "
+              f"{', '.join(result['heavy']) or '-'}")
+    if lazy["lazy"] and lazy["seconds"] > 0:
+        print(f"\n按需加载启动快 {eager['seconds'] / lazy['seconds']:.1f} 倍")
+
+
+if __name__ == "__main__":
+    main()
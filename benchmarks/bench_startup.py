@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""插件启动开销基准：按节点包测量冷/热导入耗时、常驻内存和 -X importtime 明细，超出预算时失败
+
+每个节点包（nodes/Sora2、nodes/NanoBanana、nodes/Grok、nodes/Veo3、nodes/Utils）以及插件整体
+（执行顶层 __init__.py，与 ComfyUI 启动时相同）分别在新的 Python 进程中导入：
+
+- 冷启动：使用空的字节码缓存目录（PYTHONPYCACHEPREFIX）和空的插件缓存目录，包含编译 .py 的开销；
+  插件整体的冷启动会完整导入并生成按需加载清单，热启动按清单注册
+- 热启动：字节码已缓存，取多次运行的最小值
+- 常驻内存：导入完成后进程的 RSS，以及相对导入前的增量
+- 明细：-X importtime 中自身耗时最长的模块
+
+用法:
+    python benchmarks/bench_startup.py [--packages Sora2,Grok] [--repeat 3] [--top 8]
+                                       [--budget benchmarks/startup_budget.json] [--json 结果.json]
+
+预算文件格式见 startup_budget.json（warm_ms / cold_ms / rss_mb，packages 中按包覆盖 default）。
+任一包超出预算或导入失败时退出码为 1。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "ComfyUI_KuAi_Power"
+PLUGIN = "插件整体"
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+# 在子进程中执行：注册插件包（节点包模式下不执行顶层 __init__.py），导入目标并输出耗时与内存
+PROBE = """
+import importlib, importlib.util, json, sys, time, types
+root, package, target = sys.argv[1:4]
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+before = rss_mb()
+start = time.perf_counter()
+error = None
+try:
+    if target == "":
+        spec = importlib.util.spec_from_file_location(package, root + "/__init__.py",
+                                                      submodule_search_locations=[root])
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules[package] = mod
+        spec.loader.exec_module(mod)
+    else:
+        pkg = types.ModuleType(package)
+        pkg.__path__ = [root]
+        sys.modules[package] = pkg
+        importlib.import_module(f"{package}.nodes.{target}")
+except Exception as e:
+    error = f"{type(e).__name__}: {e}"
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "rss_mb": rss_mb(), "rss_delta_mb": rss_mb() - before, "error": error}))
+"""
+
+
+def node_packages():
+    nodes_dir = os.path.join(ROOT, "nodes")
+    return sorted(name for name in os.listdir(nodes_dir)
+                  if not name.startswith("_") and os.path.isfile(os.path.join(nodes_dir, name, "__init__.py")))
+
+
+def run_probe(target, env, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE, ROOT, PACKAGE, target]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0 or not proc.stdout.strip():
+        raise RuntimeError(f"探测进程异常退出: {proc.stderr.strip()[-500:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def parse_importtime(stderr, top):
+    """解析 -X importtime 输出，返回自身耗时最长的 [(模块, 自身 ms, 累计 ms)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+        except ValueError:
+            continue
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return rows[:top]
+
+
+def measure(target, base_env, repeat, top):
+    # 独立的字节码缓存和插件缓存：冷启动相当于首次安装（插件整体会在这一次生成节点清单）
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(base_env, PYTHONPYCACHEPREFIX=os.path.join(scratch, "pycache"),
+                   KUAI_CACHE_DIR=os.path.join(scratch, "cache"))
+        cold, _ = run_probe(target, env)
+        warm_runs = [run_probe(target, env)[0] for _ in range(max(1, repeat))]
+        _, stderr = run_probe(target, env, importtime=True)
+    warm = min(warm_runs, key=lambda r: r["ms"])
+    return {
+        "cold_ms": cold["ms"],
+        "warm_ms": warm["ms"],
+        "rss_mb": warm["rss_mb"],
+        "rss_delta_mb": warm["rss_delta_mb"],
+        "error": cold["error"] or warm["error"],
+        "top_modules": parse_importtime(stderr, top),
+    }
+
+
+def load_budget(path):
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_budget(name, result, budget):
+    """返回超出预算的说明列表"""
+    limits = dict(budget.get("default", {}))
+    limits.update(budget.get("packages", {}).get(name, {}))
+    violations = []
+    for key, unit in (("cold_ms", "ms"), ("warm_ms", "ms"), ("rss_mb", "MB")):
+        if key in limits and result[key] > limits[key]:
+            violations.append(f"{key} {result[key]:.1f}{unit} > {limits[key]}{unit}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packages", default="", help="逗号分隔的节点包名，默认全部加插件整体")
+    parser.add_argument("--repeat", type=int, default=3, help="热启动测量次数（取最小值）")
+    parser.add_argument("--top", type=int, default=8, help="每个包显示的 importtime 明细条数")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="预算文件，传空字符串不检查")
+    parser.add_argument("--json", default="", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    targets = [p.strip() for p in args.packages.split(",") if p.strip()] or node_packages() + [PLUGIN]
+    budget = load_budget(args.budget)
+    # 热启动依赖字节码缓存，子进程必须允许写 .pyc
+    base_env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+
+    results, failed = {}, []
+    print(f"{'包':<14}{'冷启动':>10}{'热启动':>10}{'RSS':>10}{'增量':>10}  状态")
+    for name in targets:
+        result = measure("" if name == PLUGIN else name, base_env, args.repeat, args.top)
+        violations = check_budget(name, result, budget)
+        if result["error"]:
+            violations.insert(0, f"导入失败: {result['error']}")
+        result["violations"] = violations
+        results[name] = result
+        if violations:
+            failed.append(name)
+        status = "✅" if not violations else "❌ " + "; ".join(violations)
+        print(f"{name:<14}{result['cold_ms']:>8.1f}ms{result['warm_ms']:>8.1f}ms"
+              f"{result['rss_mb']:>8.1f}MB{result['rss_delta_mb']:>8.1f}MB  {status}")
+
+    print("\nimporttime 明细（自身耗时最长的模块，热启动）:")
+    for name, result in results.items():
+        print(f"\n  {name}")
+        for module, self_ms, cumulative_ms in result["top_modules"]:
+            print(f"    {self_ms:>8.1f}ms  累计 {cumulative_ms:>8.1f}ms  {module.strip()}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if failed:
+        print(f"\n❌ 超出预算或导入失败: {', '.join(failed)}")
+        return 1
+    print("\n✅ 全部在预算内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
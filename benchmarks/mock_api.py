@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""离线模拟 API 服务器：在本地替代 api.kuai.host 与临时图床，用于基准测试和排查批量任务行为
+
+实现的接口（响应格式与节点解析的字段一致）：
+- POST /v1/video/create                          创建视频任务（Sora / Veo / Grok）
+- GET  /v1/video/query?id=...                    查询任务；创建后 render_seconds 秒内为 pending / processing
+- POST /v1beta/models/{model}:generateContent    返回一张 PNG（inlineData）和一段文本
+- POST /v1beta/models/{model}:streamGenerateContent   同上，JSON 数组或 alt=sse 事件流
+- POST /v1/chat/completions                      返回固定的 assistant 消息
+- POST /api/upload                               图床上传，返回 {"url", "created"}
+- GET/HEAD /files/<name>                         完成任务的视频、缩略图和上传文件（供下载引擎使用）
+
+每个 API 请求先等待 latency（± jitter）秒，再按概率返回 429（带 Retry-After）或 500；
+远端任务按 task_failure_rate 以 failed 结束。所有请求按接口和状态码计数，并记录服务端耗时。
+
+用法:
+    python benchmarks/mock_api.py [--port 8765] [--latency 0.2] [--failure-rate 0.02]
+                                  [--rate-limit-rate 0.05] [--render-seconds 30]
+    然后把节点的 api_base（图床节点的 upload_url 为 <地址>/api/upload）指向打印的地址
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+VIDEO_BYTES = 256 * 1024
+
+
+@dataclass
+class MockConfig:
+    """模拟服务器的行为参数（时间单位为秒，比例为 0~1）"""
+    latency: float = 0.05            # 每个 API 请求的基础延迟
+    jitter: float = 0.0              # 延迟在 ±jitter 内均匀抖动
+    failure_rate: float = 0.0        # 返回 500 的比例
+    rate_limit_rate: float = 0.0     # 返回 429 的比例
+    retry_after: float = 1.0         # 429 响应的 Retry-After
+    render_seconds: float = 3.0      # 视频任务从创建到完成的时间
+    render_jitter: float = 0.0       # 渲染时间在 ±render_jitter 内均匀抖动
+    task_failure_rate: float = 0.0   # 远端任务以 failed 结束的比例
+    image_size: int = 64             # generateContent 返回的 PNG 边长
+    seed: Optional[int] = None
+
+
+def _png_bytes(size: int) -> bytes:
+    """生成一张纯色 RGB PNG（不依赖 PIL）"""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    row = b"\x00" + b"\x40\x80\xc0" * size
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * size))
+            + chunk(b"IEND", b""))
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值分位数；values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class MockState:
+    """任务表与调用统计（多个请求线程共享）"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._random = random.Random(config.seed)
+        self._ids = itertools.count(1)
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, bytes] = {}
+        self.calls: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.image = _png_bytes(config.image_size)
+
+    def roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def spread(self, base: float, jitter: float) -> float:
+        with self._lock:
+            return max(0.0, base + (self._random.uniform(-jitter, jitter) if jitter else 0.0))
+
+    def next_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self._ids):06d}"
+
+    def record(self, endpoint: str, status: int, elapsed: float):
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.statuses[f"{endpoint} {status}"] += 1
+            self.latencies[endpoint].append(elapsed)
+
+    def new_task(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = self.config
+        task = {
+            "id": self.next_id("mock"),
+            "model": payload.get("model", ""),
+            "created": time.time(),
+            "render": self.spread(cfg.render_seconds, cfg.render_jitter),
+            "fails": self.roll(cfg.task_failure_rate),
+            "completed_at": None,
+        }
+        with self._lock:
+            self.tasks[task["id"]] = task
+        return task
+
+    def task_status(self, task: Dict[str, Any]) -> str:
+        elapsed = time.time() - task["created"]
+        if elapsed < task["render"] * 0.2:
+            return "pending"
+        if elapsed < task["render"]:
+            return "processing"
+        return "failed" if task["fails"] else "completed"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """调用次数、状态码分布、各接口服务端耗时分位数、任务完成耗时"""
+        with self._lock:
+            latencies = {k: list(v) for k, v in self.latencies.items()}
+            tasks = [dict(t) for t in self.tasks.values()]
+            calls, statuses = dict(self.calls), dict(self.statuses)
+        return {
+            "calls": calls,
+            "statuses": statuses,
+            "total_calls": sum(calls.values()),
+            "latency": {k: {"p50": percentile(v, 0.5), "p95": percentile(v, 0.95), "count": len(v)}
+                        for k, v in latencies.items()},
+            # 创建请求到第一次查询到终态的时间：任务在服务端的完整生命周期（含轮询滞后）
+            "task_seconds": [t["completed_at"] - t["created"] for t in tasks if t["completed_at"]],
+            "tasks_created": len(tasks),
+        }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None  # 由 MockApiServer 绑定到子类
+
+    def log_message(self, *args):
+        pass
+
+    # ---- 响应工具 ----
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type="application/json", extra=None, head=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _json(self, status: int, data: Any, extra=None):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), extra=extra)
+
+    def _base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ---- 路由 ----
+
+    def _endpoint(self, method: str, path: str) -> str:
+        if path.startswith("/v1beta/models/") and ":" in path:
+            return f"{method} /v1beta/models/{{model}}:{path.rsplit(':', 1)[1]}"
+        if path.startswith("/files/"):
+            return f"{method} /files"
+        return f"{method} {path}"
+
+    def _dispatch(self, method: str):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        endpoint = self._endpoint(method, url.path)
+        status = 500
+        try:
+            body = self._read_body() if method == "POST" else b""
+            if url.path.startswith("/files/"):
+                status = self._serve_file(url.path[len("/files/"):], head=method == "HEAD")
+                return
+            handler = self._route(method, url.path)
+            if handler is None:
+                status = 404
+                self._json(404, {"error": {"message": f"mock: 未实现的接口 {method} {url.path}"}})
+                return
+            status = self._inject_faults()
+            if status is None:
+                status = handler(url, body)
+        finally:
+            self.state.record(endpoint, status, time.perf_counter() - started)
+
+    def _route(self, method: str, path: str):
+        if method == "POST" and path == "/v1/video/create":
+            return self._video_create
+        if method == "GET" and path == "/v1/video/query":
+            return self._video_query
+        if method == "POST" and path.startswith("/v1beta/models/") and path.endswith(":generateContent"):
+            return self._generate_content
+        if method == "POST" and path.startswith("/v1beta/models/") and path.endswith(":streamGenerateContent"):
+            return self._stream_generate_content
+        if method == "POST" and path == "/v1/chat/completions":
+            return self._chat_completions
+        if method == "POST" and path == "/api/upload":
+            return self._upload
+        return None
+
+    def _inject_faults(self) -> Optional[int]:
+        """注入延迟、429 和 500；返回已发送的状态码，未注入故障时返回 None"""
+        cfg = self.state.config
+        delay = self.state.spread(cfg.latency, cfg.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.state.roll(cfg.rate_limit_rate):
+            self._json(429, {"error": {"message": "mock: rate limited"}},
+                       extra={"Retry-After": f"{cfg.retry_after:g}"})
+            return 429
+        if self.state.roll(cfg.failure_rate):
+            self._json(500, {"error": {"message": "mock: internal error"}})
+            return 500
+        return None
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    # ---- 接口实现 ----
+
+    def _video_create(self, url, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"message": "mock: 请求体不是 JSON"}})
+            return 400
+        task = self.state.new_task(payload)
+        self._json(200, {
+            "id": task["id"],
+            "status": "pending",
+            "status_update_time": int(task["created"]),
+            "enhanced_prompt": payload.get("prompt", ""),
+        })
+        return 200
+
+    def _video_query(self, url, body):
+        task_id = (parse_qs(url.query).get("id") or [""])[0]
+        task = self.state.tasks.get(task_id)
+        if task is None:
+            self._json(404, {"error": {"message": f"mock: 任务不存在 {task_id}"}})
+            return 404
+        status = self.state.task_status(task)
+        data = {"id": task_id, "status": status, "detail": {"status": status}}
+        if status in ("completed", "failed") and task["completed_at"] is None:
+            task["completed_at"] = time.time()
+        if status == "completed":
+            base = self._base_url()
+            data.update({
+                "video_url": f"{base}/files/{task_id}.mp4",
+                "thumbnail_url": f"{base}/files/{task_id}.png",
+            })
+            data["detail"]["url"] = data["video_url"]
+        self._json(200, data)
+        return 200
+
+    def _gemini_response(self, model: str) -> Dict[str, Any]:
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [
+                    {"text": f"mock image from {model}"},
+                    {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(self.state.image).decode()}},
+                ]},
+                "finishReason": "STOP",
+            }],
+            "modelVersion": model,
+        }
+
+    def _generate_content(self, url, body):
+        model = url.path[len("/v1beta/models/"):].rsplit(":", 1)[0]
+        self._json(200, self._gemini_response(model))
+        return 200
+
+    def _stream_generate_content(self, url, body):
+        model = url.path[len("/v1beta/models/"):].rsplit(":", 1)[0]
+        chunks = [
+            {"candidates": [{"content": {"role": "model", "parts": [{"text": "mock "}]}}]},
+            self._gemini_response(model),
+        ]
+        if "sse" in parse_qs(url.query).get("alt", []):
+            payload = "".join(f"data: {json.dumps(c)}\r\n\r\n" for c in chunks).encode("utf-8")
+            self._send(200, payload, content_type="text/event-stream")
+        else:
+            self._json(200, chunks)
+        return 200
+
+    def _chat_completions(self, url, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        self._json(200, {
+            "id": self.state.next_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "mock response"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3},
+        })
+        return 200
+
+    def _upload(self, url, body):
+        name = f"{self.state.next_id('upload')}.jpg"
+        self.state.files[name] = body
+        self._json(200, {"url": f"{self._base_url()}/files/{name}", "created": int(time.time())})
+        return 200
+
+    def _serve_file(self, name: str, head: bool) -> int:
+        data = self.state.files.get(name)
+        if data is None:
+            data = self.state.image if name.endswith(".png") else b"\x00" * VIDEO_BYTES
+        self._send(200, data, content_type="application/octet-stream", extra={"ETag": f'"{name}"'}, head=head)
+        return 200
+
+
+class MockApiServer:
+    """在后台线程运行的模拟服务器，可作为上下文管理器使用
+
+        with MockApiServer(MockConfig(render_seconds=2)) as server:
+            ...  # api_base=server.base_url
+            print(server.stats())
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.state = MockState(self.config)
+        handler = type("BoundMockHandler", (MockHandler,), {"state": self.state})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockApiServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.state.snapshot()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    defaults = MockConfig()
+    for name, value in asdict(defaults).items():
+        if name != "seed":
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(**{name: getattr(args, name) for name in asdict(defaults)})
+    server = MockApiServer(config, args.host, args.port).start()
+    print(f"[MockAPI] 已启动: {server.base_url}（Ctrl+C 退出）")
+    print(f"[MockAPI] 参数: {json.dumps(asdict(config), ensure_ascii=False)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats()["calls"], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
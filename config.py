@@ -7,7 +7,18 @@ class Settings(BaseSettings):
     WEBHOOK_BASE_PATH: str = Field("/webhook", description="Webhook 路径前缀")
     SECRET_TOKEN: str = Field("", description="Webhook 验证密钥（可选）")
     HTTP_TIMEOUT: int = Field(30, description="HTTP 请求超时时间（秒）")
-    HTTP_RETRY: int = Field(0, description="HTTP 请求重试次数（简化，默认不重试）")
+    HTTP_RETRY: int = Field(3, description="HTTP 请求最大重试次数（指数退避 + 抖动，0 表示不重试）")
+    HTTP_RETRY_MAX_DELAY: float = Field(30.0, description="单次重试退避的上限（秒）")
+    HTTP_RETRY_BUDGET_RATIO: float = Field(0.2, description="每个接口 60 秒窗口内允许的重试占请求数比例")
+    HTTP_POOL_MAXSIZE: int = Field(16, description="每个主机保持的最大 keep-alive 连接数")
+    HTTP2: bool = Field(False, description="启用 HTTP/2（需要安装 httpx[http2]）")
+    RATE_LIMIT_RPM: float = Field(60.0, description="每个 (API 地址, API Key, 模型) 每分钟最多发起的生成请求数，0 表示不限流")
+    RATE_LIMIT_BURST: int = Field(5, description="限流令牌桶的突发容量")
+    RATE_LIMIT_MODELS: str = Field("", description="按模型覆盖限流，格式 model=rpm[:burst],...")
+    NANOBANANA_CACHE_MAX_MB: float = Field(1024, description="NanoBanana 生成结果磁盘缓存上限（MB），0 表示不缓存")
+    ENCODE_CACHE_MAX_MB: float = Field(256, description="参考图 base64 编码内存缓存上限（MB）")
+    REFERENCE_MAX_EDGE: int = Field(0, description="NanoBanana 参考图缩放后的最长边（px），0 表示按模型默认")
+    REFERENCE_JPEG_QUALITY: int = Field(0, description="NanoBanana 参考图 JPEG 质量（1-95），0 表示按模型默认")
 
     class Config:
         env_file = ".env"
@@ -227,6 +227,8 @@ def main():
         print("   2. 检查控制台输出中的 [ComfyUI_KuAi_Power] 日志")
         print("   3. 按 Ctrl+Alt+F 打开节点面板")
         print("   4. 测试节点功能")
+        print()
+        print("启动开销：python benchmarks/bench_startup.py（按节点包统计导入耗时和内存）")
     else:
         print("⚠️  部分检查未通过，请根据上述错误信息进行修复。")
         print()
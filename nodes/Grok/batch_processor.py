@@ -3,9 +3,18 @@
 import json
 import os
 import time
+from ...utils import metrics
 from ...utils.kuai_utils import env_or
+from ...utils.poller import get_poller
+from ...utils.poll_schedule import adaptive_schedule
+from ...utils.batch_tasks import open_tasks, iter_rows, TaskListWriter, MAX_REPORTED
+from ...utils.batch_journal import BatchJournal, RemoteTaskFailed, SUBMITTED, POLLING, COMPLETED, FAILED
+from ...utils.downloader import BatchDownloader, apply_media_results
+from ...utils.log import get_logger, ProgressReporter
 from .grok import GrokCreateVideo, GrokQueryVideo
 
+log = get_logger("GrokBatch")
+
 
 class GrokBatchProcessor:
     """Grok 批量视频生成处理器"""
@@ -31,11 +40,11 @@ class GrokBatchProcessor:
                     "tooltip": "输出目录（保存任务信息）"
                 }),
                 "delay_between_tasks": ("FLOAT", {
-                    "default": 2.0,
+                    "default": 0.0,
                     "min": 0.0,
                     "max": 60.0,
                     "step": 0.5,
-                    "tooltip": "任务间延迟（秒）"
+                    "tooltip": "额外的任务间延迟（秒）；请求速率由全局限流器控制（RATE_LIMIT_RPM），一般保持 0 即可"
                 }),
             },
             "optional": {
@@ -55,6 +64,24 @@ class GrokBatchProcessor:
                     "max": 60,
                     "tooltip": "轮询间隔（秒）"
                 }),
+                "resume": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "断点续跑：跳过输出目录日志中已完成的行，重新挂接已提交的任务；关闭则重新开始"
+                }),
+                "download_media": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "等待完成时，每个任务完成后立即把视频下载到输出目录（<output_prefix>.mp4），与后续任务的生成同时进行"
+                }),
+                "download_workers": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 16,
+                    "tooltip": "同时下载的文件数"
+                }),
+                "api_base": ("STRING", {
+                    "default": "https://api.kuai.host",
+                    "tooltip": "API 端点地址"
+                }),
             }
         }
 
@@ -68,6 +95,10 @@ class GrokBatchProcessor:
             "wait_for_completion": "等待完成",
             "max_wait_time": "最大等待时间",
             "poll_interval": "轮询间隔",
+            "resume": "断点续跑",
+            "download_media": "自动下载",
+            "download_workers": "下载并发数",
+            "api_base": "API地址",
         }
 
     RETURN_TYPES = ("STRING", "STRING")
@@ -76,12 +107,13 @@ class GrokBatchProcessor:
     CATEGORY = "KuAi/Grok"
 
     def process_batch(self, batch_tasks, api_key="", output_dir="./output/grok_batch",
-                     delay_between_tasks=2.0, wait_for_completion=False,
-                     max_wait_time=600, poll_interval=10):
+                     delay_between_tasks=0.0, wait_for_completion=False,
+                     max_wait_time=600, poll_interval=10, resume=True,
+                     download_media=True, download_workers=4, api_base="https://api.kuai.host"):
         """批量处理视频生成任务"""
         try:
             # 解析任务数据
-            tasks = json.loads(batch_tasks)
+            tasks = open_tasks(batch_tasks)
             if not tasks:
                 raise ValueError("没有任务需要处理")
 
@@ -93,7 +125,7 @@ class GrokBatchProcessor:
             # 创建输出目录
             os.makedirs(output_dir, exist_ok=True)
 
-            # 处理结果统计
+            # 处理结果统计（只保留计数和前 MAX_REPORTED 条明细，完整列表见 tasks.json）
             results = {
                 "total": len(tasks),
                 "success": 0,
@@ -102,59 +134,100 @@ class GrokBatchProcessor:
                 "task_ids": []
             }
 
-            print(f"\n{'='*60}")
-            print(f"[GrokBatch] 开始批量处理 {len(tasks)} 个视频生成任务")
-            print(f"[GrokBatch] 输出目录: {output_dir}")
-            print(f"[GrokBatch] 等待完成: {'是' if wait_for_completion else '否'}")
-            print(f"{'='*60}\n")
-
-            # 逐个处理任务
-            for idx, task in enumerate(tasks, start=1):
-                try:
-                    print(f"\n[{idx}/{len(tasks)}] 处理任务 (行 {task.get('_row_number', '?')})")
-
-                    # 处理单个任务
-                    task_info = self._process_single_task(
-                        task, idx, api_key, output_dir,
-                        wait_for_completion, max_wait_time, poll_interval
-                    )
-
-                    results["success"] += 1
-                    results["task_ids"].append(task_info)
-                    print(f"✓ 任务 {idx} 完成")
-
-                except Exception as e:
-                    results["failed"] += 1
-                    error_msg = f"任务 {idx} (行 {task.get('_row_number', '?')}): {str(e)}"
-                    results["errors"].append(error_msg)
-                    print(f"\033[91m✗ {error_msg}\033[0m")
-
-                # 任务间延迟
-                if idx < len(tasks) and delay_between_tasks > 0:
-                    time.sleep(delay_between_tasks)
-
-            # 保存任务列表
-            tasks_file = os.path.join(output_dir, "tasks.json")
-            with open(tasks_file, 'w', encoding='utf-8') as f:
-                json.dump(results["task_ids"], f, ensure_ascii=False, indent=2)
-            print(f"\n[GrokBatch] 任务列表已保存到: {tasks_file}")
+            log.info(f"开始批量处理 {len(tasks)} 个视频生成任务 | 输出目录: {output_dir} | "
+                     f"等待完成: {'是' if wait_for_completion else '否'}")
+
+            # 断点续跑日志：每行状态变化立即落盘
+            journal = BatchJournal(output_dir, reset=not resume)
+            done = len(journal.entries(COMPLETED))
+            if done:
+                log.info(f"断点续跑: 日志中 {done} 个任务已完成，将跳过")
+
+            # 下载流水线：任务完成即开始下载，与后续任务的生成同时进行
+            downloads = BatchDownloader(download_workers, label="GrokBatch") if download_media and wait_for_completion else None
+
+            # 逐个处理任务；CSV 只读取一遍，行标识和输出文件名前缀（空值补默认名，重复的追加行序号）
+            # 在读取时逐行确定，成功的行逐个写入任务列表
+            progress = ProgressReporter(log, len(tasks))
+            task_list = TaskListWriter(os.path.join(output_dir, "tasks.json"))
+            media_results = []
+            try:
+                for idx, (task, key, prefix) in enumerate(iter_rows(tasks, default="task"), start=1):
+                    resumed = False
+                    progress.start()
+                    try:
+                        log.debug(f"[{idx}/{len(tasks)}] 处理任务 (行 {task.get('_row_number', '?')})")
+
+                        # 处理单个任务
+                        task_info = self._process_single_task(
+                            task, idx, api_key, output_dir,
+                            wait_for_completion, max_wait_time, poll_interval,
+                            journal=journal, key=key, downloads=downloads, api_base=api_base,
+                            output_prefix=prefix
+                        )
+                        resumed = task_info.pop("_resumed", False)
+
+                        results["success"] += 1
+                        task_list.add(task_info)
+                        if len(results["task_ids"]) < MAX_REPORTED:
+                            status_icon = "✓" if task_info.get("status") == "completed" else "⏳"
+                            results["task_ids"].append(f"{status_icon} {task_info['task_id']}: {task_info['prompt'][:30]}...")
+                        progress.finish(skipped=resumed)
+                        log.debug(f"✓ 任务 {idx} 完成")
+
+                    except Exception as e:
+                        results["failed"] += 1
+                        error_msg = f"任务 {idx} (行 {task.get('_row_number', '?')}): {str(e)}"
+                        if len(results["errors"]) < MAX_REPORTED:
+                            results["errors"].append(error_msg)
+                        progress.finish(ok=False)
+                        log.warning(f"✗ {error_msg}", extra={"fields": {"event": "row_failed", "row": idx}})
+                        # 未能提交的行记为失败，下次运行重新提交（远端失败的行已记录）
+                        if not isinstance(e, RemoteTaskFailed) and journal.state(key) not in (SUBMITTED, POLLING):
+                            journal.record(key, FAILED, row=idx, error=str(e))
+
+                    # 任务间延迟（跳过的行不等待）
+                    if idx < len(tasks) and delay_between_tasks > 0 and not resumed:
+                        time.sleep(delay_between_tasks)
+            finally:
+                if downloads is not None:
+                    log.info("等待剩余下载完成...")
+                    media_results = downloads.close()
+                    results["downloaded"], results["download_errors"] = apply_media_results(media_results)
+                # 保存任务列表（下载结果写回后的任务信息替换先写入的版本）
+                task_list.close(updated=(task_info for (task_info, _field), _result in media_results))
+            log.debug(f"任务列表已保存到: {task_list.path}")
 
             # 生成结果报告
             report = self._generate_report(results)
-            print(f"\n{'='*60}")
-            print(report)
-            print(f"{'='*60}\n")
+            progress.close()
+            log.info(report)
 
             return (report, output_dir)
 
         except Exception as e:
             error_msg = f"批量处理失败: {str(e)}"
-            print(f"\033[91m[GrokBatch] {error_msg}\033[0m")
+            log.error(error_msg)
             raise RuntimeError(error_msg)
 
     def _process_single_task(self, task, task_idx, api_key, output_dir,
-                            wait_for_completion, max_wait_time, poll_interval):
+                            wait_for_completion, max_wait_time, poll_interval,
+                            journal=None, key=None, downloads=None, api_base="https://api.kuai.host",
+                            output_prefix=None):
         """处理单个任务"""
+        if output_prefix is None:
+            output_prefix = (task.get("output_prefix") or "").strip() or f"task_{task_idx}"
+        entry = journal.get(key) if journal else None
+        state = entry.get("state") if entry else ""
+        if state == COMPLETED or (state == SUBMITTED and not wait_for_completion):
+            log.debug(f"行 {task_idx} 已在上次运行中{'完成' if state == COMPLETED else '提交'}，跳过: {entry.get('task_id')}")
+            task_info = dict(entry["info"], _resumed=True)
+            if downloads is not None and state == COMPLETED:
+                # 补下载上次未完成的文件；已存在的文件不再请求（URL 可能已过期）
+                downloads.submit_media(task_info, output_dir, task_info.get("output_prefix") or output_prefix,
+                                       skip_existing=True)
+            return task_info
+
         # 必需参数
         prompt = task.get("prompt", "").strip()
         if not prompt:
@@ -164,7 +237,6 @@ class GrokBatchProcessor:
         aspect_ratio = task.get("aspect_ratio", "3:2").strip()
         size = task.get("size", "1080P").strip()
         image_urls = task.get("image_urls", "").strip()
-        output_prefix = task.get("output_prefix", f"task_{task_idx}").strip()
 
         # 验证参数
         if aspect_ratio not in ["1:1", "2:3", "3:2"]:
@@ -172,83 +244,102 @@ class GrokBatchProcessor:
         if size not in ["720P", "1080P"]:
             raise ValueError(f"无效的分辨率: {size}，必须是 720P 或 1080P")
 
-        print(f"  提示词: {prompt[:50]}...")
-        print(f"  宽高比: {aspect_ratio}, 分辨率: {size}")
-        if image_urls:
-            print(f"  参考图片: {image_urls[:50]}...")
-
-        # 创建任务
-        task_id, status, enhanced_prompt = self.creator.create(
-            prompt=prompt,
-            aspect_ratio=aspect_ratio,
-            size=size,
-            api_key=api_key,
-            image_urls=image_urls
-        )
-
-        print(f"  任务ID: {task_id}")
-        print(f"  状态: {status}")
-
-        # 任务信息
-        task_info = {
-            "task_id": task_id,
-            "prompt": prompt,
-            "aspect_ratio": aspect_ratio,
-            "size": size,
-            "image_urls": image_urls,
-            "output_prefix": output_prefix,
-            "status": status,
-            "enhanced_prompt": enhanced_prompt,
-            "video_url": None,
-            "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
+        log.debug(f"行 {task_idx}: 提示词={prompt[:50]}... 宽高比={aspect_ratio} 分辨率={size}"
+                  + (f" 参考图片={image_urls[:50]}..." if image_urls else ""))
+
+        if state in (SUBMITTED, POLLING) and entry.get("task_id"):
+            # 远端任务已创建，直接挂接，不重复提交
+            task_id = entry["task_id"]
+            task_info = dict(entry["info"])
+            log.debug(f"行 {task_idx} 重新挂接已提交的任务: {task_id}")
+        else:
+            # 创建任务
+            task_id, status, enhanced_prompt = self.creator.create(
+                prompt=prompt,
+                aspect_ratio=aspect_ratio,
+                size=size,
+                api_key=api_key,
+                image_urls=image_urls,
+                api_base=api_base
+            )
+
+            log.debug(f"行 {task_idx} 已提交任务 {task_id}，状态: {status}")
+
+            # 任务信息
+            task_info = {
+                "task_id": task_id,
+                "prompt": prompt,
+                "aspect_ratio": aspect_ratio,
+                "size": size,
+                "image_urls": image_urls,
+                "output_prefix": output_prefix,
+                "status": status,
+                "enhanced_prompt": enhanced_prompt,
+                "video_url": None,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            if journal:
+                journal.record(key, SUBMITTED, row=task_idx, task_id=task_id, info=task_info)
 
         # 如果需要等待完成
+        remote_failed = False
         if wait_for_completion:
-            print(f"  等待视频生成完成...")
+            if journal:
+                journal.record(key, POLLING)
             task_info = self._wait_for_completion(
-                task_id, task_info, api_key, max_wait_time, poll_interval
+                task_id, task_info, api_key, max_wait_time, poll_interval, api_base=api_base
             )
+            if task_info.get("status") == "completed":
+                if journal:
+                    journal.record(key, COMPLETED, info=task_info)
+                if downloads is not None:
+                    downloads.submit_media(task_info, output_dir, output_prefix)
+            elif task_info.get("status") == "failed":
+                remote_failed = True
+                if journal:
+                    journal.record(key, FAILED, info=task_info, error="远端任务失败")
 
         # 保存任务信息
         task_file = os.path.join(output_dir, f"{output_prefix}_{task_id.replace(':', '_')}.json")
         with open(task_file, 'w', encoding='utf-8') as f:
             json.dump(task_info, f, ensure_ascii=False, indent=2)
 
+        if remote_failed:
+            raise RemoteTaskFailed(f"远端任务失败: {task_id}")
         return task_info
 
-    def _wait_for_completion(self, task_id, task_info, api_key, max_wait_time, poll_interval):
-        """等待任务完成"""
-        elapsed = 0
-
-        while elapsed < max_wait_time:
-            time.sleep(poll_interval)
-            elapsed += poll_interval
-
-            try:
-                _, status, video_url, enhanced_prompt = self.querier.query(task_id, api_key)
-
-                task_info["status"] = status
-                task_info["video_url"] = video_url
-                if enhanced_prompt:
-                    task_info["enhanced_prompt"] = enhanced_prompt
-
-                if status == "completed":
-                    print(f"  ✓ 视频生成完成！")
-                    print(f"  视频URL: {video_url}")
-                    task_info["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
-                    return task_info
-                elif status == "failed":
-                    raise RuntimeError(f"视频生成失败")
-
-                print(f"  进行中... 已等待 {elapsed}/{max_wait_time} 秒")
+    def _wait_for_completion(self, task_id, task_info, api_key, max_wait_time, poll_interval,
+                             api_base="https://api.kuai.host"):
+        """等待任务完成（由共享轮询调度器统一查询）"""
+        started = time.time()
+
+        def on_update(_task_id, status, data, _polls):
+            task_info["status"] = status
+            task_info["video_url"] = data.get("video_url") or ""
+            if data.get("enhanced_prompt"):
+                task_info["enhanced_prompt"] = data["enhanced_prompt"]
+            if status not in ("completed", "failed"):
+                log.debug(f"[{task_id}] 进行中... 已等待 {int(time.time() - started)}/{max_wait_time} 秒")
+
+        with metrics.tags(model="grok-video-3"):
+            future = get_poller().submit(
+                task_id, api_base, api_key,
+                poll_interval=poll_interval, timeout=max_wait_time, initial_delay=poll_interval,
+                on_update=on_update, max_errors=None, request_timeout=30,
+                schedule=adaptive_schedule(poll_interval, "grok-video-3"),
+            )
+        result = future.result()
 
-            except Exception as e:
-                print(f"  查询出错: {str(e)}")
-                # 继续等待
+        if result.status == "completed":
+            log.debug(f"[{task_id}] 视频生成完成: {task_info['video_url']}")
+            task_info["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            return task_info
+        elif result.status == "failed":
+            log.warning(f"[{task_id}] 视频生成失败")
+            return task_info
 
         # 超时
-        print(f"  ⚠ 等待超时（{max_wait_time}秒），任务仍在进行中")
+        log.warning(f"[{task_id}] 等待超时（{max_wait_time}秒），任务仍在进行中")
         task_info["timeout"] = True
         return task_info
 
@@ -260,17 +351,29 @@ class GrokBatchProcessor:
             f"成功: {results['success']}",
             f"失败: {results['failed']}",
         ]
+        if "downloaded" in results:
+            lines.append(f"已下载文件: {results['downloaded']}（失败 {len(results['download_errors'])}）")
 
         if results['task_ids']:
             lines.append(f"\n已创建的任务:")
-            for task_info in results['task_ids']:
-                status_icon = "✓" if task_info.get("status") == "completed" else "⏳"
-                lines.append(f"  {status_icon} {task_info['task_id']}: {task_info['prompt'][:30]}...")
+            for task in results['task_ids']:
+                lines.append(f"  {task}")
+            if results['success'] > len(results['task_ids']):
+                lines.append(f"  ... 另有 {results['success'] - len(results['task_ids'])} 个，见 tasks.json")
 
         if results['errors']:
             lines.append("\n失败任务详情:")
             for error in results['errors']:
                 lines.append(f"  - {error}")
+            if results['failed'] > len(results['errors']):
+                lines.append(f"  ... 另有 {results['failed'] - len(results['errors'])} 个失败任务，详见日志")
+
+        if results.get('download_errors'):
+            lines.append("\n下载失败:")
+            for error in results['download_errors'][:MAX_REPORTED]:
+                lines.append(f"  - {error}")
+            if len(results['download_errors']) > MAX_REPORTED:
+                lines.append(f"  ... 另有 {len(results['download_errors']) - MAX_REPORTED} 个")
 
         return "\n".join(lines)
 
@@ -2,8 +2,15 @@
 
 import os
 import time
-import requests
+from ...utils import http_client, metrics
+from ...utils.retry import new_idempotency_key
+from ...utils.rate_limit import throttle
 from ...utils.kuai_utils import env_or, http_headers_json, raise_for_bad_status, ensure_list_from_urls
+from ...utils.poller import get_poller
+from ...utils.poll_schedule import adaptive_schedule
+from ...utils.log import get_logger
+
+log = get_logger("Grok")
 
 
 class GrokCreateVideo:
@@ -80,15 +87,18 @@ class GrokCreateVideo:
             "images": images
         }
 
-        print(f"[ComfyUI_KuAi_Power] Grok 创建视频任务: {prompt[:50]}...")
+        log.debug(f"创建视频任务: {prompt[:50]}...")
 
+        throttle(api_base, api_key, "grok-video-3")
         try:
-            resp = requests.post(
-                f"{api_base.rstrip('/')}/v1/video/create",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            with metrics.tags(model="grok-video-3"):
+                resp = http_client.post(
+                    f"{api_base.rstrip('/')}/v1/video/create",
+                    json=payload,
+                    headers=headers,
+                    timeout=30,
+                    idempotency_key=new_idempotency_key()
+                )
             raise_for_bad_status(resp, "Grok 视频创建失败")
 
             result = resp.json()
@@ -96,7 +106,7 @@ class GrokCreateVideo:
             status = result.get("status", "pending")
             enhanced_prompt = result.get("enhanced_prompt", "")
 
-            print(f"[ComfyUI_KuAi_Power] Grok 任务已创建: {task_id}, 状态: {status}")
+            log.debug(f"任务已创建: {task_id}, 状态: {status}")
 
             return (task_id, status, enhanced_prompt)
 
@@ -152,15 +162,16 @@ class GrokQueryVideo:
 
         headers = http_headers_json(api_key)
 
-        print(f"[ComfyUI_KuAi_Power] Grok 查询任务: {task_id}")
+        log.debug(f"查询任务: {task_id}")
 
         try:
-            resp = requests.get(
-                f"{api_base.rstrip('/')}/v1/video/query",
-                params={"id": task_id},
-                headers=headers,
-                timeout=30
-            )
+            with metrics.tags(model="grok-video-3"):
+                resp = http_client.get(
+                    f"{api_base.rstrip('/')}/v1/video/query",
+                    params={"id": task_id},
+                    headers=headers,
+                    timeout=30
+                )
             raise_for_bad_status(resp, "Grok 视频查询失败")
 
             result = resp.json()
@@ -168,9 +179,9 @@ class GrokQueryVideo:
             video_url = result.get("video_url") or ""
             enhanced_prompt = result.get("enhanced_prompt", "")
 
-            print(f"[ComfyUI_KuAi_Power] Grok 任务状态: {status}")
+            log.debug(f"任务状态: {status}")
             if video_url:
-                print(f"[ComfyUI_KuAi_Power] Grok 视频URL: {video_url}")
+                log.debug(f"视频URL: {video_url}")
 
             return (task_id, status, video_url, enhanced_prompt)
 
@@ -261,29 +272,31 @@ class GrokCreateAndWait:
             querier = GrokQueryVideo()
             return querier.query(task_id, api_key, api_base)
 
-        # 轮询等待完成
-        print(f"[ComfyUI_KuAi_Power] Grok 等待视频生成完成，最多等待 {max_wait_time} 秒...")
-
-        querier = GrokQueryVideo()
-        elapsed = 0
-
-        while elapsed < max_wait_time:
-            time.sleep(poll_interval)
-            elapsed += poll_interval
+        # 轮询等待完成（交由共享轮询调度器统一查询）
+        log.debug(f"等待视频生成完成，最多等待 {max_wait_time} 秒...")
 
-            try:
-                task_id, status, video_url, enhanced_prompt = querier.query(task_id, api_key, api_base)
-
-                if status == "completed":
-                    print(f"[ComfyUI_KuAi_Power] Grok 视频生成完成！")
-                    return (task_id, status, video_url, enhanced_prompt)
-                elif status == "failed":
-                    raise RuntimeError(f"Grok 视频生成失败，任务ID: {task_id}")
-
-                print(f"[ComfyUI_KuAi_Power] Grok 任务进行中... 已等待 {elapsed}/{max_wait_time} 秒")
-
-            except Exception as e:
-                print(f"[ComfyUI_KuAi_Power] Grok 查询出错: {str(e)}")
+        api_key = env_or(api_key, "KUAI_API_KEY")
+        started = time.time()
+
+        def on_update(_task_id, status, _data, _polls):
+            if status not in ("completed", "failed"):
+                log.debug(f"任务进行中... 已等待 {int(time.time() - started)}/{max_wait_time} 秒")
+
+        with metrics.tags(model="grok-video-3"):
+            future = get_poller().submit(
+                task_id, api_base, api_key,
+                poll_interval=poll_interval, timeout=max_wait_time, initial_delay=poll_interval,
+                on_update=on_update, max_errors=None, request_timeout=30,
+                schedule=adaptive_schedule(poll_interval, "grok-video-3"),
+            )
+        result = future.result()
+
+        if result.status == "completed":
+            log.debug("视频生成完成")
+            data = result.data or {}
+            return (task_id, result.status, data.get("video_url") or "", data.get("enhanced_prompt", "") or enhanced_prompt)
+        elif result.status == "failed":
+            raise RuntimeError(f"Grok 视频生成失败，任务ID: {task_id}")
 
         # 超时
         raise RuntimeError(
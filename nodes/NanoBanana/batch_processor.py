@@ -2,13 +2,63 @@
 
 import json
 import os
-import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import torch
-import numpy as np
 from PIL import Image
 
 from ...utils.kuai_utils import env_or
-from .nano_banana import NanoBananaAIO, pil_to_base64, to_pil_from_comfy
+from ...utils.concurrency import iter_ordered
+from ...utils.batch_tasks import open_tasks, iter_rows, MAX_REPORTED
+from ...utils.image_convert import pil_to_tensor, tensor_to_pil
+from ...utils.batch_journal import BatchJournal, SUBMITTED, COMPLETED, FAILED
+from ...utils.log import get_logger, ProgressReporter
+from .nano_banana import NanoBananaAIO
+
+log = get_logger("NanoBananaBatch")
+
+
+class _ReferenceMemo:
+    """一次批量处理内已解码的参考图（按路径 + 修改时间 + 大小，LRU）
+
+    多行复用同一文件时返回同一个 tensor，编码缓存据此跳过重复的像素哈希和 JPEG 编码；
+    只在 process_batch 期间存在，批量结束即释放（ComfyUI 会长期缓存节点实例）
+    """
+
+    MAX_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is None:
+                return None
+            self._items.move_to_end(key)
+            return cached[0]
+
+    def put(self, key, tensor):
+        nbytes = tensor.numel() * tensor.element_size()
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = (tensor, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, size) = self._items.popitem(last=False)
+                self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
 
 
 class NanoBananaBatchProcessor:
@@ -25,7 +75,12 @@ class NanoBananaBatchProcessor:
                 "api_base": ("STRING", {"default": "https://api.kuai.host", "tooltip": "API 端点地址"}),
                 "api_key": ("STRING", {"default": "", "tooltip": "API 密钥"}),
                 "output_dir": ("STRING", {"default": "./output/nanobana_batch", "tooltip": "输出目录"}),
-                "delay_between_tasks": ("FLOAT", {"default": 2.0, "min": 0.0, "max": 60.0, "step": 0.5, "tooltip": "任务间延迟(秒)"}),
+                "delay_between_tasks": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 60.0, "step": 0.5, "tooltip": "额外的任务间延迟（秒）；请求速率由全局限流器控制（RATE_LIMIT_RPM），一般保持 0 即可"}),
+            },
+            "optional": {
+                "max_in_flight": ("INT", {"default": 1, "min": 1, "max": 16, "tooltip": "同时进行的生成请求数（1 为逐个处理）"}),
+                "io_workers": ("INT", {"default": 2, "min": 1, "max": 8, "tooltip": "图片读取 / PNG 保存使用的线程数"}),
+                "resume": ("BOOLEAN", {"default": True, "tooltip": "断点续跑：跳过输出目录日志中已完成且图片仍存在的行；关闭则重新开始"}),
             }
         }
 
@@ -42,14 +97,18 @@ class NanoBananaBatchProcessor:
             "api_key": "API密钥",
             "output_dir": "输出目录",
             "delay_between_tasks": "任务间延迟",
+            "max_in_flight": "并发任务数",
+            "io_workers": "IO线程数",
+            "resume": "断点续跑",
         }
 
     def process_batch(self, batch_tasks, api_base="https://api.kuai.host", api_key="",
-                     output_dir="./output/nanobana_batch", delay_between_tasks=2.0):
+                     output_dir="./output/nanobana_batch", delay_between_tasks=0.0,
+                     max_in_flight=1, io_workers=2, resume=True):
         """批量处理图像生成任务"""
         try:
             # 解析任务数据
-            tasks = json.loads(batch_tasks)
+            tasks = open_tasks(batch_tasks)
             if not tasks:
                 raise ValueError("没有任务需要处理")
 
@@ -61,7 +120,7 @@ class NanoBananaBatchProcessor:
             # 创建输出目录
             os.makedirs(output_dir, exist_ok=True)
 
-            # 处理结果统计
+            # 处理结果统计（只保留计数和前 MAX_REPORTED 条失败明细）
             results = {
                 "total": len(tasks),
                 "success": 0,
@@ -69,47 +128,118 @@ class NanoBananaBatchProcessor:
                 "errors": []
             }
 
-            print(f"\n{'='*60}")
-            print(f"[NanoBananaBatch] 开始批量处理 {len(tasks)} 个任务")
-            print(f"[NanoBananaBatch] 输出目录: {output_dir}")
-            print(f"{'='*60}\n")
-
-            # 逐个处理任务
-            for idx, task in enumerate(tasks, start=1):
-                try:
-                    print(f"\n[{idx}/{len(tasks)}] 处理任务 (行 {task.get('_row_number', '?')})")
-
-                    # 处理单个任务
-                    self._process_single_task(task, idx, api_base, api_key, output_dir)
-
-                    results["success"] += 1
-                    print(f"✓ 任务 {idx} 完成")
-
-                except Exception as e:
-                    results["failed"] += 1
-                    error_msg = f"任务 {idx} (行 {task.get('_row_number', '?')}): {str(e)}"
-                    results["errors"].append(error_msg)
-                    print(f"\033[91m✗ {error_msg}\033[0m")
-
-                # 任务间延迟
-                if idx < len(tasks) and delay_between_tasks > 0:
-                    time.sleep(delay_between_tasks)
+            log.info(f"开始批量处理 {len(tasks)} 个任务 | 输出目录: {output_dir} | 并发任务数: {max_in_flight}")
+
+            # 断点续跑日志：每行状态变化立即落盘
+            journal = BatchJournal(output_dir, reset=not resume)
+            done = len(journal.entries(COMPLETED))
+            if done:
+                log.info(f"断点续跑: 日志中 {done} 个任务已完成，将跳过")
+
+            memo = _ReferenceMemo()
+            progress = ProgressReporter(log, len(tasks))
+
+            # 网络请求在任务线程中重叠执行；图片读取、编码和 PNG 写入交给独立的 IO 线程池，
+            # 任务线程提交保存后即可处理下一行
+            with ThreadPoolExecutor(max_workers=max(1, int(io_workers)),
+                                    thread_name_prefix="nanobanana-io") as io_pool:
+
+                def _worker(idx, row):
+                    # 返回 (行号, 行标识, 保存图片的 Future)；处理失败时 Future 中是异常
+                    task, key, prefix = row
+                    row_number = task.get('_row_number', '?')
+                    log.debug(f"[{idx}/{len(tasks)}] 处理任务 (行 {row_number})")
+                    progress.start()
+                    output_path = self._completed_output(journal, key)
+                    if output_path:
+                        log.debug(f"行 {idx} 已在上次运行中完成，跳过: {output_path}")
+                        progress.finish(skipped=True)
+                        skipped = Future()
+                        skipped.set_result(output_path)
+                        return row_number, key, skipped
+                    journal.record(key, SUBMITTED, row=idx)
+                    try:
+                        saved = self._process_single_task(task, idx, api_base, api_key, output_dir,
+                                                          io_pool=io_pool, output_prefix=prefix,
+                                                          journal=journal, key=key, memo=memo)
+                    except Exception as e:
+                        saved = Future()
+                        saved.set_exception(e)
+                    # 图片写入完成（IO 线程）时才算这一行结束
+                    saved.add_done_callback(lambda f: progress.finish(ok=f.exception() is None))
+                    return row_number, key, saved
+
+                # CSV 只读取一遍，行标识和输出文件名前缀在读取时逐行确定；按 CSV 行顺序逐个汇总（等待对应的保存完成）
+                rows = iter_rows(tasks, default="task", exists=self._prefix_taken(output_dir, journal))
+                for idx, _row, outcome, error in iter_ordered(
+                    rows, _worker,
+                    max_in_flight=max_in_flight,
+                    submit_delay=delay_between_tasks,
+                    thread_name_prefix="nanobanana-batch",
+                    keep_items=False,
+                ):
+                    if error is not None:
+                        # 日志写入等意外错误，行标识未知
+                        results["failed"] += 1
+                        error_msg = f"任务 {idx}: {str(error)}"
+                        if len(results["errors"]) < MAX_REPORTED:
+                            results["errors"].append(error_msg)
+                        log.warning(f"✗ {error_msg}", extra={"fields": {"event": "row_failed", "row": idx}})
+                        continue
+                    row_number, key, save_future = outcome
+                    try:
+                        output_path = save_future.result()
+                        results["success"] += 1
+                        log.debug(f"✓ 任务 {idx} 完成: {output_path}")
+                    except Exception as e:
+                        results["failed"] += 1
+                        error_msg = f"任务 {idx} (行 {row_number}): {str(e)}"
+                        if len(results["errors"]) < MAX_REPORTED:
+                            results["errors"].append(error_msg)
+                        log.warning(f"✗ {error_msg}", extra={"fields": {"event": "row_failed", "row": idx}})
+                        journal.record(key, FAILED, error=str(e))
+            memo.clear()
 
             # 生成结果报告
             report = self._generate_report(results)
-            print(f"\n{'='*60}")
-            print(report)
-            print(f"{'='*60}\n")
+            progress.close()
+            log.info(report)
 
             return (report, output_dir)
 
         except Exception as e:
             error_msg = f"批量处理失败: {str(e)}"
-            print(f"\033[91m[NanoBananaBatch] {error_msg}\033[0m")
+            log.error(error_msg)
             raise RuntimeError(error_msg)
 
-    def _process_single_task(self, task, task_idx, api_base, api_key, output_dir):
-        """处理单个任务"""
+    @staticmethod
+    def _prefix_taken(output_dir, journal):
+        """返回输出文件名前缀的占用检查（供 iter_rows 使用）
+
+        输出目录中已有、但不是本批次日志记录的图片（如关闭断点续跑时上次运行的结果）视为占用，
+        对应的行改用新的文件名，不覆盖已有文件
+        """
+        journaled = {entry.get("output_path") for entry in journal.entries(COMPLETED)}
+
+        def exists(prefix):
+            path = os.path.abspath(os.path.join(output_dir, f"{prefix}.png"))
+            return os.path.exists(path) and path not in journaled
+
+        return exists
+
+    @staticmethod
+    def _completed_output(journal, key):
+        """日志中已完成且图片文件仍存在时返回图片路径"""
+        entry = journal.get(key)
+        if entry and entry.get("state") == COMPLETED:
+            path = entry.get("output_path", "")
+            if path and os.path.exists(path):
+                return path
+        return None
+
+    def _process_single_task(self, task, task_idx, api_base, api_key, output_dir, io_pool=None, output_prefix=None,
+                             journal=None, key=None, memo=None):
+        """处理单个任务；传入 io_pool 时返回保存图片的 Future，否则直接返回输出路径"""
         # 解析任务参数
         task_type = task.get("task_type", "").lower()
         if task_type not in ["generate", "edit", "生图", "改图"]:
@@ -131,28 +261,23 @@ class NanoBananaBatchProcessor:
         image_size = task.get("image_size", "2K").strip()
         temperature = float(task.get("temperature", 1.0))
         use_search = task.get("use_search", "true").lower() in ["true", "1", "yes"]
-        output_prefix = task.get("output_prefix", f"task_{task_idx}").strip()
+        if output_prefix is None:
+            output_prefix = task.get("output_prefix", f"task_{task_idx}").strip()
 
-        # 处理参考图像（改图模式）
+        # 处理参考图像（改图模式），在 IO 线程池中解码
         reference_images = []
         if is_edit:
-            for i in range(1, 15):  # 最多14张参考图
-                img_path = task.get(f"image_{i}", "").strip()
-                if img_path:
-                    # 加载本地图片
-                    pil_img = self._load_image_from_path(img_path)
-                    # 转换为 ComfyUI IMAGE 格式
-                    img_np = np.array(pil_img).astype(np.float32) / 255.0
-                    img_tensor = torch.from_numpy(img_np)[None,]
-                    reference_images.append(img_tensor)
+            img_paths = [task.get(f"image_{i}", "").strip() for i in range(1, 15)]  # 最多14张参考图
+            img_paths = [p for p in img_paths if p]
+            if io_pool is not None:
+                reference_images = list(io_pool.map(lambda p: self._load_reference_tensor(p, memo), img_paths))
+            else:
+                reference_images = [self._load_reference_tensor(p, memo) for p in img_paths]
 
         # 调用生成器
-        print(f"  模型: {model_name}")
-        print(f"  提示词: {prompt[:50]}...")
-        if system_prompt:
-            print(f"  系统提示词: {system_prompt[:50]}...")
-        if is_edit:
-            print(f"  参考图数量: {len(reference_images)}")
+        log.debug(f"行 {task_idx}: 模型={model_name} 提示词={prompt[:50]}..."
+                  + (f" 系统提示词={system_prompt[:50]}..." if system_prompt else "")
+                  + (f" 参考图数量={len(reference_images)}" if is_edit else ""))
 
         # 准备参数
         kwargs = {
@@ -174,14 +299,9 @@ class NanoBananaBatchProcessor:
         for i, img_tensor in enumerate(reference_images, start=1):
             kwargs[f"image_{i}"] = img_tensor
 
-        # 生成图像
-        image_tensor, thinking, grounding = self.generator.generate_unified(**kwargs)
-
-        # 保存图像
-        output_path = self._save_image(image_tensor, output_dir, output_prefix)
-        print(f"  保存到: {output_path}")
+        # 生成图像（失败时抛出异常，原因记入失败列表和断点续跑日志）
+        image_tensor, thinking, grounding = self.generator.generate(**kwargs)
 
-        # 保存元数据
         metadata = {
             "task_type": task_type,
             "prompt": prompt,
@@ -191,10 +311,46 @@ class NanoBananaBatchProcessor:
             "thinking": thinking,
             "grounding": grounding,
         }
-        metadata_path = output_path.replace(".png", "_metadata.json")
+
+        if io_pool is not None:
+            return io_pool.submit(self._save_outputs, image_tensor, metadata, output_dir, output_prefix, journal, key)
+        return self._save_outputs(image_tensor, metadata, output_dir, output_prefix, journal, key)
+
+    def _save_outputs(self, image_tensor, metadata, output_dir, prefix, journal=None, key=None):
+        """保存图像和元数据，返回图像路径；写入完成后记入断点续跑日志"""
+        output_path = self._save_image(image_tensor, output_dir, prefix)
+        log.debug(f"保存到: {output_path}")
+
+        metadata_path = output_path[:-len(".png")] + "_metadata.json"
         with open(metadata_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
 
+        if journal is not None:
+            journal.record(key, COMPLETED, output_path=os.path.abspath(output_path))
+        return output_path
+
+    def _load_reference_tensor(self, img_path, memo=None):
+        """加载本地参考图并转换为 ComfyUI IMAGE 格式（传入 memo 时按路径 + 修改时间 + 大小复用已解码结果）"""
+        key = None
+        if memo is not None:
+            full_path = os.path.abspath(os.path.expanduser(img_path))
+            try:
+                stat = os.stat(full_path)
+                key = (full_path, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+
+        if key is not None:
+            cached = memo.get(key)
+            if cached is not None:
+                return cached
+
+        pil_img = self._load_image_from_path(img_path)
+        tensor = pil_to_tensor(pil_img)
+        if key is not None:
+            memo.put(key, tensor)
+        return tensor
+
     def _load_image_from_path(self, img_path):
         """从本地路径加载图片"""
         # 处理路径（支持相对路径和绝对路径）
@@ -218,15 +374,12 @@ class NanoBananaBatchProcessor:
         # 转换 tensor 到 PIL
         if isinstance(image_tensor, torch.Tensor):
             # 假设 tensor 格式是 [B, H, W, C]，取第一张
-            img_np = image_tensor[0].cpu().numpy()
-            img_np = (img_np * 255).astype(np.uint8)
-            pil_img = Image.fromarray(img_np)
+            pil_img = tensor_to_pil(image_tensor, 0)
         else:
             raise ValueError("不支持的图像格式")
 
-        # 生成文件名
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"{prefix}_{timestamp}.png"
+        # 生成文件名（由输出前缀决定，重复运行时结果可复现）
+        filename = f"{prefix}.png"
         output_path = os.path.join(output_dir, filename)
 
         # 保存图片
@@ -247,6 +400,8 @@ class NanoBananaBatchProcessor:
             lines.append("\n失败任务详情:")
             for error in results['errors']:
                 lines.append(f"  - {error}")
+            if results['failed'] > len(results['errors']):
+                lines.append(f"  ... 另有 {results['failed'] - len(results['errors'])} 个失败任务，详见日志")
 
         return "\n".join(lines)
 
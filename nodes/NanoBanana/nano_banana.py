@@ -2,21 +2,31 @@
 
 import io
 import json
-import time
 import base64
 import random
+import time
 import torch
-import numpy as np
-import requests
 from PIL import Image
 
+from ...utils import http_client, metrics
+from ...utils.retry import new_idempotency_key
+from ...utils.rate_limit import throttle
+from ...utils.concurrency import run_ordered
+from ...utils.result_cache import get_result_cache, request_fingerprint
+from ...utils.encode_cache import encode_image
+from ...utils.reference_prep import prepare_references, reference_profile
+from ...utils.image_convert import decode_to_tensor, pil_to_tensor
+from ...utils.gemini_stream import GeminiBlockedError, InlineBlob, read_json_response
+from ...utils.chat_history import ChatHistory
+from ...utils.log import get_logger
 from ...utils.kuai_utils import (
     env_or,
-    to_pil_from_comfy,
     http_headers_json,
     raise_for_bad_status
 )
 
+log = get_logger("NanoBanana")
+
 
 def pil_to_base64(pil_image: Image.Image, format: str = "PNG") -> str:
     """将 PIL 图像转换为 base64 字符串"""
@@ -72,6 +82,8 @@ class NanoBananaAIO:
                 "api_base": ("STRING", {"default": "https://api.kuai.host", "tooltip": "API 端点地址"}),
                 "api_key": ("STRING", {"default": "", "tooltip": "API 密钥"}),
                 "timeout": ("INT", {"default": 180, "min": 60, "max": 900, "tooltip": "超时时间(秒)"}),
+                "max_concurrency": ("INT", {"default": 4, "min": 1, "max": 10, "tooltip": "多图生成时同时进行的请求数"}),
+                "use_cache": ("BOOLEAN", {"default": True, "tooltip": "固定种子时复用磁盘上相同请求的生成结果（随机种子不缓存）"}),
             }
         }
 
@@ -109,68 +121,76 @@ class NanoBananaAIO:
             "api_base": "API地址",
             "api_key": "API密钥",
             "timeout": "超时",
+            "max_concurrency": "并发数",
+            "use_cache": "结果缓存",
         }
 
     def _handle_error(self, message):
         """统一错误处理"""
-        print(f"\033[91m[NanoBanana] 错误: {message}\033[0m")
+        log.error(f"错误: {message}")
         return (torch.zeros(1, 64, 64, 3), "", "")
 
-    def generate_unified(self, model_name, prompt, image_count=1, use_search=True, seed=0,
-                        system_prompt="", image_1=None, image_2=None, image_3=None, image_4=None, image_5=None, image_6=None, image_7=None, image_8=None, image_9=None, image_10=None, image_11=None, image_12=None, image_13=None, image_14=None,
-                        aspect_ratio="1:1", image_size="2K", temperature=1.0,
-                        api_base="https://api.kuai.host", api_key="", timeout=120):
-        """统一生成接口"""
+    def generate_unified(self, *args, **kwargs):
+        """统一生成接口（节点入口）：失败时输出错误占位图，参数见 generate"""
         try:
-            # 验证参数
-            if not prompt or prompt.strip() == "":
-                return self._handle_error("提示词不能为空")
-
-            if image_count < 1 or image_count > 10:
-                return self._handle_error("图像数量必须在 1-10 之间")
-
-            # 获取 API Key
-            api_key = env_or(api_key, "KUAI_API_KEY")
-            if not api_key:
-                return self._handle_error("未配置 API Key，请设置 KUAI_API_KEY 环境变量或在节点中填写")
-
-            # 处理种子值：0表示随机（INT32范围）
-            if seed == 0:
-                actual_seed = random.randint(1, 2147483647)
-                print(f"[NanoBanana] 使用随机种子: {actual_seed}")
-            else:
-                actual_seed = seed
-                print(f"[NanoBanana] 使用固定种子: {actual_seed}")
-
-            # 准备参考图像（转换为 base64）
-            reference_images_base64 = []
-            for img_tensor in [image_1, image_2, image_3, image_4, image_5, image_6, image_7, image_8, image_9, image_10, image_11, image_12, image_13, image_14]:
-                if img_tensor is not None:
-                    try:
-                        pil_img = to_pil_from_comfy(img_tensor)
-                        base64_str = pil_to_base64(pil_img, format="JPEG")
-                        reference_images_base64.append(base64_str)
-                    except Exception as e:
-                        print(f"[NanoBanana] 警告: 转换参考图失败: {e}")
-
-            # 根据图像数量选择生成方式
-            if image_count == 1:
-                return self._generate_single_image(
-                    api_base, api_key, model_name, prompt, system_prompt, reference_images_base64,
-                    aspect_ratio, image_size, temperature, use_search, actual_seed, timeout
-                )
-            else:
-                return self._generate_multiple_images(
-                    api_base, api_key, model_name, prompt, system_prompt, image_count, reference_images_base64,
-                    aspect_ratio, image_size, temperature, use_search, actual_seed, timeout
-                )
-
+            return self.generate(*args, **kwargs)
         except Exception as e:
             return self._handle_error(f"生成失败: {str(e)}")
 
+    @metrics.tagged(model="model_name")
+    def generate(self, model_name, prompt, image_count=1, use_search=True, seed=0,
+                 system_prompt="", image_1=None, image_2=None, image_3=None, image_4=None, image_5=None, image_6=None, image_7=None, image_8=None, image_9=None, image_10=None, image_11=None, image_12=None, image_13=None, image_14=None,
+                 aspect_ratio="1:1", image_size="2K", temperature=1.0,
+                 api_base="https://api.kuai.host", api_key="", timeout=120, max_concurrency=4,
+                 use_cache=True):
+        """生成图像，返回 (图像, 思考过程, 引用来源)；失败时抛出异常（批量处理据此记录失败原因）"""
+        # 验证参数
+        if not prompt or prompt.strip() == "":
+            raise ValueError("提示词不能为空")
+
+        if image_count < 1 or image_count > 10:
+            raise ValueError("图像数量必须在 1-10 之间")
+
+        # 获取 API Key
+        api_key = env_or(api_key, "KUAI_API_KEY")
+        if not api_key:
+            raise ValueError("未配置 API Key，请设置 KUAI_API_KEY 环境变量或在节点中填写")
+
+        # 处理种子值：0表示随机（INT32范围）
+        if seed == 0:
+            actual_seed = random.randint(1, 2147483647)
+            log.debug(f"使用随机种子: {actual_seed}")
+        else:
+            actual_seed = seed
+            log.debug(f"使用固定种子: {actual_seed}")
+
+        # 准备参考图像：按模型缩小并编码为 JPEG（并行，相同像素只编码一次），摘要同时用作结果缓存的键
+        references = prepare_references(
+            [image_1, image_2, image_3, image_4, image_5, image_6, image_7, image_8, image_9, image_10, image_11, image_12, image_13, image_14],
+            model_name,
+        )
+        reference_images_base64 = references.b64
+        reference_digests = references.digests
+
+        # 只有固定种子的请求结果可复现，随机种子不走缓存
+        cache_opts = {"reference_digests": reference_digests, "use_cache": bool(use_cache) and seed != 0}
+
+        # 根据图像数量选择生成方式
+        if image_count == 1:
+            return self._generate_single_image(
+                api_base, api_key, model_name, prompt, system_prompt, reference_images_base64,
+                aspect_ratio, image_size, temperature, use_search, actual_seed, timeout, **cache_opts
+            )
+        return self._generate_multiple_images(
+            api_base, api_key, model_name, prompt, system_prompt, image_count, reference_images_base64,
+            aspect_ratio, image_size, temperature, use_search, actual_seed, timeout,
+            max_concurrency=max_concurrency, **cache_opts
+        )
+
     def _generate_single_image(self, api_base, api_key, model_name, prompt, system_prompt, reference_images_base64,
-                               aspect_ratio, image_size, temperature, use_search, seed, timeout):
-        """生成单张图像"""
+                               aspect_ratio, image_size, temperature, use_search, seed, timeout,
+                               reference_digests=None, use_cache=False):
+        """生成单张图像，失败时抛出 RuntimeError；use_cache 时先查磁盘结果缓存，成功结果写入缓存"""
         # 使用 Google Gemini API 格式: /v1beta/models/{model}:generateContent
         endpoint = api_base.rstrip("/") + f"/v1beta/models/{model_name}:generateContent"
 
@@ -224,95 +244,124 @@ class NanoBananaAIO:
         if use_search and model_name in ("gemini-3-pro-image-preview", "gemini-3.1-flash-image-preview"):
             payload["tools"] = [{"googleSearch": {}}]
 
+        cache_key = None
+        if use_cache:
+            cache_key = request_fingerprint(api_base, model_name, payload, reference_digests)
+            cached = get_result_cache().get(cache_key)
+            if cached is not None:
+                image_bytes, meta = cached
+                try:
+                    image_tensor = decode_to_tensor(image_bytes)
+                    log.debug(f"命中结果缓存: {cache_key[:12]}")
+                    return (image_tensor, meta.get("thinking", ""), meta.get("grounding", ""))
+                except Exception as e:
+                    log.warning(f"缓存条目损坏，重新生成: {e}")
+
+        throttle(api_base, api_key, model_name)
         try:
-            resp = requests.post(
+            resp = http_client.post(
                 endpoint,
                 headers=http_headers_json(api_key),
                 data=json.dumps(payload),
-                timeout=int(timeout)
+                timeout=int(timeout),
+                stream=True,
+                idempotency_key=new_idempotency_key()
             )
             raise_for_bad_status(resp, "Nano Banana 生成失败")
-            data = resp.json()
+            # 流式读取：图像 base64 边读边解码，不在内存中保留整个 JSON
+            data = read_json_response(resp)
         except Exception as e:
-            return self._handle_error(f"API 调用失败: {str(e)}")
+            raise RuntimeError(f"API 调用失败: {str(e)}") from e
 
         # 解析 Gemini API 响应格式
-        try:
-            candidates = data.get("candidates", [])
-            if not candidates:
-                return self._handle_error("API 返回的 candidates 为空")
+        candidates = data.get("candidates", [])
+        if not candidates:
+            raise RuntimeError("API 返回的 candidates 为空")
 
+        try:
             candidate = candidates[0]
             content = candidate.get("content", {})
             parts = content.get("parts", [])
 
             # 提取图像和文本
-            image_base64 = None
+            image_blob = None
             thinking = ""
 
             for part in parts:
                 # 检查 inline_data（图像）
                 if "inlineData" in part or "inline_data" in part:
                     inline_data = part.get("inlineData") or part.get("inline_data")
-                    image_base64 = inline_data.get("data")
+                    image_blob = inline_data.get("data")
                 # 检查 text（文本）
                 elif "text" in part:
                     thinking += part.get("text", "")
 
-            if not image_base64:
-                return self._handle_error(f"响应中缺少图像数据: {json.dumps(data, ensure_ascii=False)}")
-
             # 提取 grounding 信息
             grounding_metadata = candidate.get("groundingMetadata", )
             grounding_sources = self._extract_grounding_info(grounding_metadata, thinking)
 
         except Exception as e:
-            return self._handle_error(f"解析响应失败: {str(e)}")
+            raise RuntimeError(f"解析响应失败: {str(e)}") from e
 
-        # 解码 base64 图像
+        if not isinstance(image_blob, InlineBlob) or not image_blob.size:
+            raise RuntimeError(f"响应中缺少图像数据: {json.dumps(data, ensure_ascii=False, default=repr)}")
+
+        # 解码图像（直接解码为 tensor）
         try:
-            pil_image = base64_to_pil(image_base64)
+            image_tensor = decode_to_tensor(image_blob.open())
         except Exception as e:
-            return self._handle_error(f"解码图像失败: {str(e)}")
+            raise RuntimeError(f"解码图像失败: {str(e)}") from e
 
-        # 转换为 tensor
-        image_np = np.array(pil_image).astype(np.float32) / 255.0
-        image_tensor = torch.from_numpy(image_np)[None,]
+        if cache_key:
+            try:
+                get_result_cache().put(cache_key, image_blob.read_bytes(), {"thinking": thinking, "grounding": grounding_sources})
+            except OSError as e:
+                log.warning(f"写入结果缓存失败: {e}")
 
         return (image_tensor, thinking, grounding_sources)
 
     def _generate_multiple_images(self, api_base, api_key, model_name, prompt, system_prompt, image_count, reference_images_base64,
-                                  aspect_ratio, image_size, temperature, use_search, seed, timeout):
-        """生成多张图像"""
+                                  aspect_ratio, image_size, temperature, use_search, seed, timeout, max_concurrency=4,
+                                  reference_digests=None, use_cache=False):
+        """生成多张图像：N 个不同种子的请求有界并发发出，成功的图像按种子顺序返回"""
         generated_images = []
         all_thinking = []
         all_grounding = []
 
-        for i in range(image_count):
-            # 为每张图像添加序号和不同的种子值
-            current_prompt = f"{prompt} (Image {i+1} of {image_count})"
-            current_seed = seed + i  # 每张图像使用不同的种子值
-
-            image_tensor, thinking, grounding = self._generate_single_image(
+        def _worker(idx, current_seed):
+            # 为每张图像添加序号
+            current_prompt = f"{prompt} (Image {idx} of {image_count})"
+            return self._generate_single_image(
                 api_base, api_key, model_name, current_prompt, system_prompt, reference_images_base64,
-                aspect_ratio, image_size, temperature, use_search, current_seed, timeout
+                aspect_ratio, image_size, temperature, use_search, current_seed, timeout,
+                reference_digests=reference_digests, use_cache=use_cache
             )
 
-            # 检查是否生成成功
-            if image_tensor.shape[1] == 64 and image_tensor.shape[2] == 64:
-                # 这是错误占位符，停止生成
-                break
+        # 每张图像使用不同的种子值（seed, seed+1, ...）
+        outcomes = run_ordered(
+            [seed + i for i in range(image_count)], _worker,
+            max_in_flight=min(image_count, max(1, int(max_concurrency))),
+            thread_name_prefix="nanobanana-gen",
+        )
+
+        errors = []
+        for idx, current_seed, result, error in outcomes:
+            # 失败的一张跳过，继续汇总其余图像
+            if error is not None:
+                log.warning(f"第 {idx} 张 (种子 {current_seed}) 生成失败: {error}")
+                errors.append(error)
+                continue
+            image_tensor, thinking, grounding = result
 
             generated_images.append(image_tensor)
             all_thinking.append(thinking)
             all_grounding.append(grounding)
 
-            # 避免请求过快
-            if i < image_count - 1:
-                time.sleep(1)
+        if errors:
+            log.info(f"{image_count} 张中成功 {len(generated_images)} 张，失败 {len(errors)} 张")
 
         if not generated_images:
-            return self._handle_error("未能生成任何图像")
+            raise RuntimeError(f"未能生成任何图像: {errors[0]}")
 
         # 合并结果
         combined_images = torch.cat(generated_images, dim=0)
@@ -350,8 +399,7 @@ class NanoBananaMultiTurnChat:
     """Nano Banana 多轮对话节点：支持基于对话历史的迭代图像生成和编辑"""
 
     def __init__(self):
-        self.conversation_history = []
-        self.last_image_base64 = None  # 保存上一轮生成的图像 base64
+        self.history = None  # ChatHistory：文本与图像引用；命名会话的图像按内容哈希存放在磁盘上，临时会话只在内存中
         self._preview_warning_shown = False
 
     @classmethod
@@ -375,6 +423,8 @@ class NanoBananaMultiTurnChat:
                 "api_base": ("STRING", {"default": "https://api.kuai.host", "tooltip": "API 端点地址"}),
                 "api_key": ("STRING", {"default": "", "tooltip": "API 密钥"}),
                 "timeout": ("INT", {"default": 120, "min": 5, "max": 600, "tooltip": "超时时间(秒)"}),
+                "session_id": ("STRING", {"default": "", "tooltip": "对话会话ID：填写后对话历史保存到磁盘，重启 ComfyUI 后可继续；留空为临时会话"}),
+                "history_images": ("INT", {"default": 4, "min": 0, "max": 14, "tooltip": "每次请求附带的最近历史图像数量（文本历史全部保留）"}),
             }
         }
 
@@ -399,24 +449,40 @@ class NanoBananaMultiTurnChat:
             "api_base": "API地址",
             "api_key": "API密钥",
             "timeout": "超时",
+            "session_id": "会话ID",
+            "history_images": "历史图像数",
         }
 
     def _handle_error(self, message):
         """统一错误处理"""
-        print(f"\033[91m[NanoBanana] 错误: {message}\033[0m")
+        log.error(f"错误: {message}")
         return (torch.zeros(1, 64, 64, 3), "", "", "")
 
+    def _get_history(self, session_id):
+        """取得当前会话的历史；会话ID变化时切换（持久会话从磁盘恢复）"""
+        session_id = (session_id or "").strip()
+        history = self.history
+        if history is None or (session_id and history.session_id != session_id) or (not session_id and history.persistent):
+            self.history = ChatHistory(session_id)
+        return self.history
+
+    def on_stream_text(self, text, elapsed):
+        """流式响应的进度回调：每个文本片段到达时调用（elapsed 为请求发出后的秒数）"""
+        log.info(f"多轮对话 +{elapsed:.1f}s: {text.strip()[:200]}")
+
+    @metrics.tagged(model="model_name")
     def generate_multiturn_image(self, model_name, prompt, reset_chat=False, use_search=True, seed=0,
                                 aspect_ratio="1:1", image_size="2K", temperature=1.0,
                                 system_prompt="", image_input=None, api_base="https://api.kuai.host",
-                                api_key="", timeout=120):
+                                api_key="", timeout=120, session_id="", history_images=4):
         """多轮对话图像生成"""
         try:
+            history = self._get_history(session_id)
+
             # 重置对话
             if reset_chat:
-                self.conversation_history = []
-                self.last_image_base64 = None
-                print("[NanoBanana] 对话已重置")
+                history.reset()
+                log.info("对话已重置")
 
             # 验证参数
             if not prompt or prompt.strip() == "":
@@ -430,56 +496,42 @@ class NanoBananaMultiTurnChat:
             # 处理种子值：0表示随机（INT32范围）
             if seed == 0:
                 actual_seed = random.randint(1, 2147483647)
-                print(f"[NanoBanana] 使用随机种子: {actual_seed}")
+                log.debug(f"使用随机种子: {actual_seed}")
             else:
                 actual_seed = seed
-                print(f"[NanoBanana] 使用固定种子: {actual_seed}")
+                log.debug(f"使用固定种子: {actual_seed}")
 
             # 使用 Gemini Chat API 格式
             endpoint = api_base.rstrip("/") + f"/v1beta/models/{model_name}:streamGenerateContent"
 
-            # 构建 contents（Gemini Chat API 格式）
-            contents = []
-
-            # 添加历史对话
-            for msg in self.conversation_history:
-                parts = []
-                # 添加图像（如果有）
-                if "image_base64" in msg:
-                    parts.append({
-                        "inline_data": {
-                            "mime_type": "image/jpeg",
-                            "data": msg["image_base64"]
-                        }
-                    })
-                # 添加文本
-                parts.append({"text": msg["content"]})
-                contents.append({"role": msg["role"], "parts": parts})
+            # 构建 contents（Gemini Chat API 格式）：文本历史全部保留，只附带最近 history_images 张图像
+            contents = history.contents(int(history_images))
 
             # 添加当前消息
             current_parts = []
+            user_image = None
 
             # 1. 如果是首次对话且有输入图像，使用输入图像
-            if len(self.conversation_history) == 0 and image_input is not None:
+            if len(history) == 0 and image_input is not None:
                 try:
-                    pil_img = to_pil_from_comfy(image_input)
-                    image_base64 = pil_to_base64(pil_img, format="JPEG")
+                    max_edge, quality = reference_profile(model_name)
+                    input_base64 = encode_image(image_input, fmt="JPEG", quality=quality, max_edge=max_edge).b64
                     current_parts.append({
                         "inline_data": {
                             "mime_type": "image/jpeg",
-                            "data": image_base64
+                            "data": input_base64
                         }
                     })
+                    user_image = history.put_image(base64.b64decode(input_base64), "image/jpeg")
                 except Exception as e:
-                    print(f"[NanoBanana] 警告: 转换输入图像失败: {e}")
+                    log.warning(f"转换输入图像失败: {e}")
             # 2. 如果有上一轮生成的图像，使用它
-            elif self.last_image_base64:
-                current_parts.append({
-                    "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": self.last_image_base64
-                    }
-                })
+            elif history.last_image:
+                try:
+                    current_parts.append(history.inline_part(history.last_image))
+                    user_image = history.last_image
+                except OSError as e:
+                    log.warning(f"读取上一轮图像失败: {e}")
 
             # 添加当前提示词
             current_parts.append({"text": prompt})
@@ -519,15 +571,21 @@ class NanoBananaMultiTurnChat:
             if use_search and model_name in ("gemini-3-pro-image-preview", "gemini-3.1-flash-image-preview"):
                 payload["tools"] = [{"googleSearch": {}}]
 
+            throttle(api_base, api_key, model_name)
             try:
-                resp = requests.post(
+                started = time.time()
+                resp = http_client.post(
                     endpoint,
                     headers=http_headers_json(api_key),
                     data=json.dumps(payload),
-                    timeout=int(timeout)
+                    timeout=int(timeout),
+                    stream=True
                 )
                 raise_for_bad_status(resp, "多轮对话生成失败")
-                data = resp.json()
+                # 逐块读取 streamGenerateContent 响应：文本到达即输出，被安全策略拦截时立即中止
+                data = read_json_response(resp, on_text=lambda text: self.on_stream_text(text, time.time() - started))
+            except GeminiBlockedError as e:
+                return self._handle_error(str(e))
             except Exception as e:
                 return self._handle_error(f"API 调用失败: {str(e)}")
 
@@ -542,18 +600,21 @@ class NanoBananaMultiTurnChat:
                 parts = content.get("parts", [])
 
                 # 提取图像和文本
-                image_base64 = None
+                image_blob = None
                 response_text = ""
 
+                image_mime = "image/png"
+
                 for part in parts:
                     if "inlineData" in part or "inline_data" in part:
                         inline_data = part.get("inlineData") or part.get("inline_data")
-                        image_base64 = inline_data.get("data")
+                        image_blob = inline_data.get("data")
+                        image_mime = inline_data.get("mimeType") or inline_data.get("mime_type") or image_mime
                     elif "text" in part:
                         response_text += part.get("text", "")
 
-                if not image_base64:
-                    return self._handle_error(f"响应中缺少图像数据: {json.dumps(data, ensure_ascii=False)}")
+                if not isinstance(image_blob, InlineBlob) or not image_blob.size:
+                    return self._handle_error(f"响应中缺少图像数据: {json.dumps(data, ensure_ascii=False, default=repr)}")
 
                 # 提取元数据
                 finish_reason = candidate.get("finishReason", "UNKNOWN")
@@ -562,47 +623,26 @@ class NanoBananaMultiTurnChat:
             except Exception as e:
                 return self._handle_error(f"解析响应失败: {str(e)}")
 
-            # 解码图像
+            # 解码图像（原始字节按内容哈希存入历史，下一轮作为参考图发送）
             try:
-                pil_image = base64_to_pil(image_base64)
+                pil_image = Image.open(image_blob.open()).convert("RGB")
+                model_image = history.put_image(image_blob.read_bytes(), image_mime)
             except Exception as e:
                 return self._handle_error(f"解码图像失败: {str(e)}")
 
-            # 更新对话历史和图像状态
-            # 保存用户消息
-            user_msg = {"role": "user", "content": prompt}
-            if len(self.conversation_history) == 0 and image_input is not None:
-                pil_img = to_pil_from_comfy(image_input)
-                user_msg["image_base64"] = pil_to_base64(pil_img, format="JPEG")
-            elif self.last_image_base64:
-                user_msg["image_base64"] = self.last_image_base64
-
-            self.conversation_history.append(user_msg)
-
-            # 保存助手响应
-            self.conversation_history.append({
-                "role": "model",  # Gemini 使用 "model" 而不是 "assistant"
-                "content": response_text if response_text else "Image generated",
-                "image_base64": image_base64
-            })
-            self.last_image_base64 = image_base64
+            # 更新对话历史：用户消息和助手响应（Gemini 使用 "model" 而不是 "assistant"）
+            history.append("user", prompt, user_image)
+            history.append("model", response_text if response_text else "Image generated", model_image)
+            try:
+                history.save()
+            except OSError as e:
+                log.warning(f"保存对话历史失败: {e}")
 
             # 转换为 tensor
-            image_np = np.array(pil_image).astype(np.float32) / 255.0
-            image_tensor = torch.from_numpy(image_np)[None,]
-
-            # 格式化对话历史（不包含 base64 数据，太长了）
-            chat_history_display = []
-            for msg in self.conversation_history:
-                display_msg = {
-                    "role": msg["role"],
-                    "content": msg["content"]
-                }
-                if "image_base64" in msg:
-                    display_msg["has_image"] = True
-                chat_history_display.append(display_msg)
+            image_tensor = pil_to_tensor(pil_image)
 
-            chat_history_str = json.dumps(chat_history_display, ensure_ascii=False, indent=2)
+            # 格式化对话历史（不包含图像数据）
+            chat_history_str = json.dumps(history.display(), ensure_ascii=False, indent=2)
 
             return (image_tensor, response_text, metadata, chat_history_str)
 
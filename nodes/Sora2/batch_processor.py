@@ -4,8 +4,15 @@ import json
 import os
 import time
 from ...utils.kuai_utils import env_or
+from ...utils.concurrency import iter_ordered
+from ...utils.batch_tasks import open_tasks, iter_rows, TaskListWriter, MAX_REPORTED
+from ...utils.batch_journal import BatchJournal, RemoteTaskFailed, SUBMITTED, POLLING, COMPLETED, FAILED
+from ...utils.downloader import BatchDownloader, apply_media_results
+from ...utils.log import get_logger, ProgressReporter
 from .sora2 import SoraCreateVideo, SoraText2Video, SoraQueryTask
 
+log = get_logger("Sora2Batch")
+
 
 class Sora2BatchProcessor:
     """Sora2 视频批量生成处理器"""
@@ -32,11 +39,11 @@ class Sora2BatchProcessor:
                     "tooltip": "输出目录"
                 }),
                 "delay_between_tasks": ("FLOAT", {
-                    "default": 2.0,
+                    "default": 0.0,
                     "min": 0.0,
                     "max": 60.0,
                     "step": 0.5,
-                    "tooltip": "任务间延迟（秒）"
+                    "tooltip": "额外的任务间延迟（秒）；请求速率由全局限流器控制（RATE_LIMIT_RPM），一般保持 0 即可"
                 }),
             },
             "optional": {
@@ -60,6 +67,26 @@ class Sora2BatchProcessor:
                     "max": 90,
                     "tooltip": "轮询间隔（秒）"
                 }),
+                "max_in_flight": ("INT", {
+                    "default": 1,
+                    "min": 1,
+                    "max": 32,
+                    "tooltip": "同时进行中的任务数上限（1 为逐个处理）"
+                }),
+                "resume": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "断点续跑：跳过输出目录日志中已完成的行，重新挂接已提交的任务；关闭则重新开始"
+                }),
+                "download_media": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "等待完成时，每个任务完成后立即把视频/GIF/缩略图下载到输出目录（<output_prefix>.mp4），与其余任务的生成同时进行"
+                }),
+                "download_workers": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 16,
+                    "tooltip": "同时下载的文件数"
+                }),
             }
         }
 
@@ -74,6 +101,10 @@ class Sora2BatchProcessor:
             "wait_for_completion": "等待完成",
             "max_wait_time": "最大等待时间",
             "poll_interval": "轮询间隔",
+            "max_in_flight": "并发任务数",
+            "resume": "断点续跑",
+            "download_media": "自动下载",
+            "download_workers": "下载并发数",
         }
 
     RETURN_TYPES = ("STRING", "STRING")
@@ -82,12 +113,13 @@ class Sora2BatchProcessor:
     CATEGORY = "KuAi/Sora2"
 
     def process_batch(self, batch_tasks, api_key="", output_dir="./output/sora2_batch",
-                     delay_between_tasks=2.0, api_base="https://api.kuai.host",
-                     wait_for_completion=False, max_wait_time=1200, poll_interval=15):
+                     delay_between_tasks=0.0, api_base="https://api.kuai.host",
+                     wait_for_completion=False, max_wait_time=1200, poll_interval=15,
+                     max_in_flight=1, resume=True, download_media=True, download_workers=4):
         """批量生成视频"""
         try:
             # 解析任务数据
-            tasks = json.loads(batch_tasks)
+            tasks = open_tasks(batch_tasks)
             if not tasks:
                 raise ValueError("没有任务需要处理")
 
@@ -99,7 +131,7 @@ class Sora2BatchProcessor:
             # 创建输出目录
             os.makedirs(output_dir, exist_ok=True)
 
-            # 处理结果统计
+            # 处理结果统计（只保留计数和前 MAX_REPORTED 条明细，完整列表见 tasks.json）
             results = {
                 "total": len(tasks),
                 "success": 0,
@@ -108,58 +140,108 @@ class Sora2BatchProcessor:
                 "video_tasks": []
             }
 
-            print(f"\n{'='*60}")
-            print(f"[Sora2Batch] 开始批量生成 {len(tasks)} 个视频")
-            print(f"[Sora2Batch] 输出目录: {output_dir}")
-            print(f"[Sora2Batch] 等待完成: {'是' if wait_for_completion else '否'}")
-            print(f"{'='*60}\n")
+            log.info(f"开始批量生成 {len(tasks)} 个视频 | 输出目录: {output_dir} | "
+                     f"等待完成: {'是' if wait_for_completion else '否'} | 并发任务数: {max_in_flight}")
 
-            # 逐个处理任务
-            for idx, task in enumerate(tasks, start=1):
-                try:
-                    print(f"\n[{idx}/{len(tasks)}] 处理任务 (行 {task.get('_row_number', '?')})")
+            # 断点续跑日志：每行状态变化立即落盘
+            journal = BatchJournal(output_dir, reset=not resume)
+            done = len(journal.entries(COMPLETED))
+            if done:
+                log.info(f"断点续跑: 日志中 {done} 个任务已完成，将跳过")
+
+            # 下载流水线：任务完成即开始下载
+            downloads = BatchDownloader(download_workers, label="Sora2Batch") if download_media and wait_for_completion else None
+
+            progress = ProgressReporter(log, len(tasks))
 
-                    # 处理单个任务
+            def _worker(idx, row):
+                task, key, prefix = row
+                log.debug(f"[{idx}/{len(tasks)}] 处理任务 (行 {task.get('_row_number', '?')})")
+                progress.start()
+                ok = resumed = False
+                try:
                     task_info = self._process_single_task(
                         task, idx, api_key, api_base, output_dir,
-                        wait_for_completion, max_wait_time, poll_interval
+                        wait_for_completion, max_wait_time, poll_interval,
+                        journal=journal, key=key, downloads=downloads,
+                        output_prefix=prefix
                     )
-
-                    results["success"] += 1
-                    results["video_tasks"].append(task_info)
-                    print(f"✓ 任务 {idx} 完成")
-
-                except Exception as e:
-                    results["failed"] += 1
-                    error_msg = f"任务 {idx}: {str(e)}"
-                    results["errors"].append(error_msg)
-                    print(f"✗ {error_msg}")
-
-                # 任务间延迟
-                if idx < len(tasks) and delay_between_tasks > 0:
-                    time.sleep(delay_between_tasks)
-
-            # 保存任务列表
-            tasks_file = os.path.join(output_dir, "tasks.json")
-            with open(tasks_file, 'w', encoding='utf-8') as f:
-                json.dump(results["video_tasks"], f, ensure_ascii=False, indent=2)
+                    resumed = task_info.pop("_resumed", False)
+                    ok = True
+                    return task_info
+                finally:
+                    progress.finish(ok=ok, skipped=resumed)
+
+            def _on_result(idx, row, task_info, error):
+                task, key, _prefix = row
+                if error is None:
+                    log.debug(f"✓ 任务 {idx} 完成")
+                else:
+                    log.warning(f"✗ 任务 {idx} (行 {task.get('_row_number', '?')}): {str(error)}",
+                                extra={"fields": {"event": "row_failed", "row": idx}})
+                    # 未能提交的行记为失败，下次运行重新提交（远端失败的行已记录）
+                    if not isinstance(error, RemoteTaskFailed) and journal.state(key) not in (SUBMITTED, POLLING):
+                        journal.record(key, FAILED, row=idx, error=str(error))
+
+            # 有界并发处理任务；CSV 只读取一遍，行标识和输出文件名前缀（空值补默认名，重复的追加行序号）
+            # 在读取时逐行确定，结果按 CSV 行顺序逐个汇总并写入任务列表
+            task_list = TaskListWriter(os.path.join(output_dir, "tasks.json"))
+            media_results = []
+            try:
+                for idx, _row, task_info, error in iter_ordered(
+                    iter_rows(tasks, default="video"), _worker,
+                    max_in_flight=max_in_flight,
+                    submit_delay=delay_between_tasks,
+                    on_result=_on_result,
+                    thread_name_prefix="sora2-batch",
+                    keep_items=False,
+                ):
+                    if error is None:
+                        results["success"] += 1
+                        task_list.add(task_info)
+                        if len(results["video_tasks"]) < MAX_REPORTED:
+                            results["video_tasks"].append(f"{task_info['task_id']}: {task_info['prompt'][:30]}...")
+                    else:
+                        results["failed"] += 1
+                        if len(results["errors"]) < MAX_REPORTED:
+                            results["errors"].append(f"任务 {idx}: {str(error)}")
+            finally:
+                if downloads is not None:
+                    log.info("等待剩余下载完成...")
+                    media_results = downloads.close()
+                    results["downloaded"], results["download_errors"] = apply_media_results(media_results)
+                # 保存任务列表（下载结果写回后的任务信息替换先写入的版本）
+                task_list.close(updated=(task_info for (task_info, _field), _result in media_results))
 
             # 生成结果报告
             report = self._generate_report(results)
-            print(f"\n{'='*60}")
-            print(report)
-            print(f"{'='*60}\n")
+            progress.close()
+            log.info(report)
 
             return (report, output_dir)
 
         except Exception as e:
             error_msg = f"批量处理失败: {str(e)}"
-            print(f"[Sora2Batch] {error_msg}")
+            log.error(error_msg)
             raise RuntimeError(error_msg)
 
     def _process_single_task(self, task, task_idx, api_key, api_base, output_dir,
-                            wait_for_completion, max_wait_time, poll_interval):
+                            wait_for_completion, max_wait_time, poll_interval,
+                            journal=None, key=None, downloads=None, output_prefix=None):
         """处理单个视频生成任务"""
+        if output_prefix is None:
+            output_prefix = (task.get("output_prefix") or "").strip() or f"video_{task_idx}"
+        entry = journal.get(key) if journal else None
+        state = entry.get("state") if entry else ""
+        if state == COMPLETED or (state == SUBMITTED and not wait_for_completion):
+            log.debug(f"行 {task_idx} 已在上次运行中{'完成' if state == COMPLETED else '提交'}，跳过: {entry.get('task_id')}")
+            task_info = dict(entry["info"], _resumed=True)
+            if downloads is not None and state == COMPLETED:
+                # 补下载上次未完成的文件；已存在的文件不再请求（URL 可能已过期）
+                downloads.submit_media(task_info, output_dir, task_info.get("output_prefix") or output_prefix,
+                                       skip_existing=True)
+            return task_info
+
         # 解析任务参数
         prompt = task.get("prompt", "").strip()
         images = task.get("images", "").strip()
@@ -169,19 +251,78 @@ class Sora2BatchProcessor:
         orientation = task.get("orientation", "portrait").strip()
         size = task.get("size", "large").strip()
         watermark = task.get("watermark", "false").strip().lower() in ("true", "1", "yes")
-        output_prefix = task.get("output_prefix", f"video_{task_idx}").strip()
 
         if not prompt:
             raise ValueError("提示词不能为空")
 
-        print(f"  提示词: {prompt[:50]}...")
-        print(f"  模型: {model}")
-        print(f"  方向: {orientation}")
-        print(f"  尺寸: {size}")
+        log.debug(f"行 {task_idx}: 提示词={prompt[:50]}... 模型={model} 方向={orientation} 尺寸={size}")
+
+        if state in (SUBMITTED, POLLING) and entry.get("task_id"):
+            # 远端任务已创建，直接挂接，不重复提交
+            task_id = entry["task_id"]
+            task_info = dict(entry["info"])
+            log.debug(f"行 {task_idx} 重新挂接已提交的任务: {task_id}")
+        else:
+            task_id, task_info = self._create_task(api_key, api_base, images, prompt, model,
+                                                   duration_sora2, duration_sora2pro, orientation, size,
+                                                   watermark, output_prefix)
+            if journal:
+                journal.record(key, SUBMITTED, row=task_idx, task_id=task_id, info=task_info)
+
+        # 如果需要等待完成
+        remote_failed = False
+        if wait_for_completion:
+            if journal:
+                journal.record(key, POLLING)
+            try:
+                final_status, video_url, gif_url, thumbnail_url, _raw = self.querier.query(
+                    task_id=task_id,
+                    api_base=api_base,
+                    api_key=api_key,
+                    wait=True,
+                    poll_interval_sec=poll_interval,
+                    timeout_sec=max_wait_time,
+                    model=model,
+                    duration=duration_sora2 if model in ("sora-2", "sora-2-all") else duration_sora2pro
+                )
+
+                task_info["final_status"] = final_status
+                task_info["video_url"] = video_url
+                task_info["gif_url"] = gif_url
+                task_info["thumbnail_url"] = thumbnail_url
+                task_info["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+                log.debug(f"行 {task_idx} 最终状态: {final_status} 视频URL: {video_url or '-'}")
+
+                if final_status == "completed":
+                    if journal:
+                        journal.record(key, COMPLETED, info=task_info)
+                    if downloads is not None:
+                        downloads.submit_media(task_info, output_dir, output_prefix)
+                elif final_status == "failed":
+                    remote_failed = True
+                    if journal:
+                        journal.record(key, FAILED, info=task_info, error="远端任务失败")
+
+            except Exception as e:
+                log.warning(f"行 {task_idx} 等待完成失败: {str(e)}")
+                task_info["wait_error"] = str(e)
+
+        # 保存单个任务信息
+        task_file = os.path.join(output_dir, f"{output_prefix}.json")
+        with open(task_file, 'w', encoding='utf-8') as f:
+            json.dump(task_info, f, ensure_ascii=False, indent=2)
+
+        if remote_failed:
+            raise RemoteTaskFailed(f"远端任务失败: {task_id}")
+        return task_info
 
+    def _create_task(self, api_key, api_base, images, prompt, model,
+                     duration_sora2, duration_sora2pro, orientation, size, watermark, output_prefix):
+        """提交视频生成任务，返回 (task_id, task_info)"""
         # 根据是否有图片选择不同的创建方法
         if images:
-            print(f"  图片: {images[:50]}...")
+            log.debug(f"图生视频，图片: {images[:50]}...")
             # 使用图生视频
             task_id, status, status_update_time = self.creator_with_images.create(
                 images=images,
@@ -196,7 +337,6 @@ class Sora2BatchProcessor:
                 watermark=watermark
             )
         else:
-            print(f"  类型: 文生视频")
             # 使用文生视频
             task_id, status, status_update_time = self.creator_text_only.create(
                 prompt=prompt,
@@ -210,8 +350,7 @@ class Sora2BatchProcessor:
                 watermark=watermark
             )
 
-        print(f"  任务ID: {task_id}")
-        print(f"  状态: {status}")
+        log.debug(f"已提交任务 {task_id}，状态: {status}")
 
         # 保存任务信息
         task_info = {
@@ -225,40 +364,7 @@ class Sora2BatchProcessor:
             "output_prefix": output_prefix,
             "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
         }
-
-        # 如果需要等待完成
-        if wait_for_completion:
-            print(f"  等待视频生成完成...")
-            try:
-                final_status, video_url, gif_url, thumbnail_url, _raw = self.querier.query(
-                    task_id=task_id,
-                    api_base=api_base,
-                    api_key=api_key,
-                    wait=True,
-                    poll_interval_sec=poll_interval,
-                    timeout_sec=max_wait_time
-                )
-
-                task_info["final_status"] = final_status
-                task_info["video_url"] = video_url
-                task_info["gif_url"] = gif_url
-                task_info["thumbnail_url"] = thumbnail_url
-                task_info["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
-
-                print(f"  最终状态: {final_status}")
-                if video_url:
-                    print(f"  视频URL: {video_url[:50]}...")
-
-            except Exception as e:
-                print(f"  等待完成失败: {str(e)}")
-                task_info["wait_error"] = str(e)
-
-        # 保存单个任务信息
-        task_file = os.path.join(output_dir, f"{output_prefix}.json")
-        with open(task_file, 'w', encoding='utf-8') as f:
-            json.dump(task_info, f, ensure_ascii=False, indent=2)
-
-        return task_info
+        return task_id, task_info
 
     def _generate_report(self, results):
         """生成处理结果报告"""
@@ -268,16 +374,29 @@ class Sora2BatchProcessor:
             f"成功: {results['success']}",
             f"失败: {results['failed']}",
         ]
+        if "downloaded" in results:
+            lines.append(f"已下载文件: {results['downloaded']}（失败 {len(results['download_errors'])}）")
 
         if results['errors']:
             lines.append("\n失败任务详情:")
             for error in results['errors']:
                 lines.append(f"  - {error}")
+            if results['failed'] > len(results['errors']):
+                lines.append(f"  ... 另有 {results['failed'] - len(results['errors'])} 个失败任务，详见日志")
+
+        if results.get('download_errors'):
+            lines.append("\n下载失败:")
+            for error in results['download_errors'][:MAX_REPORTED]:
+                lines.append(f"  - {error}")
+            if len(results['download_errors']) > MAX_REPORTED:
+                lines.append(f"  ... 另有 {len(results['download_errors']) - MAX_REPORTED} 个")
 
         if results['video_tasks']:
             lines.append(f"\n成功创建的视频任务:")
             for task in results['video_tasks']:
-                lines.append(f"  - {task['task_id']}: {task['prompt'][:30]}...")
+                lines.append(f"  - {task}")
+            if results['success'] > len(results['video_tasks']):
+                lines.append(f"  ... 另有 {results['success'] - len(results['video_tasks'])} 个，见 tasks.json")
 
         return "\n".join(lines)
 
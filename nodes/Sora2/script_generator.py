@@ -1,5 +1,5 @@
 import json
-import requests
+from ...utils import http_client
 from ...utils.kuai_utils import env_or, http_headers_json, raise_for_bad_status
 
 # 默认系统提示词（使用 $ 语法）
@@ -457,7 +457,7 @@ class SoraPromptFromProduct:
         }
 
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
             raise_for_bad_status(resp, "AI 提示词生成失败")
             data = resp.json()
         except Exception as e:
@@ -1,8 +1,14 @@
 import json
-import time
-import requests
+from ...utils import http_client, metrics
+from ...utils.retry import new_idempotency_key
+from ...utils.rate_limit import throttle
 from ...utils.kuai_utils import (env_or, ensure_list_from_urls,
                                 http_headers_json, raise_for_bad_status, json_get)
+from ...utils.poller import get_poller, http_query
+from ...utils.poll_schedule import adaptive_schedule
+from ...utils.log import get_logger
+
+log = get_logger("Sora2")
 
 
 class SoraCreateVideo:
@@ -48,6 +54,7 @@ class SoraCreateVideo:
             "timeout": "超时",
         }
 
+    @metrics.tagged(model="model")
     def create(self, images, prompt, model="sora-2-all", duration_sora2="10", duration_sora2pro="15",
                api_base="https://api.kuai.host", api_key="", orientation="portrait", size="large", watermark=False, timeout=120):
         api_key = env_or(api_key, "KUAI_API_KEY")
@@ -70,8 +77,10 @@ class SoraCreateVideo:
             "watermark": bool(watermark),
         }
 
+        throttle(api_base, api_key, model)
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout),
+                                    idempotency_key=new_idempotency_key())
             raise_for_bad_status(resp, "Sora create failed")
             data = resp.json()
         except Exception as e:
@@ -120,44 +129,49 @@ class SoraQueryTask:
             "timeout_sec": "总超时",
         }
 
-    def query(self, task_id, api_base="https://api.kuai.host", api_key="", wait=True, poll_interval_sec=5, timeout_sec=600):
+    @metrics.tagged(model="model")
+    def query(self, task_id, api_base="https://api.kuai.host", api_key="", wait=True, poll_interval_sec=5, timeout_sec=600,
+              model="", duration=""):
         api_key = env_or(api_key, "KUAI_API_KEY")
-        endpoint = api_base.rstrip("/") + "/v1/video/query"
 
-        def once():
+        if not wait:
             try:
-                resp = requests.get(endpoint, headers=http_headers_json(api_key), params={"id": task_id}, timeout=60)
-                raise_for_bad_status(resp, "Sora query failed")
-                data = resp.json()
+                data = http_query(api_base, api_key, task_id, timeout=60)
             except Exception as e:
                 raise RuntimeError(f"查询失败: {str(e)}")
+            return self._parse(data)
 
-            status = data.get("status") or json_get(data, "detail.status") or ""
-            video_url = data.get("video_url") or json_get(data, "detail.url") or json_get(data, "detail.downloadable_url") or ""
-            gif_url = json_get(data, "detail.gif_url") or json_get(data, "detail.encodings.gif.path") or ""
-            thumbnail_url = data.get("thumbnail_url") or json_get(data, "detail.encodings.thumbnail.path") or ""
+        log.debug(f"[SoraQueryTask] 开始轮询任务 {task_id}，超时 {timeout_sec} 秒，间隔 {poll_interval_sec} 秒")
 
-            return status, video_url, gif_url, thumbnail_url, json.dumps(data, ensure_ascii=False)
+        def on_update(_task_id, status, _data, polls):
+            log.debug(f"[SoraQueryTask] 第 {polls} 次查询: 状态={status}")
 
-        if not wait:
-            return once()
-
-        print(f"[SoraQueryTask] 开始轮询任务 {task_id}，超时 {timeout_sec} 秒，间隔 {poll_interval_sec} 秒")
-        deadline = time.time() + int(timeout_sec)
-        last_raw = ""
-        poll_count = 0
-        while time.time() < deadline:
-            poll_count += 1
-            status, video_url, gif_url, thumbnail_url, raw = once()
-            last_raw = raw
-            print(f"[SoraQueryTask] 第 {poll_count} 次查询: 状态={status}")
-            if status in ("completed", "failed"):
-                print(f"[SoraQueryTask] 任务完成: {status}")
-                return (status, video_url, gif_url, thumbnail_url, raw)
-            time.sleep(int(poll_interval_sec))
-        
-        print(f"[SoraQueryTask] 轮询超时")
-        return ("timeout", "", "", "", last_raw or json.dumps({"error": "timeout"}, ensure_ascii=False))
+        # 交由共享轮询调度器统一查询，避免每个任务各自 sleep 轮询；
+        # 轮询间隔根据该模型/时长的历史渲染耗时自适应调整
+        result = get_poller().submit(
+            task_id, api_base, api_key,
+            poll_interval=int(poll_interval_sec), timeout=int(timeout_sec),
+            on_update=on_update, max_errors=1,
+            schedule=adaptive_schedule(int(poll_interval_sec), model, duration),
+        ).result()
+
+        if result.timed_out:
+            log.warning(f"[SoraQueryTask] 轮询超时: {task_id}")
+            last_raw = json.dumps(result.data, ensure_ascii=False) if result.data else ""
+            return ("timeout", "", "", "", last_raw or json.dumps({"error": "timeout"}, ensure_ascii=False))
+
+        log.debug(f"[SoraQueryTask] 任务完成: {result.status}")
+        return self._parse(result.data)
+
+    @staticmethod
+    def _parse(data):
+        """解析查询响应"""
+        status = data.get("status") or json_get(data, "detail.status") or ""
+        video_url = data.get("video_url") or json_get(data, "detail.url") or json_get(data, "detail.downloadable_url") or ""
+        gif_url = json_get(data, "detail.gif_url") or json_get(data, "detail.encodings.gif.path") or ""
+        thumbnail_url = data.get("thumbnail_url") or json_get(data, "detail.encodings.thumbnail.path") or ""
+
+        return (status, video_url, gif_url, thumbnail_url, json.dumps(data, ensure_ascii=False))
 
 
 class SoraCreateAndWait:
@@ -221,7 +235,8 @@ class SoraCreateAndWait:
         querier = SoraQueryTask()
         status, video_url, gif_url, thumbnail_url, _raw = querier.query(
             task_id=task_id, api_base=api_base, api_key=api_key, wait=True,
-            poll_interval_sec=wait_poll_interval_sec, timeout_sec=wait_timeout_sec
+            poll_interval_sec=wait_poll_interval_sec, timeout_sec=wait_timeout_sec,
+            model=model, duration=duration_sora2 if model == "sora-2-all" else duration_sora2pro
         )
         
         return (status, video_url, gif_url, thumbnail_url, task_id)
@@ -267,6 +282,7 @@ class SoraText2Video:
             "timeout": "超时",
         }
 
+    @metrics.tagged(model="model")
     def create(self, prompt, model="sora-2", duration_sora2="10", duration_sora2pro="15",
                api_base="https://api.kuai.host", api_key="", orientation="portrait", size="large", watermark=False, timeout=120):
         api_key = env_or(api_key, "KUAI_API_KEY")
@@ -283,8 +299,10 @@ class SoraText2Video:
             "watermark": bool(watermark),
         }
 
+        throttle(api_base, api_key, model)
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout),
+                                    idempotency_key=new_idempotency_key())
             raise_for_bad_status(resp, "Sora text2video failed")
             data = resp.json()
         except Exception as e:
@@ -352,8 +370,10 @@ class SoraCreateCharacter:
         if from_task:
             payload["from_task"] = from_task
 
+        throttle(api_base, api_key, "sora-characters")
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout),
+                                    idempotency_key=new_idempotency_key())
             raise_for_bad_status(resp, "Sora create character failed")
             data = resp.json()
         except Exception as e:
@@ -367,7 +387,7 @@ class SoraCreateCharacter:
         if not character_id:
             raise RuntimeError(f"创建角色响应缺少角色ID: {json.dumps(data, ensure_ascii=False)}")
 
-        print(f"[SoraCreateCharacter] 角色创建成功: {character_id} (@{username})")
+        log.info(f"[SoraCreateCharacter] 角色创建成功: {character_id} (@{username})")
         return (character_id, username, permalink, profile_picture_url)
 
 
@@ -417,8 +437,10 @@ class SoraRemixVideo:
             "prompt": prompt,
         }
 
+        throttle(api_base, api_key, "sora-remix")
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout),
+                                    idempotency_key=new_idempotency_key())
             raise_for_bad_status(resp, "Sora remix video failed")
             data = resp.json()
         except Exception as e:
@@ -431,7 +453,7 @@ class SoraRemixVideo:
         if not new_task_id:
             raise RuntimeError(f"编辑响应缺少任务ID: {json.dumps(data, ensure_ascii=False)}")
 
-        print(f"[SoraRemixVideo] 视频编辑任务创建成功: {new_task_id} (基于 {video_id})")
+        log.info(f"[SoraRemixVideo] 视频编辑任务创建成功: {new_task_id} (基于 {video_id})")
         return (new_task_id, status, remixed_from)
 
 
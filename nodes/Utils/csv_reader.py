@@ -1,9 +1,10 @@
 """CSV 批量读取节点 - 用于批量图像生成任务"""
 
-import csv
 import os
 import json
 
+from ...utils.batch_tasks import iter_csv_rows, make_handle
+
 # 尝试导入 ComfyUI 的 folder_paths
 try:
     import folder_paths
@@ -33,17 +34,20 @@ class CSVBatchReader:
             "optional": {
                 "csv_file": (csv_files if csv_files else [""], {"tooltip": "从 input 目录选择 CSV 文件"}),
                 "csv_path": ("STRING", {"default": "", "multiline": False, "tooltip": "或输入完整路径"}),
+                "stream": ("BOOLEAN", {"default": True, "tooltip": "输出轻量任务句柄（文件路径+行数），批量处理器逐行读取，适合大 CSV；关闭则输出完整 JSON 任务列表"}),
             }
         }
 
     @classmethod
-    def VALIDATE_INPUTS(cls, csv_file="", csv_path=""):
+    def VALIDATE_INPUTS(cls, csv_file="", csv_path="", stream=True):
         """验证输入参数 - 在节点创建时允许空值"""
         # 允许节点创建，在执行时再检查
         return True
 
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("批量任务数据",)
+    # 文件下拉列表来自 input 目录，按需加载时 INPUT_TYPES 仍调用本类
+    DYNAMIC_INPUTS = True
     FUNCTION = "read_csv"
     CATEGORY = "KuAi/配套能力"
 
@@ -52,10 +56,11 @@ class CSVBatchReader:
         return {
             "csv_file": "CSV文件",
             "csv_path": "文件路径",
+            "stream": "流式读取",
         }
 
     @classmethod
-    def IS_CHANGED(cls, csv_file="", csv_path=""):
+    def IS_CHANGED(cls, csv_file="", csv_path="", stream=True):
         """检测输入是否改变"""
         # 优先检查 csv_file（从 input 目录）
         if csv_file and csv_file.strip() and HAS_FOLDER_PATHS:
@@ -75,12 +80,13 @@ class CSVBatchReader:
 
         return float("nan")
 
-    def read_csv(self, csv_file="", csv_path=""):
-        """读取 CSV 文件并返回 JSON 格式的任务列表
+    def read_csv(self, csv_file="", csv_path="", stream=True):
+        """读取 CSV 文件并返回任务句柄或 JSON 格式的任务列表
 
         Args:
             csv_file: 从下拉列表选择的文件名（input 目录）
             csv_path: 或输入完整路径
+            stream: 为 True 时只返回任务句柄，批量处理器按需逐行读取
         """
         try:
             file_path = None
@@ -131,30 +137,19 @@ class CSVBatchReader:
             if not file_path.lower().endswith('.csv'):
                 raise ValueError(f"文件必须是 CSV 格式: {file_path}")
 
-            # 读取 CSV 文件
-            tasks = []
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-
-                # 验证必需的列
-                if not reader.fieldnames:
-                    raise ValueError("CSV 文件为空或格式不正确")
-
-                for row_num, row in enumerate(reader, start=2):  # 从第2行开始（第1行是标题）
-                    # 跳过空行
-                    if not any(row.values()):
-                        continue
-
-                    # 清理数据（去除空白）
-                    cleaned_row = {k: v.strip() if isinstance(v, str) else v for k, v in row.items()}
-                    cleaned_row['_row_number'] = row_num  # 添加行号用于调试
-                    tasks.append(cleaned_row)
+            if stream:
+                # 只统计行数，任务内容由批量处理器逐行读取
+                handle = make_handle(file_path)
+                print(f"[CSVBatchReader] 成功读取 {json.loads(handle)['count']} 个任务（流式）")
+                return (handle,)
 
+            # 读取 CSV 文件
+            tasks = list(iter_csv_rows(file_path))
             if not tasks:
                 raise ValueError("CSV 文件中没有有效的任务数据")
 
             # 转换为 JSON 字符串
-            tasks_json = json.dumps(tasks, ensure_ascii=False, indent=2)
+            tasks_json = json.dumps(tasks, ensure_ascii=False, separators=(",", ":"))
 
             print(f"[CSVBatchReader] 成功读取 {len(tasks)} 个任务")
             return (tasks_json,)
@@ -1,6 +1,6 @@
 import json
-import requests
 
+from ...utils import http_client
 from ...utils.kuai_utils import env_or, http_headers_json, raise_for_bad_status
 
 class DeepseekOCRToPrompt:
@@ -52,7 +52,7 @@ class DeepseekOCRToPrompt:
         }
 
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
             raise_for_bad_status(resp, "Deepseek OCR failed")
             data = resp.json()
         except Exception as e:
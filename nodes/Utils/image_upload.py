@@ -1,6 +1,6 @@
 import json
-import requests
 
+from ...utils import http_client
 from ...utils.kuai_utils import to_pil_from_comfy, save_image_to_buffer, http_headers_multipart, raise_for_bad_status
 
 class UploadToImageHost:
@@ -50,7 +50,7 @@ class UploadToImageHost:
         }
         
         try:
-            resp = requests.post(upload_url, headers=http_headers_multipart(), files=files, timeout=int(timeout))
+            resp = http_client.post(upload_url, headers=http_headers_multipart(), files=files, timeout=int(timeout))
             raise_for_bad_status(resp, "Upload image failed")
             data = resp.json()
         except Exception as e:
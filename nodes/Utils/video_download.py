@@ -1,20 +1,22 @@
 import os
-import requests
 import hashlib
 from pathlib import Path
 
+from ...utils.downloader import download_many
+
 class DownloadVideo:
-    """下载在线视频到本地"""
+    """下载在线视频到本地（支持多个 URL 并发下载、断点续传，已下载的文件自动跳过）"""
     @classmethod
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "video_url": ("STRING", {"default": "", "tooltip": "视频URL"}),
+                "video_url": ("STRING", {"default": "", "multiline": True, "tooltip": "视频URL，多个URL每行一个"}),
             },
             "optional": {
                 "save_dir": ("STRING", {"default": "output", "tooltip": "保存目录(相对于ComfyUI根目录)"}),
-                "filename": ("STRING", {"default": "", "tooltip": "文件名(留空自动生成)"}),
+                "filename": ("STRING", {"default": "", "tooltip": "文件名(留空自动生成；多个URL时自动加序号)"}),
                 "timeout": ("INT", {"default": 180, "min": 5, "max": 600, "tooltip": "超时(秒)"}),
+                "max_workers": ("INT", {"default": 4, "min": 1, "max": 16, "tooltip": "多个URL时同时下载的文件数"}),
             }
         }
 
@@ -31,10 +33,22 @@ class DownloadVideo:
             "save_dir": "保存目录",
             "filename": "文件名",
             "timeout": "超时",
+            "max_workers": "并发数",
         }
 
-    def download(self, video_url, save_dir="output", filename="", timeout=180):
-        if not video_url:
+    @staticmethod
+    def _default_filename(video_url):
+        url_hash = hashlib.md5(video_url.encode()).hexdigest()[:8]
+        ext = ".mp4"
+        if video_url.endswith(".gif"):
+            ext = ".gif"
+        elif video_url.endswith(".webm"):
+            ext = ".webm"
+        return f"sora2_video_{url_hash}{ext}"
+
+    def download(self, video_url, save_dir="output", filename="", timeout=180, max_workers=4):
+        urls = [line.strip() for line in (video_url or "").splitlines() if line.strip()]
+        if not urls:
             raise RuntimeError("视频URL不能为空")
         
         # 获取 ComfyUI 根目录
@@ -43,36 +57,37 @@ class DownloadVideo:
         output_dir.mkdir(parents=True, exist_ok=True)
         
         # 生成文件名
-        if not filename:
-            url_hash = hashlib.md5(video_url.encode()).hexdigest()[:8]
-            ext = ".mp4"
-            if video_url.endswith(".gif"):
-                ext = ".gif"
-            elif video_url.endswith(".webm"):
-                ext = ".webm"
-            filename = f"sora2_video_{url_hash}{ext}"
-        
-        filepath = output_dir / filename
-        
+        items = []
+        for idx, url in enumerate(urls, start=1):
+            name = filename
+            if name and len(urls) > 1:
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}_{idx}{ext}"
+            items.append((url, output_dir / (name or self._default_filename(url))))
+
         # 下载视频
-        print(f"[DownloadVideo] 下载: {video_url}")
-        try:
-            resp = requests.get(video_url, timeout=int(timeout), stream=True)
-            resp.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            # 返回相对路径
-            rel_path = filepath.relative_to(comfy_root)
-            print(f"[DownloadVideo] 保存到: {filepath}")
+        print(f"[DownloadVideo] 下载 {len(items)} 个文件")
+        results = download_many(items, max_workers=max_workers, timeout=int(timeout))
+
+        paths, errors = [], []
+        for result in results:
+            if result.error is not None:
+                errors.append(f"{result.url}: {result.error}")
+                continue
+            rel_path = Path(result.path).relative_to(comfy_root)
+            print(f"[DownloadVideo] 保存到: {result.path}")
             print(f"[DownloadVideo] 相对路径: {rel_path}")
-            return (str(rel_path), "下载成功")
-        except Exception as e:
-            error_msg = f"下载失败: {str(e)}"
+            paths.append(str(rel_path))
+
+        if errors:
+            error_msg = "下载失败: " + "; ".join(errors)
             print(f"[DownloadVideo] {error_msg}")
-            return ("", error_msg)
+            if not paths:
+                return ("", error_msg)
+            return ("\n".join(paths), f"部分下载成功 ({len(paths)}/{len(items)}) - {error_msg}")
+        skipped = sum(1 for r in results if r.status == "skipped")
+        status = "下载成功" if not skipped else f"下载成功（{skipped} 个已存在，已跳过）"
+        return ("\n".join(paths), status)
 
 
 class PreviewVideo:
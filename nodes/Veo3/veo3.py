@@ -1,8 +1,14 @@
 import json
-import time
-import requests
+from ...utils import http_client, metrics
+from ...utils.retry import new_idempotency_key
+from ...utils.rate_limit import throttle
 from ...utils.kuai_utils import (env_or, ensure_list_from_urls,
                                 http_headers_json, raise_for_bad_status, json_get)
+from ...utils.poller import get_poller, http_query
+from ...utils.poll_schedule import adaptive_schedule
+from ...utils.log import get_logger
+
+log = get_logger("Veo3")
 
 
 class VeoText2Video:
@@ -29,6 +35,7 @@ class VeoText2Video:
     FUNCTION = "create"
     CATEGORY = "KuAi/Veo3"
     
+    @metrics.tagged(model="model")
     def create(self, prompt, model, aspect_ratio, enhance_prompt, enable_upsample,
                api_base="https://api.kuai.host", api_key="", timeout=120):
         
@@ -43,8 +50,10 @@ class VeoText2Video:
             "enable_upsample": bool(enable_upsample),
         }
 
+        throttle(api_base, api_key, model)
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout),
+                                    idempotency_key=new_idempotency_key())
             raise_for_bad_status(resp, "Veo create failed")
             data = resp.json()
         except Exception as e:
@@ -86,6 +95,7 @@ class VeoImage2Video:
     FUNCTION = "create"
     CATEGORY = "KuAi/Veo3"
 
+    @metrics.tagged(model="model")
     def create(self, prompt, model, aspect_ratio, enhance_prompt, enable_upsample,
                image_1="", image_2="", image_3="",
                api_base="https://api.kuai.host", api_key="", timeout=120):
@@ -110,8 +120,10 @@ class VeoImage2Video:
             "enable_upsample": bool(enable_upsample),
         }
 
+        throttle(api_base, api_key, model)
         try:
-            resp = requests.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout))
+            resp = http_client.post(endpoint, headers=http_headers_json(api_key), data=json.dumps(payload), timeout=int(timeout),
+                                    idempotency_key=new_idempotency_key())
             raise_for_bad_status(resp, "Veo create failed")
             data = resp.json()
         except Exception as e:
@@ -149,43 +161,47 @@ class VeoQueryTask:
     FUNCTION = "query"
     CATEGORY = "KuAi/Veo3"
 
-    def query(self, task_id, api_base="https://api.kuai.host", api_key="", wait=True, poll_interval_sec=5, timeout_sec=600):
+    @metrics.tagged(model="model")
+    def query(self, task_id, api_base="https://api.kuai.host", api_key="", wait=True, poll_interval_sec=5, timeout_sec=600,
+              model=""):
         api_key = env_or(api_key, "KUAI_API_KEY")
-        endpoint = api_base.rstrip("/") + "/v1/video/query"
 
-        def once():
+        if not wait:
             try:
-                resp = requests.get(endpoint, headers=http_headers_json(api_key), params={"id": task_id}, timeout=60)
-                raise_for_bad_status(resp, "Veo query failed")
-                data = resp.json()
+                data = http_query(api_base, api_key, task_id, timeout=60)
             except Exception as e:
                 raise RuntimeError(f"查询失败: {str(e)}")
+            return self._parse(data)
 
-            status = data.get("status") or ""
-            video_url = data.get("video_url") or ""
-            enhanced_prompt = data.get("enhanced_prompt") or ""
-            
-            return status, video_url, enhanced_prompt, json.dumps(data, ensure_ascii=False)
+        log.debug(f"[VeoQueryTask] 开始轮询任务 {task_id}，超时 {timeout_sec} 秒，间隔 {poll_interval_sec} 秒")
 
-        if not wait:
-            return once()
-
-        print(f"[VeoQueryTask] 开始轮询任务 {task_id}，超时 {timeout_sec} 秒，间隔 {poll_interval_sec} 秒")
-        deadline = time.time() + int(timeout_sec)
-        last_raw = ""
-        poll_count = 0
-        while time.time() < deadline:
-            poll_count += 1
-            status, video_url, enhanced_prompt, raw = once()
-            last_raw = raw
-            print(f"[VeoQueryTask] 第 {poll_count} 次查询: 状态={status}")
-            if status in ("completed", "failed"):
-                print(f"[VeoQueryTask] 任务完成: {status}")
-                return (status, video_url, enhanced_prompt, raw)
-            time.sleep(int(poll_interval_sec))
-        
-        print(f"[VeoQueryTask] 轮询超时")
-        return ("timeout", "", "", last_raw or json.dumps({"error": "timeout"}, ensure_ascii=False))
+        def on_update(_task_id, status, _data, polls):
+            log.debug(f"[VeoQueryTask] 第 {polls} 次查询: 状态={status}")
+
+        result = get_poller().submit(
+            task_id, api_base, api_key,
+            poll_interval=int(poll_interval_sec), timeout=int(timeout_sec),
+            status_fn=lambda data: data.get("status") or "",
+            on_update=on_update, max_errors=1,
+            schedule=adaptive_schedule(int(poll_interval_sec), model),
+        ).result()
+
+        if result.timed_out:
+            log.warning(f"[VeoQueryTask] 轮询超时: {task_id}")
+            last_raw = json.dumps(result.data, ensure_ascii=False) if result.data else ""
+            return ("timeout", "", "", last_raw or json.dumps({"error": "timeout"}, ensure_ascii=False))
+
+        log.debug(f"[VeoQueryTask] 任务完成: {result.status}")
+        return self._parse(result.data)
+
+    @staticmethod
+    def _parse(data):
+        """解析查询响应"""
+        status = data.get("status") or ""
+        video_url = data.get("video_url") or ""
+        enhanced_prompt = data.get("enhanced_prompt") or ""
+
+        return (status, video_url, enhanced_prompt, json.dumps(data, ensure_ascii=False))
 
 
 class VeoText2VideoAndWait:
@@ -217,7 +233,8 @@ class VeoText2VideoAndWait:
         querier_kwargs["api_key"] = creator_kwargs.get("api_key", "")
 
         querier = VeoQueryTask()
-        status, video_url, enhanced_prompt, _ = querier.query(task_id=task_id, wait=True, **querier_kwargs)
+        status, video_url, enhanced_prompt, _ = querier.query(task_id=task_id, wait=True,
+                                                              model=creator_kwargs.get("model", ""), **querier_kwargs)
         
         return (status, video_url, enhanced_prompt, task_id)
 
@@ -259,7 +276,8 @@ class VeoImage2VideoAndWait:
         querier_kwargs["api_key"] = creator_kwargs.get("api_key", "")
 
         querier = VeoQueryTask()
-        status, video_url, enhanced_prompt, _ = querier.query(task_id=task_id, wait=True, **querier_kwargs)
+        status, video_url, enhanced_prompt, _ = querier.query(task_id=task_id, wait=True,
+                                                              model=creator_kwargs.get("model", ""), **querier_kwargs)
         
         return (status, video_url, enhanced_prompt, task_id)
 
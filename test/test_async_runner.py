@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""测试常驻事件循环运行器"""
+
+import sys
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import async_runner
+
+
+def test_single_persistent_loop():
+    """测试多次提交复用同一个事件循环"""
+    print("=" * 60)
+    print("测试 1: 常驻事件循环")
+    print("=" * 60)
+
+    async def which_loop():
+        await asyncio.sleep(0)
+        return asyncio.get_running_loop(), threading.current_thread().name
+
+    first = async_runner.submit(which_loop())
+    assert isinstance(first, Future)
+    loop_a, thread_a = first.result(5)
+    loop_b, thread_b = async_runner.run_sync(which_loop(), timeout=5)
+
+    assert loop_a is loop_b and not loop_a.is_closed()
+    assert thread_a == thread_b == "kuai-async-loop"
+    print(f"✅ 两次调用共享循环线程: {thread_a}")
+    return True
+
+
+def test_concurrent_coroutines():
+    """测试并发协程在同一循环内重叠执行"""
+    print("\n" + "=" * 60)
+    print("测试 2: 并发执行")
+    print("=" * 60)
+
+    async def slow(i):
+        await asyncio.sleep(0.1)
+        return i
+
+    futures = [async_runner.submit(slow(i)) for i in range(20)]
+    results = [f.result(5) for f in futures]
+    assert results == list(range(20))
+    print("✅ 20 个协程并发完成")
+    return True
+
+
+def test_exception_propagates():
+    """测试协程异常传递到调用方"""
+    print("\n" + "=" * 60)
+    print("测试 3: 异常传递")
+    print("=" * 60)
+
+    async def boom():
+        raise ValueError("boom")
+
+    try:
+        async_runner.run_sync(boom(), timeout=5)
+    except ValueError as e:
+        print(f"✅ 捕获异常: {e}")
+        return True
+    raise AssertionError("应当抛出 ValueError")
+
+
+if __name__ == "__main__":
+    print("\n🧪 常驻事件循环测试套件\n")
+
+    tests = [
+        ("常驻事件循环", test_single_persistent_loop),
+        ("并发执行", test_concurrent_coroutines),
+        ("异常传递", test_exception_propagates),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
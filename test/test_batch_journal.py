@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""测试批量任务断点续跑日志"""
+
+import sys
+import os
+import json
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.batch_journal import BatchJournal, row_key, row_keys, SUBMITTED, POLLING, COMPLETED
+
+
+def test_row_keys():
+    """测试行标识只取决于 CSV 内容"""
+    print("=" * 60)
+    print("测试 1: 行标识")
+    print("=" * 60)
+
+    a = {"prompt": "a cat", "model": "sora-2", "_row_number": 2}
+    b = {"model": "sora-2", "prompt": "a cat", "_row_number": 9}
+    assert row_key(a) == row_key(b)
+    assert row_key(a) != row_key({"prompt": "a dog", "model": "sora-2"})
+
+    keys = row_keys([a, b, {"prompt": "x"}])
+    assert keys[0] != keys[1] and keys[1] == f"{keys[0]}#2"
+    print(f"✅ 行标识: {keys}")
+    return True
+
+
+def test_replay_after_restart():
+    """测试重新打开日志后恢复每行的最新状态"""
+    print("\n" + "=" * 60)
+    print("测试 2: 重启后恢复状态")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        journal = BatchJournal(output_dir)
+        journal.record("k1", SUBMITTED, row=1, task_id="t1", info={"prompt": "p1"})
+        journal.record("k1", POLLING)
+        journal.record("k2", SUBMITTED, row=2, task_id="t2", info={"prompt": "p2"})
+        journal.record("k2", COMPLETED, info={"prompt": "p2", "video_url": "http://v"})
+
+        # 模拟进程在写入时被杀：最后一行不完整
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write('{"key": "k3", "sta')
+
+        reopened = BatchJournal(output_dir)
+        k1 = reopened.get("k1")
+        assert k1["state"] == POLLING and k1["task_id"] == "t1" and k1["info"] == {"prompt": "p1"}
+        assert reopened.get("k2")["info"]["video_url"] == "http://v"
+        assert reopened.get("k3") is None
+        assert reopened.summary() == {POLLING: 1, COMPLETED: 1}
+
+        with open(journal.path, encoding="utf-8") as f:
+            assert json.loads(f.readline())["state"] == SUBMITTED
+    print("✅ 状态按记录顺序合并，截断的行被忽略")
+    return True
+
+
+def test_reset():
+    """测试关闭断点续跑时重新开始"""
+    print("\n" + "=" * 60)
+    print("测试 3: 重新开始")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        BatchJournal(output_dir).record("k1", COMPLETED)
+        fresh = BatchJournal(output_dir, reset=True)
+        assert fresh.get("k1") is None
+        assert os.path.exists(fresh.path + ".bak")
+    print("✅ 旧日志已备份，新日志为空")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 断点续跑日志测试套件\n")
+
+    tests = [
+        ("行标识", test_row_keys),
+        ("重启后恢复状态", test_replay_after_restart),
+        ("重新开始", test_reset),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""测试批量任务的流式读取（任务句柄、逐行迭代、兼容 JSON 列表）"""
+
+import sys
+import os
+import json
+import tempfile
+import tracemalloc
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.batch_journal import row_keys
+from utils.batch_tasks import HANDLE_KEY, TaskListWriter, iter_rows, make_handle, open_tasks, output_prefixes
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write("prompt,seed,output_prefix\n")
+        for row in rows:
+            f.write(row + "\n")
+
+
+def test_handle_and_iteration():
+    """测试句柄只包含元数据，迭代时逐行清洗"""
+    print("=" * 60)
+    print("测试 1: 任务句柄")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "tasks.csv")
+        write_csv(path, ['"a, b", 1 ,x', ",,", "c,2,y"])
+        handle = make_handle(path)
+        assert json.loads(handle)[HANDLE_KEY] == 1 and json.loads(handle)["count"] == 2
+
+        tasks = open_tasks(handle)
+        assert len(tasks) == 2
+        rows = list(tasks)
+        assert rows[0] == {"prompt": "a, b", "seed": "1", "output_prefix": "x", "_row_number": 2}
+        assert rows[1]["_row_number"] == 4
+        # 可以多次迭代，与 JSON 列表的行标识一致
+        assert row_keys(tasks) == row_keys(open_tasks(json.dumps(rows)))
+
+        write_csv(os.path.join(root, "empty.csv"), [",,"])
+        try:
+            make_handle(os.path.join(root, "empty.csv"))
+            assert False, "空 CSV 应该报错"
+        except ValueError:
+            pass
+    print("✅ 句柄、清洗和行号正确，兼容 JSON 任务列表")
+    return True
+
+
+def test_memory_flat():
+    """测试迭代大 CSV 时内存不随行数增长"""
+    print("\n" + "=" * 60)
+    print("测试 2: 内存占用")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "big.csv")
+        write_csv(path, (f"prompt number {i} {'x' * 200},{i},p{i}" for i in range(20000)))
+        handle = make_handle(path)
+        assert len(handle) < 512
+
+        tracemalloc.start()
+        count = sum(1 for _ in open_tasks(handle))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert count == 20000
+        # 文件约 4.5MB，逐行读取的峰值应远小于文件大小
+        assert peak < 1024 * 1024, peak
+    print(f"✅ 20000 行，迭代峰值 {peak / 1024:.0f}KB")
+    return True
+
+
+def test_output_prefixes():
+    """测试空白与重复的 output_prefix 得到互不相同的文件名前缀"""
+    print("\n" + "=" * 60)
+    print("测试 3: 输出文件名前缀")
+    print("=" * 60)
+
+    tasks = [{"output_prefix": ""}, {"output_prefix": "  "}, {}, {"output_prefix": "a"},
+             {"output_prefix": "a"}, {"output_prefix": "a_5"}, {"output_prefix": "b"}]
+    prefixes = output_prefixes(tasks, default="video")
+    assert prefixes == ["video_1", "video_2", "video_3", "a", "a_5", "a_5_6", "b"]
+    assert len(set(prefixes)) == len(prefixes)
+
+    # 追加的序号与已分配的前缀相同时继续追加
+    prefixes = output_prefixes([{"output_prefix": "a"}, {"output_prefix": "a_3"}, {"output_prefix": "a"}])
+    assert prefixes == ["a", "a_3", "a_3_2"]
+
+    # 已存在的文件名也视为占用
+    existing = {"b", "a_2"}
+    assert output_prefixes([{"output_prefix": "a"}, {"output_prefix": "a"}, {"output_prefix": "b"}],
+                           exists=existing.__contains__) == ["a", "a_2_2", "b_3"]
+
+    print("✅ 空白前缀使用默认名，重复前缀与已有文件均不冲突")
+    return True
+
+
+def test_single_pass_rows():
+    """测试 iter_rows 只读取一遍任务，任务列表逐行写出"""
+    print("\n" + "=" * 60)
+    print("测试 4: 单遍读取与任务列表")
+    print("=" * 60)
+
+    rows = [{"prompt": "x", "output_prefix": "a"}, {"prompt": "x", "output_prefix": "a"}, {"prompt": "y"}]
+
+    class Source:
+        passes = 0
+
+        def __iter__(self):
+            Source.passes += 1
+            return iter(rows)
+
+    annotated = list(iter_rows(Source(), default="video"))
+    assert Source.passes == 1
+    assert [prefix for _, _, prefix in annotated] == output_prefixes(rows, default="video") == ["a", "a_2", "video_3"]
+    assert [key for _, key, _ in annotated] == row_keys(rows)
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "tasks.json")
+        infos = [{"task_id": "t1", "prompt": "x"}, {"task_id": "t2", "prompt": "中文"}]
+        writer = TaskListWriter(path)
+        for info in infos:
+            writer.add(info)
+        # 下载完成后写回的字段替换先写入的版本
+        infos[1] = dict(infos[1], local_files={"video_url": "t2.mp4"})
+        writer.close(updated=[infos[1]])
+        with open(path, "r", encoding="utf-8") as f:
+            assert f.read() == json.dumps(infos, ensure_ascii=False, indent=2)
+        assert os.listdir(root) == ["tasks.json"]
+
+    print("✅ 行标识和前缀与整表计算一致，tasks.json 格式不变")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 批量任务流式读取测试套件\n")
+
+    tests = [
+        ("任务句柄", test_handle_and_iteration),
+        ("内存占用", test_memory_flat),
+        ("输出文件名前缀", test_output_prefixes),
+        ("单遍读取与任务列表", test_single_pass_rows),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""测试多轮对话历史存储（图像窗口、会话持久化、图像清理）"""
+
+import sys
+import os
+import base64
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import chat_history
+from utils.chat_history import ChatHistory, prune_images
+
+
+def build_session(history, turns):
+    for i in range(turns):
+        user_image = history.last_image
+        history.append("user", f"第 {i} 轮", user_image)
+        history.append("model", f"回复 {i}", history.put_image(f"image-{i}".encode(), "image/png"))
+
+
+def test_image_window():
+    """测试只附带最近 K 张图像，文本全部保留"""
+    print("=" * 60)
+    print("测试 1: 图像上下文窗口")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        history = ChatHistory("window", root=root)
+        build_session(history, 5)
+        contents = history.contents(max_images=2)
+        assert len(contents) == 10
+        assert [c["parts"][-1]["text"] for c in contents][:2] == ["第 0 轮", "回复 0"]
+        images = [p for c in contents for p in c["parts"] if "inline_data" in p]
+        assert len(images) == 2
+        assert base64.b64decode(images[-1]["inline_data"]["data"]) == b"image-4"
+        assert images[-1]["inline_data"]["mime_type"] == "image/png"
+        assert not any("inline_data" in p for c in history.contents(0) for p in c["parts"])
+        # 相同内容的图像只存一份
+        assert len(os.listdir(os.path.join(root, "images"))) == 5
+    print("✅ 历史图像按窗口发送，文本完整")
+    return True
+
+
+def test_session_persistence():
+    """测试会话写入磁盘后可以恢复"""
+    print("\n" + "=" * 60)
+    print("测试 2: 会话持久化")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        history = ChatHistory("产品 A/v1", root=root)
+        build_session(history, 3)
+        history.save()
+
+        restored = ChatHistory("产品 A/v1", root=root)
+        assert restored.messages == history.messages
+        assert restored.read_image(restored.last_image) == b"image-2"
+        assert len(ChatHistory("other", root=root)) == 0
+        assert not ChatHistory(root=root).persistent
+    print("✅ 重新打开会话后历史和图像完整")
+    return True
+
+
+def test_prune_unreferenced_images():
+    """测试重置后清理不再被引用的图像"""
+    print("\n" + "=" * 60)
+    print("测试 3: 清理未引用图像")
+    print("=" * 60)
+
+    old_age = chat_history.PRUNE_MIN_AGE
+    chat_history.PRUNE_MIN_AGE = 0
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            keep = ChatHistory("keep", root=root)
+            keep.append("model", "保留", keep.put_image(b"shared", "image/png"))
+            keep.save()
+            drop = ChatHistory("drop", root=root)
+            drop.append("model", "共享", drop.put_image(b"shared", "image/png"))
+            drop.append("model", "独有", drop.put_image(b"only-drop", "image/png"))
+            drop.save()
+
+            drop.reset()
+            assert len(drop) == 0 and not drop.session_path.exists()
+            assert os.listdir(os.path.join(root, "images")) == [keep.last_image["sha256"]]
+            assert prune_images(root) == 0
+    finally:
+        chat_history.PRUNE_MIN_AGE = old_age
+    print("✅ 只删除没有会话引用的图像")
+    return True
+
+
+def test_temp_session_in_memory():
+    """测试临时会话不写磁盘，内存中只保留最近的图像；创建会话时清理过期的临时会话文件"""
+    print("\n" + "=" * 60)
+    print("测试 4: 临时会话")
+    print("=" * 60)
+
+    old = (chat_history.TEMP_MAX_IMAGES, chat_history.PRUNE_MIN_AGE)
+    chat_history.TEMP_MAX_IMAGES, chat_history.PRUNE_MIN_AGE = 3, 0
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            # 旧版本留下的过期临时会话与其图像
+            stale = ChatHistory("tmp-old", root=root)
+            stale.append("model", "旧", stale.put_image(b"stale", "image/png"))
+            stale.save()
+            os.utime(stale.session_path, (0, 0))
+            chat_history._last_prune.clear()
+
+            history = ChatHistory(root=root)
+            build_session(history, 5)
+            history.save()
+            assert os.listdir(os.path.join(root, "sessions")) == [] and os.listdir(os.path.join(root, "images")) == []
+            assert history.read_image(history.last_image) == b"image-4"
+            # 只有最近 3 张图像仍在内存中，更早的轮次只发送文本
+            images = [base64.b64decode(p["inline_data"]["data"])
+                      for c in history.contents(max_images=14) for p in c["parts"] if "inline_data" in p]
+            assert set(images) == {b"image-2", b"image-3", b"image-4"}
+
+            # 同一目录在间隔内不重复清理
+            assert chat_history.maybe_prune(root) == 0
+            history.reset()
+            assert len(history) == 0 and history._images == {}
+    finally:
+        chat_history.TEMP_MAX_IMAGES, chat_history.PRUNE_MIN_AGE = old
+    print("✅ 临时会话只在内存中，过期的临时会话文件在创建会话时清理")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 多轮对话历史测试套件\n")
+
+    tests = [
+        ("图像上下文窗口", test_image_window),
+        ("会话持久化", test_session_persistence),
+        ("清理未引用图像", test_prune_unreferenced_images),
+        ("临时会话", test_temp_session_in_memory),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""测试有界并发执行工具"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.concurrency import iter_ordered, run_ordered
+
+
+def test_results_keep_input_order():
+    """测试结果按输入顺序返回"""
+    print("=" * 60)
+    print("测试 1: 结果顺序")
+    print("=" * 60)
+
+    def worker(idx, item):
+        # 越靠前的任务耗时越长，完成顺序与输入顺序相反
+        time.sleep(0.01 * (5 - idx))
+        return item * 2
+
+    outcomes = run_ordered([1, 2, 3, 4], worker, max_in_flight=4)
+    assert [o[0] for o in outcomes] == [1, 2, 3, 4]
+    assert [o[2] for o in outcomes] == [2, 4, 6, 8]
+    print("✅ 结果按输入顺序返回")
+    return True
+
+
+def test_in_flight_limit():
+    """测试同时进行中的任务数不超过上限"""
+    print("\n" + "=" * 60)
+    print("测试 2: 并发上限")
+    print("=" * 60)
+
+    lock = threading.Lock()
+    state = {"live": 0, "peak": 0}
+
+    def worker(idx, item):
+        with lock:
+            state["live"] += 1
+            state["peak"] = max(state["peak"], state["live"])
+        time.sleep(0.02)
+        with lock:
+            state["live"] -= 1
+
+    run_ordered(iter(range(12)), worker, max_in_flight=3)
+    assert state["peak"] <= 3, f"并发峰值 {state['peak']} 超过上限"
+    print(f"✅ 并发峰值: {state['peak']}")
+    return True
+
+
+def test_errors_are_isolated():
+    """测试单个任务失败不影响其他任务"""
+    print("\n" + "=" * 60)
+    print("测试 3: 错误隔离")
+    print("=" * 60)
+
+    def worker(idx, item):
+        if item == "bad":
+            raise ValueError("失败的任务")
+        return item.upper()
+
+    completed = []
+    outcomes = run_ordered(["a", "bad", "c"], worker, max_in_flight=2,
+                           on_result=lambda idx, item, result, error: completed.append(idx))
+    assert outcomes[0][2] == "A" and outcomes[2][2] == "C"
+    assert isinstance(outcomes[1][3], ValueError)
+    assert sorted(completed) == [1, 2, 3]
+    print("✅ 失败任务被单独记录")
+    return True
+
+
+def test_iter_ordered_streams():
+    """测试 iter_ordered 在前面的任务完成后立即按顺序产出，不等待全部结束"""
+    print("\n" + "=" * 60)
+    print("测试 4: 流式产出")
+    print("=" * 60)
+
+    release = threading.Event()
+
+    def worker(idx, item):
+        # 最后一个任务一直等待，前面的结果仍应先产出
+        if idx == 5:
+            release.wait(5)
+        return item
+
+    seen = []
+    for idx, _item, result, error in iter_ordered(range(5), worker, max_in_flight=5):
+        seen.append(result)
+        if idx == 4:
+            assert not release.is_set()
+            release.set()
+    assert seen == [0, 1, 2, 3, 4]
+    print("✅ 结果按顺序逐个产出")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 并发执行工具测试套件\n")
+
+    tests = [
+        ("结果顺序", test_results_keep_input_order),
+        ("并发上限", test_in_flight_limit),
+        ("错误隔离", test_errors_are_isolated),
+        ("流式产出", test_iter_ordered_streams),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -97,9 +97,9 @@ def test_csv_reader_functionality():
         print(f"   返回类型: {type(result)}")
         print(f"   返回长度: {len(result)}")
 
-        # 解析 JSON
-        import json
-        tasks = json.loads(result[0])
+        # 解析任务（任务句柄或 JSON 列表）
+        from utils.batch_tasks import open_tasks
+        tasks = list(open_tasks(result[0]))
         print(f"   任务数量: {len(tasks)}")
         print(f"   第一个任务: {tasks[0]}")
 
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""测试下载引擎（分段下载、断点续传、跳过已下载文件、批量任务的流水线下载）"""
+
+import sys
+import os
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import downloader
+
+PAYLOAD = os.urandom(300 * 1024 + 123)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """支持 HEAD / Range 的本地文件服务器；/plain 不支持 Range"""
+
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, status, length, extra=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", '"v1"')
+        if not self.path.startswith("/plain"):
+            self.send_header("Accept-Ranges", "bytes")
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        RangeHandler.requests_seen.append(("HEAD", self.path, None))
+        self._send_headers(200, len(PAYLOAD))
+
+    def do_GET(self):
+        rng = self.headers.get("Range")
+        RangeHandler.requests_seen.append(("GET", self.path, rng))
+        if rng and not self.path.startswith("/plain"):
+            start, end = rng.split("=")[1].split("-")
+            start = int(start)
+            end = int(end) if end else len(PAYLOAD) - 1
+            body = PAYLOAD[start:end + 1]
+            self._send_headers(206, len(body), {"Content-Range": f"bytes {start}-{end}/{len(PAYLOAD)}"})
+        else:
+            body = PAYLOAD
+            self._send_headers(200, len(body))
+        self.wfile.write(body)
+
+
+class PlainHttp:
+    """测试用传输层：直接使用 requests"""
+
+    @staticmethod
+    def request(method, url, timeout=None, **kwargs):
+        return requests.request(method, url, timeout=timeout, **kwargs)
+
+    @staticmethod
+    def get(url, **kwargs):
+        return requests.get(url, **kwargs)
+
+
+def run_with_server(fn):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    old = (downloader._http, downloader.SEGMENT_MIN_BYTES, downloader.CHUNK_BYTES)
+    old_cache = os.environ.get("KUAI_CACHE_DIR")
+    downloader._http = lambda: PlainHttp
+    downloader.SEGMENT_MIN_BYTES = 64 * 1024
+    downloader.CHUNK_BYTES = 16 * 1024
+    RangeHandler.requests_seen = []
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            os.environ["KUAI_CACHE_DIR"] = os.path.join(root, "cache")
+            return fn(f"http://127.0.0.1:{server.server_address[1]}", root)
+    finally:
+        downloader._http, downloader.SEGMENT_MIN_BYTES, downloader.CHUNK_BYTES = old
+        if old_cache is None:
+            os.environ.pop("KUAI_CACHE_DIR", None)
+        else:
+            os.environ["KUAI_CACHE_DIR"] = old_cache
+        server.shutdown()
+
+
+def test_segmented_and_skip():
+    """测试分段并行下载，再次下载时跳过"""
+    print("=" * 60)
+    print("测试 1: 分段下载与跳过")
+    print("=" * 60)
+
+    def body(base, root):
+        dest = os.path.join(root, "a.mp4")
+        result = downloader.download_file(f"{base}/a.mp4", dest)
+        assert result.status == "downloaded" and result.error is None
+        assert open(dest, "rb").read() == PAYLOAD
+        assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+        ranges = [r for m, _, r in RangeHandler.requests_seen if m == "GET"]
+        assert len(ranges) == downloader.MAX_SEGMENTS and all(ranges)
+
+        RangeHandler.requests_seen = []
+        assert downloader.download_file(f"{base}/a.mp4", dest).status == "skipped"
+        assert [m for m, _, _ in RangeHandler.requests_seen] == ["HEAD"]
+
+    run_with_server(body)
+    print("✅ 4 段并行下载，重复下载被跳过")
+    return True
+
+
+def test_resume_part():
+    """测试从 .part 与进度文件续传"""
+    print("\n" + "=" * 60)
+    print("测试 2: 断点续传")
+    print("=" * 60)
+
+    def body(base, root):
+        dest = os.path.join(root, "b.mp4")
+        length = len(PAYLOAD)
+        segments = downloader._plan_segments(length, downloader.MAX_SEGMENTS)
+        # 模拟中断：第 1 段完成，第 2 段写了一半，其余未开始
+        with open(dest + ".part", "wb") as f:
+            f.truncate(length)
+            s0, e0, _ = segments[0]
+            f.seek(s0)
+            f.write(PAYLOAD[s0:e0 + 1])
+            s1, e1, _ = segments[1]
+            half = s1 + (e1 - s1) // 2
+            f.seek(s1)
+            f.write(PAYLOAD[s1:half])
+        segments[0][2] = e0 + 1
+        segments[1][2] = half
+        with open(dest + ".part.json", "w") as f:
+            json.dump({"url": f"{base}/b.mp4", "etag": '"v1"', "length": length, "segments": segments}, f)
+
+        result = downloader.download_file(f"{base}/b.mp4", dest)
+        assert result.status == "resumed"
+        assert open(dest, "rb").read() == PAYLOAD
+        ranges = [r for m, _, r in RangeHandler.requests_seen if m == "GET"]
+        assert f"bytes={half}-{e1}" in ranges and len(ranges) == len(segments) - 1
+
+    run_with_server(body)
+    print("✅ 只下载缺失的部分")
+    return True
+
+
+def test_many_and_no_range():
+    """测试批量下载与不支持 Range 的服务器"""
+    print("\n" + "=" * 60)
+    print("测试 3: 批量下载")
+    print("=" * 60)
+
+    def body(base, root):
+        items = [(f"{base}/plain/{i}.mp4", os.path.join(root, f"{i}.mp4")) for i in range(3)]
+        items.append(("http://127.0.0.1:1/missing.mp4", os.path.join(root, "missing.mp4")))
+        results = downloader.download_many(items, max_workers=3, timeout=5)
+        assert [r.status for r in results] == ["downloaded"] * 3 + ["failed"]
+        assert all(open(path, "rb").read() == PAYLOAD for _, path in items[:3])
+        assert all(r is None for m, _, r in RangeHandler.requests_seen if m == "GET")
+
+        # 相同的 (URL, 目标) 只下载一次，结果复制给重复项
+        RangeHandler.requests_seen = []
+        dup = (f"{base}/plain/dup.mp4", os.path.join(root, "dup.mp4"))
+        results = downloader.download_many([dup, dup, items[0], dup], max_workers=4, timeout=5)
+        assert [r.status for r in results] == ["downloaded", "downloaded", "skipped", "downloaded"]
+        assert results[0] is results[1] is results[3]
+        assert [p for m, p, _ in RangeHandler.requests_seen if m == "GET"] == ["/plain/dup.mp4"]
+        assert open(dup[1], "rb").read() == PAYLOAD
+
+    run_with_server(body)
+    print("✅ 结果按顺序返回，单个失败不影响其他文件，重复项只下载一次")
+    return True
+
+
+def test_batch_pipeline():
+    """测试批量任务的媒体下载流水线"""
+    print("\n" + "=" * 60)
+    print("测试 4: 批量任务流水线下载")
+    print("=" * 60)
+
+    def body(base, root):
+        infos = [{"task_id": t, "video_url": f"{base}/{t}.mp4", "gif_url": "",
+                  "thumbnail_url": f"{base}/{t}.png?sig=1"} for t in ("a", "b")]
+        downloads = downloader.BatchDownloader(max_workers=2)
+        for info in infos:
+            downloads.submit_media(info, root, f"clip_{info['task_id']}")
+        ok, errors = downloader.apply_media_results(downloads.close())
+        assert ok == 4 and errors == []
+        assert open(os.path.join(root, "clip_a.mp4"), "rb").read() == PAYLOAD
+        assert os.path.exists(os.path.join(root, "clip_b_thumbnail.png"))
+        assert infos[0]["local_files"]["video_url"].endswith("clip_a.mp4")
+
+        # 续跑：本地已有的文件不再请求（URL 可能已过期）
+        RangeHandler.requests_seen = []
+        downloads = downloader.BatchDownloader()
+        assert downloads.submit_media(dict(infos[0]), root, "clip_a", skip_existing=True) == 0
+        assert downloads.close() == [] and RangeHandler.requests_seen == []
+
+        # 索引只追加；新进程读入时剔除已删除的文件并压缩
+        index = downloader._index_path()
+        assert len(open(index, encoding="utf-8").read().splitlines()) == 4
+        os.remove(os.path.join(root, "clip_b.mp4"))
+        downloader._index.clear()
+        assert downloader._index_entry(downloader.Path(root, "clip_a.mp4"))["etag"] == '"v1"'
+        assert downloader._index_entry(downloader.Path(root, "clip_b.mp4")) == {}
+        assert len(open(index, encoding="utf-8").read().splitlines()) == 3
+
+    run_with_server(body)
+    print("✅ 视频保存为 <output_prefix>.mp4，续跑不重复下载")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 下载引擎测试套件\n")
+
+    tests = [
+        ("分段下载与跳过", test_segmented_and_skip),
+        ("断点续传", test_resume_part),
+        ("批量下载", test_many_and_no_range),
+        ("批量任务流水线下载", test_batch_pipeline),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
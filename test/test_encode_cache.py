@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""测试参考图编码缓存"""
+
+import sys
+import os
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.encode_cache import EncodeCache
+
+
+def test_same_pixels_encoded_once():
+    """测试相同像素只编码一次"""
+    print("=" * 60)
+    print("测试 1: 相同像素复用编码结果")
+    print("=" * 60)
+
+    cache = EncodeCache()
+    img = np.random.rand(1, 32, 32, 3).astype(np.float32)
+
+    first = cache.encode(img, fmt="JPEG")
+    second = cache.encode(img.copy(), fmt="JPEG")
+    assert first == second
+    assert cache.hits == 1 and cache.misses == 1
+
+    decoded = Image.open(io.BytesIO(base64.b64decode(first.b64)))
+    assert decoded.format == "JPEG" and decoded.size == (32, 32)
+    print(f"✅ 命中 {cache.hits} 次，编码 {cache.misses} 次")
+    return True
+
+
+def test_key_includes_format_and_quality():
+    """测试格式、质量和像素变化都会产生新的编码"""
+    print("\n" + "=" * 60)
+    print("测试 2: 缓存键")
+    print("=" * 60)
+
+    cache = EncodeCache()
+    img = np.random.rand(16, 16, 3).astype(np.float32)
+    cache.encode(img, fmt="JPEG")
+    cache.encode(img, fmt="JPEG", quality=95)
+    cache.encode(img, fmt="PNG")
+    img[0, 0, 0] = 1.0 - img[0, 0, 0]
+    cache.encode(img, fmt="JPEG")
+    assert cache.misses == 4 and cache.hits == 0
+    print("✅ 不同格式 / 质量 / 像素分别缓存，原地修改的数组不会误命中")
+    return True
+
+
+def test_memory_bound():
+    """测试缓存总大小受限"""
+    print("\n" + "=" * 60)
+    print("测试 3: 内存上限")
+    print("=" * 60)
+
+    cache = EncodeCache(max_bytes=4096)
+    for _ in range(20):
+        cache.encode(np.random.rand(24, 24, 3).astype(np.float32), fmt="PNG")
+    assert cache._size <= 4096
+    assert cache._size == sum(len(v) for v in cache._entries.values())
+    print(f"✅ 缓存 {len(cache._entries)} 项，共 {cache._size} 字节")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 参考图编码缓存测试套件\n")
+
+    tests = [
+        ("相同像素复用编码结果", test_same_pixels_encoded_once),
+        ("缓存键", test_key_includes_format_and_quality),
+        ("内存上限", test_memory_bound),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
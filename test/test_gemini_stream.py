@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""测试 Gemini 响应流式解析（内联图像增量解码）"""
+
+import sys
+import os
+import base64
+import json
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import gemini_stream
+from utils.gemini_stream import GeminiBlockedError, InlineBlob, iter_documents, read_json_response
+
+
+class FakeResponse:
+    """按固定大小分块返回响应体"""
+
+    def __init__(self, body: bytes, chunk: int):
+        self.body = body
+        self.chunk = chunk
+        self.closed = False
+
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self.body), self.chunk):
+            yield self.body[i:i + self.chunk]
+
+    def close(self):
+        self.closed = True
+
+
+def make_response(image: bytes, text="好的", escape_slash=False, extra_data=True):
+    b64 = base64.b64encode(image).decode("ascii")
+    doc = {
+        "candidates": [{
+            "content": {"role": "model", "parts": [
+                {"text": text},
+                {"inlineData": {"mimeType": "image/png", "data": b64}},
+            ]},
+            "finishReason": "STOP",
+        }],
+        "usageMetadata": {"data": "not-inline"} if extra_data else {},
+    }
+    raw = json.dumps(doc, indent=1 if escape_slash else None, ensure_ascii=False)
+    if escape_slash:
+        raw = raw.replace("/", "\\/")
+    return raw.encode("utf-8")
+
+
+def test_single_response_any_chunking():
+    """测试任意分块大小下都能还原内联图像"""
+    print("=" * 60)
+    print("测试 1: 单个 JSON 响应")
+    print("=" * 60)
+
+    image = os.urandom(3001)
+    for escape_slash in (False, True):
+        body = make_response(image, text='提示 "data": "x"', escape_slash=escape_slash)
+        for chunk in (1, 3, 7, 64, 4096):
+            resp = FakeResponse(body, chunk)
+            data = read_json_response(resp)
+            parts = data["candidates"][0]["content"]["parts"]
+            blob = parts[1]["inlineData"]["data"]
+            assert isinstance(blob, InlineBlob) and blob.read_bytes() == image
+            assert parts[0]["text"] == '提示 "data": "x"'
+            assert data["usageMetadata"] == {"data": "not-inline"}
+            assert resp.closed
+    print("✅ 各种分块方式、转义斜杠下结果一致")
+    return True
+
+
+def test_stream_framing():
+    """测试 streamGenerateContent 的 JSON 数组与 SSE 两种格式"""
+    print("\n" + "=" * 60)
+    print("测试 2: 流式响应合并")
+    print("=" * 60)
+
+    image = os.urandom(500)
+    chunks = [
+        {"candidates": [{"content": {"role": "model", "parts": [{"text": "第一段"}]}}]},
+        {"candidates": [{"content": {"role": "model", "parts": [{"text": "第二段"}]}}]},
+        {"candidates": [{"content": {"role": "model", "parts": [
+            {"inline_data": {"mime_type": "image/png", "data": base64.b64encode(image).decode()}}]},
+            "finishReason": "STOP"}]},
+    ]
+    array_body = json.dumps(chunks, indent=2).encode()
+    sse_body = "".join(f"data: {json.dumps(c)}\r\n\r\n" for c in chunks).encode()
+    for body in (array_body, sse_body):
+        data = read_json_response(FakeResponse(body, 13))
+        cand = data["candidates"][0]
+        assert cand["finishReason"] == "STOP"
+        assert cand["content"]["parts"][0] == {"text": "第一段第二段"}
+        assert cand["content"]["parts"][1]["inline_data"]["data"].read_bytes() == image
+    print("✅ JSON 数组与 SSE 均正确合并")
+    return True
+
+
+def test_large_blob_spools_to_disk():
+    """测试大图写入临时文件而不是留在内存"""
+    print("\n" + "=" * 60)
+    print("测试 3: 大图溢出到临时文件")
+    print("=" * 60)
+
+    old = gemini_stream.SPOOL_MAX_BYTES
+    gemini_stream.SPOOL_MAX_BYTES = 1024
+    try:
+        image = os.urandom(10000)
+        data = read_json_response(FakeResponse(make_response(image), 997))
+        blob = data["candidates"][0]["content"]["parts"][1]["inlineData"]["data"]
+        assert blob._file._rolled and blob.size == len(image)
+        assert blob.read_bytes() == image
+    finally:
+        gemini_stream.SPOOL_MAX_BYTES = old
+    print("✅ 超过阈值的图像写入临时文件")
+    return True
+
+
+def test_incremental_and_block():
+    """测试响应块一到达就返回，安全拦截时不再继续读取"""
+    print("\n" + "=" * 60)
+    print("测试 4: 增量输出与安全拦截")
+    print("=" * 60)
+
+    chunks = [
+        {"candidates": [{"content": {"parts": [{"text": "思考中"}]}}]},
+        {"candidates": [{"finishReason": "IMAGE_SAFETY"}]},
+        {"candidates": [{"content": {"parts": [{"text": "x" * 5000}]}}]},
+    ]
+    for body in (json.dumps(chunks).encode(), "".join(f"data: {json.dumps(c)}\n\n" for c in chunks).encode()):
+        resp = FakeResponse(body, 16)
+        consumed = []
+        original = resp.iter_content
+
+        def tracking(chunk_size=None):
+            for piece in original(chunk_size):
+                consumed.append(len(piece))
+                yield piece
+
+        resp.iter_content = tracking
+        texts = []
+        try:
+            read_json_response(resp, on_text=texts.append)
+            raise AssertionError("应当抛出 GeminiBlockedError")
+        except GeminiBlockedError as e:
+            assert e.reason == "IMAGE_SAFETY"
+        assert texts == ["思考中"]
+        assert sum(consumed) < len(body) // 2 and resp.closed
+
+    docs = list(iter_documents(FakeResponse(json.dumps(chunks[:1]).encode(), 5)))
+    assert docs == chunks[:1]
+    print("✅ 文本实时回调，拦截后立即停止读取")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 Gemini 流式解析测试套件\n")
+
+    tests = [
+        ("单个 JSON 响应", test_single_response_any_chunking),
+        ("流式响应合并", test_stream_framing),
+        ("大图溢出到临时文件", test_large_blob_spools_to_disk),
+        ("增量输出与安全拦截", test_incremental_and_block),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""测试 IMAGE ↔ 图片转换"""
+
+import sys
+import os
+import io
+
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import image_convert
+
+
+def test_matches_legacy_conversion():
+    """测试分块转换与旧写法逐像素一致"""
+    print("=" * 60)
+    print("测试 1: 与旧写法一致")
+    print("=" * 60)
+
+    old_chunk = image_convert.CHUNK_ELEMENTS
+    image_convert.CHUNK_ELEMENTS = 1000  # 强制多块
+    try:
+        images = np.random.rand(3, 37, 29, 3).astype(np.float32) * 1.4 - 0.2
+        expected = np.clip(images * 255.0, 0, 255).astype(np.uint8)
+        result = image_convert.tensor_to_uint8(images)
+        assert result.shape == images.shape and result.dtype == np.uint8
+        assert np.array_equal(result, expected)
+
+        pixels = expected[1]
+        assert np.array_equal(image_convert.uint8_to_float(pixels), pixels.astype(np.float32) / 255.0)
+    finally:
+        image_convert.CHUNK_ELEMENTS = old_chunk
+    print("✅ uint8 / float32 转换结果一致")
+    return True
+
+
+def test_decode_and_pil():
+    """测试图片字节解码与 PIL 转换"""
+    print("\n" + "=" * 60)
+    print("测试 2: 解码与 PIL 转换")
+    print("=" * 60)
+
+    pixels = (np.random.rand(20, 30, 3) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    tensor = np.asarray(image_convert.decode_to_tensor(buffer.getvalue()))
+    assert tensor.shape == (1, 20, 30, 3) and tensor.dtype == np.float32
+    assert np.array_equal(image_convert.tensor_to_uint8(tensor[0]), pixels)
+
+    batch = image_convert.pils_to_tensor([Image.fromarray(pixels), Image.fromarray(pixels).convert("L")])
+    assert np.asarray(batch).shape == (2, 20, 30, 3)
+
+    pils = image_convert.tensor_to_pil_list(tensor)
+    assert len(pils) == 1 and pils[0].size == (30, 20)
+    gray = image_convert.tensor_to_pil(np.zeros((2, 8, 8, 1), dtype=np.float32), 1)
+    assert gray.mode == "RGB"
+    print("✅ 解码、批量与单通道转换正常")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 图像转换测试套件\n")
+
+    tests = [
+        ("与旧写法一致", test_matches_legacy_conversion),
+        ("解码与 PIL 转换", test_decode_and_pil),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
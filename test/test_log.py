@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""测试结构化日志（文本 / JSON 格式、队列写出）与批量进度汇总"""
+
+import sys
+import os
+import io
+import json
+import logging
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import log as kuai_log
+
+
+def _record(name="kuai.Sora2Batch", level=logging.INFO, msg="行 %d 完成", args=(3,), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_formatters():
+    """测试文本格式沿用 "[标签] 消息"，JSON 格式携带附加字段"""
+    print("=" * 60)
+    print("测试 1: 文本与 JSON 格式")
+    print("=" * 60)
+
+    assert kuai_log.TextFormatter().format(_record()) == "[Sora2Batch] 行 3 完成"
+    colored = kuai_log.TextFormatter(color=True).format(_record(level=logging.WARNING))
+    assert colored.startswith(kuai_log.RED) and colored.endswith(kuai_log.RESET)
+    assert kuai_log.TextFormatter(color=True).format(_record()) == "[Sora2Batch] 行 3 完成"
+
+    data = json.loads(kuai_log.JsonFormatter().format(_record(fields={"event": "progress", "done": 3})))
+    assert data["level"] == "INFO" and data["tag"] == "Sora2Batch" and data["message"] == "行 3 完成"
+    assert data["event"] == "progress" and data["done"] == 3 and "ts" in data
+
+    print("✅ 文本格式与原 print 输出一致，JSON 每条一行并展开 fields")
+    return True
+
+
+def test_queue_handler():
+    """测试记录经队列由监听线程写出，调用方线程不做格式化和 I/O"""
+    print("\n" + "=" * 60)
+    print("测试 2: 队列写出")
+    print("=" * 60)
+
+    saved = {name: os.environ.get(name) for name in ("KUAI_LOG_FORMAT", "KUAI_LOG_LEVEL")}
+    os.environ["KUAI_LOG_FORMAT"] = "json"
+    os.environ["KUAI_LOG_LEVEL"] = "INFO"
+    real_stdout, sys.stdout = sys.stdout, io.StringIO()
+    try:
+        kuai_log.configure(force=True)
+        logger = kuai_log.get_logger("Test")
+        emitter = []
+
+        class Probe:
+            def __str__(self):
+                emitter.append(threading.current_thread().name)
+                return "probe"
+
+        logger.info("参数 %s", Probe(), extra={"fields": {"row": 1}})
+        logger.debug("默认级别下不输出")
+        kuai_log.flush()
+        lines = [json.loads(line) for line in sys.stdout.getvalue().splitlines()]
+    finally:
+        sys.stdout = real_stdout
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        kuai_log.configure(force=True)
+
+    assert [(r["tag"], r["message"], r["row"]) for r in lines] == [("Test", "参数 probe", 1)]
+    # 消息参数在入队前合并（避免参数对象在其他线程被修改），其余格式化在监听线程
+    assert emitter == [threading.current_thread().name]
+    assert isinstance(logging.getLogger("kuai").handlers[0], logging.handlers.QueueHandler)
+
+    print("✅ 记录经队列写入当前 stdout，DEBUG 默认被过滤")
+    return True
+
+
+def test_progress_reporter():
+    """测试进度汇总按间隔限频，跳过的行不计入速率"""
+    print("\n" + "=" * 60)
+    print("测试 3: 进度汇总")
+    print("=" * 60)
+
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    logger = logging.getLogger("test_log.progress")
+    logger.propagate = False
+    capture = Capture()
+    logger.addHandler(capture)
+    logger.setLevel(logging.INFO)
+
+    now = [100.0]
+    progress = kuai_log.ProgressReporter(logger, total=10, interval=5, clock=lambda: now[0])
+    progress.start()
+    progress.finish(skipped=True)
+    for _ in range(3):
+        progress.start()
+        now[0] += 1
+        progress.finish()
+    assert capture.records == []
+
+    progress.start()
+    progress.start()
+    now[0] += 2
+    progress.finish(ok=False)
+    assert len(capture.records) == 1
+    fields = capture.records[0].fields
+    assert fields["done"] == 5 and fields["failed"] == 1 and fields["skipped"] == 1 and fields["in_flight"] == 1
+    # 5 秒处理了 4 行（跳过的行不计入），剩余 5 行约 6.2 秒
+    assert fields["rows_per_sec"] == 0.8 and fields["eta_sec"] == 6.2
+    assert "预计剩余 6s" in capture.records[0].getMessage()
+
+    now[0] += 1
+    progress.finish()
+    assert len(capture.records) == 1
+
+    summary = progress.close()
+    assert len(capture.records) == 2 and summary["done"] == 6 and summary["in_flight"] == 0
+    assert capture.records[1].getMessage().startswith("完成 6/10")
+
+    print("✅ 间隔内只输出一条，速率与剩余时间按实际处理的行计算")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 结构化日志测试套件\n")
+
+    tests = [
+        ("文本与 JSON 格式", test_formatters),
+        ("队列写出", test_queue_handler),
+        ("进度汇总", test_progress_reporter),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
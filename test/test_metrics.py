@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""测试指标埋点（直方图、标签上下文、Prometheus / JSON 导出）"""
+
+import sys
+import os
+import json
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import metrics
+from utils.concurrency import run_ordered
+
+
+def test_histogram():
+    """测试分桶与分位数估计"""
+    print("=" * 60)
+    print("测试 1: 直方图")
+    print("=" * 60)
+
+    hist = metrics.Histogram(buckets=(1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        hist.observe(value)
+    assert hist.count == 5 and hist.sum == 16.5
+    assert hist.cumulative() == [(1, 1), (2, 3), (4, 4), (float("inf"), 5)]
+    # 第 2.5 个观测落在 (1, 2] 桶内的 3/4 处
+    assert abs(hist.quantile(0.5) - 1.75) < 1e-9
+    assert hist.quantile(0.99) == 4
+    assert metrics.Histogram().quantile(0.5) == 0.0
+
+    print("✅ 累计分桶与插值分位数正确")
+    return True
+
+
+def test_tags_and_export():
+    """测试标签上下文、装饰器与两种导出格式"""
+    print("\n" + "=" * 60)
+    print("测试 2: 标签与导出")
+    print("=" * 60)
+
+    registry = metrics.Registry()
+    with metrics.tags(model="sora-2"):
+        registry.observe("kuai_http_request_seconds", 0.2, provider="api.kuai.host", status="200")
+        with metrics.tags(model="veo3"):
+            registry.inc("kuai_poll_queries_total", outcome="ok")
+    registry.inc("kuai_poll_queries_total", outcome="ok")
+    registry.inc("kuai_http_sent_bytes_total", 10, endpoint='a"b')
+
+    text = registry.prometheus_text()
+    assert "# TYPE kuai_http_request_seconds histogram" in text
+    assert ('kuai_http_request_seconds_bucket{model="sora-2",provider="api.kuai.host",status="200",le="0.25"} 1'
+            in text)
+    assert 'kuai_http_request_seconds_count{model="sora-2",provider="api.kuai.host",status="200"} 1' in text
+    assert 'kuai_poll_queries_total{model="veo3",outcome="ok"} 1' in text
+    assert 'kuai_poll_queries_total{outcome="ok"} 1' in text
+    assert 'endpoint="a\\"b"' in text
+
+    snap = registry.snapshot()
+    hist = snap["histograms"][0]
+    assert hist["labels"]["model"] == "sora-2" and hist["count"] == 1 and hist["buckets"]["+Inf"] == 1
+    json.dumps(snap)
+
+    @metrics.tagged(model="model_name")
+    def current(model_name, other=None):
+        return metrics.current_tags()
+
+    assert current("gemini") == {"model": "gemini"}
+    assert current(model_name="") == {}
+    assert metrics.current_tags() == {}
+
+    print("✅ 上下文标签嵌套覆盖，Prometheus 文本与 JSON 快照格式正确")
+    return True
+
+
+def test_http_labels_and_context():
+    """测试 URL 归一化与工作线程继承标签上下文"""
+    print("\n" + "=" * 60)
+    print("测试 3: HTTP 标签与跨线程上下文")
+    print("=" * 60)
+
+    labels = metrics.http_labels("POST", "https://api.kuai.host/v1beta/models/gemini-3-pro-image-preview:generateContent")
+    assert labels == {"provider": "api.kuai.host", "method": "POST", "model": "gemini-3-pro-image-preview",
+                      "endpoint": "/v1beta/models/{model}:generateContent"}
+    assert metrics.http_labels("POST", "https://x/v1/videos/video_68d1a2b3c4d5e6f7/remix")["endpoint"] == \
+        "/v1/videos/{id}/remix"
+    assert metrics.http_labels("GET", "https://api.kuai.host/v1/video/query?id=1")["endpoint"] == "/v1/video/query"
+    assert metrics.http_labels("GET", "https://cdn.example.com/a/b/c.mp4")["endpoint"] == "other"
+
+    with metrics.tags(model="grok-video-3"):
+        outcomes = run_ordered(range(3), lambda idx, item: metrics.current_tags(), max_in_flight=3)
+    assert all(result == {"model": "grok-video-3"} for _, _, result, _ in outcomes)
+
+    with tempfile.TemporaryDirectory() as root:
+        metrics.observe("kuai_image_decode_seconds", 0.01)
+        path = os.path.join(root, "kuai.json")
+        metrics.write_file(path)
+        names = {h["name"] for h in json.load(open(path, encoding="utf-8"))["histograms"]}
+        assert "kuai_image_decode_seconds" in names or not metrics.enabled()
+
+    print("✅ ID 段归一化，run_ordered 工作线程沿用调用方标签")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 指标埋点测试套件\n")
+
+    tests = [
+        ("直方图", test_histogram),
+        ("标签与导出", test_tags_and_export),
+        ("HTTP 标签与跨线程上下文", test_http_labels_and_context),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""测试离线模拟 API 服务器（benchmarks/mock_api.py）的接口格式与故障注入"""
+
+import sys
+import os
+import time
+
+import requests
+
+# 添加项目根目录和 benchmarks 目录到路径
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from mock_api import MockApiServer, MockConfig
+from utils.gemini_stream import read_json_response
+
+
+def test_video_lifecycle():
+    """测试视频任务从创建到完成，以及完成后的文件地址"""
+    print("=" * 60)
+    print("测试 1: 视频任务生命周期")
+    print("=" * 60)
+
+    with MockApiServer(MockConfig(latency=0, render_seconds=0.3)) as server:
+        base = server.base_url
+        created = requests.post(f"{base}/v1/video/create", json={"model": "sora-2", "prompt": "p"}, timeout=5).json()
+        task_id = created["id"]
+        assert created["status"] == "pending"
+
+        first = requests.get(f"{base}/v1/video/query", params={"id": task_id}, timeout=5).json()
+        assert first["status"] in ("pending", "processing")
+        time.sleep(0.4)
+        done = requests.get(f"{base}/v1/video/query", params={"id": task_id}, timeout=5).json()
+        assert done["status"] == "completed" and done["detail"]["url"] == done["video_url"]
+
+        video = requests.get(done["video_url"], timeout=5)
+        assert video.status_code == 200 and len(video.content) > 0
+        assert requests.get(f"{base}/v1/video/query", params={"id": "nope"}, timeout=5).status_code == 404
+
+        stats = server.stats()
+        assert stats["calls"]["GET /v1/video/query"] == 3 and stats["tasks_created"] == 1
+        assert len(stats["task_seconds"]) == 1
+
+    print("✅ pending → completed，video_url 可下载，调用按接口计数")
+    return True
+
+
+def test_faults():
+    """测试 429（带 Retry-After）、500 与远端任务失败"""
+    print("\n" + "=" * 60)
+    print("测试 2: 故障注入")
+    print("=" * 60)
+
+    with MockApiServer(MockConfig(latency=0, rate_limit_rate=1.0, retry_after=2)) as server:
+        resp = requests.post(f"{server.base_url}/v1/chat/completions", json={}, timeout=5)
+        assert resp.status_code == 429 and resp.headers["Retry-After"] == "2"
+
+    with MockApiServer(MockConfig(latency=0, failure_rate=1.0)) as server:
+        assert requests.post(f"{server.base_url}/v1/video/create", json={}, timeout=5).status_code == 500
+        assert server.stats()["statuses"] == {"POST /v1/video/create 500": 1}
+
+    with MockApiServer(MockConfig(latency=0, render_seconds=0, task_failure_rate=1.0)) as server:
+        task_id = requests.post(f"{server.base_url}/v1/video/create", json={}, timeout=5).json()["id"]
+        data = requests.get(f"{server.base_url}/v1/video/query", params={"id": task_id}, timeout=5).json()
+        assert data["status"] == "failed" and "video_url" not in data
+
+    print("✅ 429 / 500 / failed 按配置返回")
+    return True
+
+
+def test_generate_chat_upload():
+    """测试 Gemini、chat/completions 与图床接口的响应格式"""
+    print("\n" + "=" * 60)
+    print("测试 3: 图像生成、对话与上传")
+    print("=" * 60)
+
+    with MockApiServer(MockConfig(latency=0, image_size=8)) as server:
+        base = server.base_url
+        resp = requests.post(f"{base}/v1beta/models/gemini-2.5-flash-image:generateContent", json={}, stream=True,
+                             timeout=5)
+        parts = read_json_response(resp)["candidates"][0]["content"]["parts"]
+        blob = next(p["inlineData"]["data"] for p in parts if "inlineData" in p)
+        assert blob.read_bytes().startswith(b"\x89PNG")
+
+        resp = requests.post(f"{base}/v1beta/models/m:streamGenerateContent?alt=sse", json={}, stream=True, timeout=5)
+        texts = [p["text"] for p in read_json_response(resp)["candidates"][0]["content"]["parts"] if "text" in p]
+        assert "".join(texts).startswith("mock")
+
+        chat = requests.post(f"{base}/v1/chat/completions", json={"model": "deepseek"}, timeout=5).json()
+        assert chat["choices"][0]["message"]["content"] == "mock response"
+
+        uploaded = requests.post(f"{base}/api/upload", files={"file": ("a.jpg", b"jpeg-bytes", "image/jpeg")},
+                                 timeout=5).json()
+        assert uploaded["created"] and b"jpeg-bytes" in requests.get(uploaded["url"], timeout=5).content
+
+        calls = server.stats()["calls"]
+        assert calls["POST /v1beta/models/{model}:generateContent"] == 1
+        assert calls["POST /v1beta/models/{model}:streamGenerateContent"] == 1
+
+    print("✅ 响应可被节点的解析逻辑读取")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 模拟 API 服务器测试套件\n")
+
+    tests = [
+        ("视频任务生命周期", test_video_lifecycle),
+        ("故障注入", test_faults),
+        ("图像生成、对话与上传", test_generate_chat_upload),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""测试节点清单与按需加载代理"""
+
+import sys
+import os
+import inspect
+import json
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import node_manifest
+
+
+class DemoNode:
+    """示例节点"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"prompt": ("STRING", {"default": ""}), "mode": (["a", "b"],)}}
+
+    @classmethod
+    def INPUT_LABELS(cls):
+        return {"prompt": "提示词"}
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, prompt="", mode="a"):
+        return prompt != "bad"
+
+    RETURN_TYPES = ("STRING", "INT")
+    RETURN_NAMES = ("文本", "长度")
+    FUNCTION = "run"
+    CATEGORY = "KuAi/Test"
+    OUTPUT_NODE = True
+
+    def run(self, prompt, mode):
+        return (prompt, len(prompt))
+
+
+def test_proxy_roundtrip():
+    """测试清单写入 JSON 后生成的代理类与真实类一致，执行时才加载"""
+    print("=" * 60)
+    print("测试 1: 代理类")
+    print("=" * 60)
+
+    loads = []
+
+    def loader(module, name):
+        loads.append((module, name))
+        return DemoNode
+
+    manifest = node_manifest.build_manifest(Path(tempfile.gettempdir()), {"Demo": DemoNode},
+                                            {"Demo": ".nodes.Demo"}, {"Demo": "示例"}, failed=[".nodes.Broken"])
+    entry = json.loads(json.dumps(manifest))["nodes"]["Demo"]
+    proxy = node_manifest.make_proxy("Demo", entry, loader)
+
+    assert proxy.INPUT_TYPES() == DemoNode.INPUT_TYPES()
+    assert proxy.RETURN_TYPES == ("STRING", "INT") and proxy.OUTPUT_NODE is True
+    assert proxy.INPUT_LABELS() == {"prompt": "提示词"}
+    assert inspect.getfullargspec(proxy.VALIDATE_INPUTS).args == ["cls", "prompt", "mode"]
+    assert not hasattr(proxy, "IS_CHANGED")
+    assert loads == []
+
+    node = proxy()
+    assert getattr(node, node.FUNCTION)(prompt="abc", mode="a") == ("abc", 3)
+    assert proxy.VALIDATE_INPUTS(prompt="bad") is False
+    assert loads == [(".nodes.Demo", "Demo")] * 2
+    print("✅ 静态信息来自清单，执行时才导入真实类")
+    return True
+
+
+def test_manifest_fingerprint():
+    """测试源码变化后清单失效"""
+    print("\n" + "=" * 60)
+    print("测试 2: 清单指纹")
+    print("=" * 60)
+
+    old_cache = os.environ.get("KUAI_CACHE_DIR")
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["KUAI_CACHE_DIR"] = os.path.join(root, "cache")
+        try:
+            plugin = Path(root) / "plugin"
+            (plugin / "nodes").mkdir(parents=True)
+            (plugin / "utils").mkdir()
+            node_file = plugin / "nodes" / "demo.py"
+            node_file.write_text("x = 1\n")
+
+            node_manifest.save_manifest(node_manifest.build_manifest(
+                plugin, {"Demo": DemoNode}, {"Demo": ".nodes.demo"}, {}))
+            assert node_manifest.load_manifest(plugin)["nodes"]["Demo"]["display_name"] == "Demo"
+
+            node_file.write_text("x = 22\n")
+            assert node_manifest.load_manifest(plugin) is None
+        finally:
+            if old_cache is None:
+                os.environ.pop("KUAI_CACHE_DIR", None)
+            else:
+                os.environ["KUAI_CACHE_DIR"] = old_cache
+    print("✅ 节点源码修改后重新生成清单")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 节点清单测试套件\n")
+
+    tests = [
+        ("代理类", test_proxy_roundtrip),
+        ("清单指纹", test_manifest_fingerprint),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
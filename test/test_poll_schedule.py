@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""测试自适应轮询间隔"""
+
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.poll_schedule import AdaptiveSchedule, RenderTimeStats, stats_key
+
+
+def _stats_with(samples, key):
+    path = os.path.join(tempfile.mkdtemp(), "render_times.json")
+    stats = RenderTimeStats(path)
+    for s in samples:
+        stats.record(key, s)
+    return stats, path
+
+
+def test_no_history_uses_base_interval():
+    """测试无历史数据时与固定间隔一致"""
+    print("=" * 60)
+    print("测试 1: 无历史数据")
+    print("=" * 60)
+
+    stats, _ = _stats_with([], "x")
+    schedule = AdaptiveSchedule(15, key=stats_key("sora-2-all", 10), stats=stats)
+    assert schedule.next_delay(0, "processing") == 15
+    assert schedule.next_delay(400, "processing") == 15
+    print("✅ 使用基础间隔 15 秒")
+    return True
+
+
+def test_sparse_then_dense():
+    """测试窗口前稀疏、窗口内密集、窗口后回落"""
+    print("\n" + "=" * 60)
+    print("测试 2: 稀疏 / 密集轮询")
+    print("=" * 60)
+
+    key = stats_key("sora-2-pro-all", 25)
+    stats, path = _stats_with([300, 320, 340, 360, 380], key)
+    lo, hi = stats.window(key)
+    assert 300 <= lo < hi <= 380
+
+    schedule = AdaptiveSchedule(15, key=key, stats=stats)
+    early = schedule.next_delay(0, "processing")
+    inside = schedule.next_delay((lo + hi) / 2, "processing")
+    late = schedule.next_delay(hi + 100, "processing")
+    assert early == 60, early          # 单次等待不超过 4 倍基础间隔
+    assert inside == 5, inside         # 窗口内使用 1/3 基础间隔
+    assert late == 15, late
+    assert schedule.next_delay(0, "queued") == 15
+
+    # 持久化后重新加载
+    assert RenderTimeStats(path).window(key) == (lo, hi)
+    print(f"✅ 窗口 {lo:.0f}-{hi:.0f}s: 早期 {early}s / 窗口内 {inside}s / 超时后 {late}s")
+    return True
+
+
+def test_progress_and_key_from_response():
+    """测试服务端进度与从响应补全分组键"""
+    print("\n" + "=" * 60)
+    print("测试 3: 进度估计")
+    print("=" * 60)
+
+    stats, _ = _stats_with([], "x")
+    schedule = AdaptiveSchedule(15, stats=stats)
+    delay = schedule.next_delay(30, "processing", {"model": "sora-2-all", "duration": 10, "progress": 75})
+    assert delay == 10, delay          # 剩余约 10 秒
+    assert schedule.key == "sora-2-all|10"
+    schedule.completed(42)
+    assert stats._samples["sora-2-all|10"] == [42.0]
+    print(f"✅ 按进度估计下一次间隔 {delay}s")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 自适应轮询测试套件\n")
+
+    tests = [
+        ("无历史数据", test_no_history_uses_base_interval),
+        ("稀疏 / 密集轮询", test_sparse_then_dense),
+        ("进度估计", test_progress_and_key_from_response),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""测试共享轮询调度器"""
+
+import sys
+import os
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.poller import TaskPoller
+
+
+class FakeQuery:
+    """模拟 /v1/video/query：每个任务在第 N 次查询时完成"""
+
+    def __init__(self, finish_after, final_status="completed"):
+        self.finish_after = finish_after
+        self.final_status = final_status
+        self.calls = {}
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, api_base, api_key, task_id, timeout):
+        with self.lock:
+            self.calls[task_id] = self.calls.get(task_id, 0) + 1
+            self.threads.add(threading.current_thread().name)
+            n = self.calls[task_id]
+        if n >= self.finish_after.get(task_id, 1):
+            return {"id": task_id, "status": self.final_status, "video_url": f"https://example.com/{task_id}.mp4"}
+        return {"id": task_id, "status": "processing"}
+
+
+def test_multiplex_many_tasks():
+    """测试多个任务共用一个轮询线程"""
+    print("=" * 60)
+    print("测试 1: 多任务复用")
+    print("=" * 60)
+
+    query = FakeQuery({f"task_{i}": i + 1 for i in range(8)})
+    poller = TaskPoller(query_fn=query)
+    futures = [poller.submit(f"task_{i}", "http://mock", "key", poll_interval=0.01, timeout=5) for i in range(8)]
+    results = [f.result(timeout=5) for f in futures]
+
+    assert all(r.status == "completed" for r in results)
+    assert [r.polls for r in results] == [i + 1 for i in range(8)]
+    assert query.threads == {"kuai-poller"}, f"查询线程: {query.threads}"
+    print(f"✅ 8 个任务由单线程完成，共 {sum(query.calls.values())} 次查询")
+    return True
+
+
+def test_timeout_returns_last_data():
+    """测试超时返回最后一次响应"""
+    print("\n" + "=" * 60)
+    print("测试 2: 超时")
+    print("=" * 60)
+
+    poller = TaskPoller(query_fn=FakeQuery({"slow": 10 ** 6}))
+    result = poller.submit("slow", "http://mock", "key", poll_interval=0.02, timeout=0.1).result(timeout=5)
+
+    assert result.timed_out and result.status == "timeout"
+    assert result.data["status"] == "processing"
+    print(f"✅ 超时前查询 {result.polls} 次")
+    return True
+
+
+def test_query_errors():
+    """测试连续查询失败时 Future 抛出异常"""
+    print("\n" + "=" * 60)
+    print("测试 3: 查询失败")
+    print("=" * 60)
+
+    def broken(api_base, api_key, task_id, timeout):
+        raise ConnectionError("boom")
+
+    poller = TaskPoller(query_fn=broken)
+    future = poller.submit("x", "http://mock", "key", poll_interval=0.01, timeout=5, max_errors=2)
+    try:
+        future.result(timeout=5)
+    except RuntimeError as e:
+        assert "boom" in str(e)
+        print(f"✅ 抛出异常: {e}")
+        return True
+    raise AssertionError("应当抛出 RuntimeError")
+
+
+if __name__ == "__main__":
+    print("\n🧪 共享轮询调度器测试套件\n")
+
+    tests = [
+        ("多任务复用", test_multiplex_many_tasks),
+        ("超时", test_timeout_returns_last_data),
+        ("查询失败", test_query_errors),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""测试令牌桶限流器"""
+
+import sys
+import os
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.rate_limit import TokenBucket, parse_model_limits
+
+
+class FakeClock:
+    """可手动推进的时钟，sleep 直接推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+def test_burst_then_rate():
+    """测试突发容量用完后按速率放行"""
+    print("=" * 60)
+    print("测试 1: 突发与稳定速率")
+    print("=" * 60)
+
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=3, clock=clock, sleep=clock.sleep)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits[:3] == [0.0, 0.0, 0.0], waits
+    assert abs(waits[3] - 0.5) < 1e-9 and abs(waits[4] - 1.0) < 1e-9, waits
+
+    clock.now += 10
+    assert bucket.reserve() == 0.0
+    print(f"✅ 等待时间: {waits}")
+    return True
+
+
+def test_concurrent_reservations():
+    """测试并发调用按预约顺序获得配额"""
+    print("\n" + "=" * 60)
+    print("测试 2: 并发预约")
+    print("=" * 60)
+
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10.0, burst=1, clock=clock, sleep=lambda s: None)
+    waits = []
+    lock = threading.Lock()
+
+    def worker():
+        w = bucket.reserve()
+        with lock:
+            waits.append(w)
+
+    threads = [threading.Thread(target=worker) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    expected = [round(i * 0.1, 6) for i in range(20)]
+    assert sorted(round(w, 6) for w in waits) == expected
+    print("✅ 20 个并发请求被均匀排开，无重复配额")
+    return True
+
+
+def test_unlimited_and_config():
+    """测试不限流与按模型配置解析"""
+    print("\n" + "=" * 60)
+    print("测试 3: 不限流与配置解析")
+    print("=" * 60)
+
+    bucket = TokenBucket(rate=0, burst=1)
+    assert all(bucket.acquire() == 0.0 for _ in range(100))
+
+    limits = parse_model_limits("sora-2=10, gemini-3-pro-image-preview=30:3,bad=x,")
+    assert limits == {"sora-2": (10.0, 0), "gemini-3-pro-image-preview": (30.0, 3)}, limits
+    print(f"✅ 解析结果: {limits}")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 令牌桶限流测试套件\n")
+
+    tests = [
+        ("突发与稳定速率", test_burst_then_rate),
+        ("并发预约", test_concurrent_reservations),
+        ("不限流与配置解析", test_unlimited_and_config),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
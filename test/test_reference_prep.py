@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""测试 NanoBanana 参考图预处理（按模型缩放、并行编码）"""
+
+import sys
+import os
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils import encode_cache
+from utils.encode_cache import EncodeCache, fit_size
+from utils.reference_prep import MODEL_PROFILES, prepare_references, reference_profile
+
+
+def test_fit_size():
+    """测试按比例缩放尺寸"""
+    print("=" * 60)
+    print("测试 1: 缩放尺寸")
+    print("=" * 60)
+
+    assert fit_size(6000, 4000, 1024) == (1024, 683)
+    assert fit_size(4000, 6000, 1024) == (683, 1024)
+    assert fit_size(800, 600, 1024) == (800, 600)
+    assert fit_size(800, 600, 0) == (800, 600)
+    assert reference_profile("gemini-2.5-flash-image") == MODEL_PROFILES["gemini-2.5-flash-image"]
+    print("✅ 最长边限制正确，小图不放大")
+    return True
+
+
+def test_prepare_references():
+    """测试参考图按模型缩小、保持顺序，不比基准编码大，并按基准统计节省的字节"""
+    print("\n" + "=" * 60)
+    print("测试 2: 参考图预处理")
+    print("=" * 60)
+
+    encode_cache._cache = EncodeCache()
+    try:
+        big = np.random.rand(1, 1500, 2400, 3).astype(np.float32)
+        small = np.random.rand(1, 300, 200, 3).astype(np.float32)
+        prepared = prepare_references([big, None, small, big], "gemini-2.5-flash-image")
+
+        assert len(prepared.b64) == 3 and len(prepared.digests) == 3
+        sizes = [Image.open(io.BytesIO(base64.b64decode(b))).size for b in prepared.b64]
+        assert sizes == [(1024, 640), (200, 300), (1024, 640)]
+        assert prepared.digests[0] == prepared.digests[2] != prepared.digests[1]
+        assert prepared.digests[0].endswith(":1024:88")
+        # 小图以质量 88 编码比 PIL 默认质量大，发送基准编码
+        baseline_small = encode_cache._cache.encode(small, fmt="JPEG")
+        assert prepared.b64[1] == baseline_small.b64 and prepared.digests[1].endswith(":0:default")
+        baseline_big = encode_cache._cache.encode(big, fmt="JPEG")
+        assert prepared.original_bytes == 2 * len(baseline_big.b64) + len(baseline_small.b64)
+        assert prepared.sent_bytes == sum(len(b) for b in prepared.b64)
+        assert prepared.original_bytes > prepared.sent_bytes * 3
+        # 同一张参考图只编码一次（基准与预处理各一次）
+        assert encode_cache._cache.misses == 4 and encode_cache._cache.hits == 2
+    finally:
+        encode_cache._cache = None
+    print("✅ 缩放、顺序、缓存与字节统计正常")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 参考图预处理测试套件\n")
+
+    tests = [
+        ("缩放尺寸", test_fit_size),
+        ("参考图预处理", test_prepare_references),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
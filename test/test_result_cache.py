@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""测试 NanoBanana 结果缓存（请求指纹与 LRU 淘汰）"""
+
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.result_cache import ResultCache, request_fingerprint
+
+
+def make_payload(ref_data="AAAA", seed=42, aspect_ratio="1:1"):
+    return {
+        "contents": [{"parts": [
+            {"inline_data": {"mime_type": "image/jpeg", "data": ref_data}},
+            {"text": "a banana"},
+        ]}],
+        "generationConfig": {"seed": seed, "imageConfig": {"aspectRatio": aspect_ratio}},
+    }
+
+
+def test_fingerprint():
+    """测试指纹只取决于请求内容和参考图像素摘要"""
+    print("=" * 60)
+    print("测试 1: 请求指纹")
+    print("=" * 60)
+
+    base = request_fingerprint("https://api.kuai.host/", "m", make_payload(), ["d1"])
+    # 参考图重新编码（base64 不同）但像素摘要相同 → 指纹相同
+    assert base == request_fingerprint("https://api.kuai.host", "m", make_payload(ref_data="BBBB"), ["d1"])
+    assert base != request_fingerprint("https://api.kuai.host", "m", make_payload(), ["d2"])
+    assert base != request_fingerprint("https://api.kuai.host", "m", make_payload(seed=43), ["d1"])
+    assert base != request_fingerprint("https://api.kuai.host", "m", make_payload(aspect_ratio="16:9"), ["d1"])
+    assert base != request_fingerprint("https://api.kuai.host", "m2", make_payload(), ["d1"])
+    print(f"✅ 指纹: {base[:16]}...")
+    return True
+
+
+def test_roundtrip_and_lru():
+    """测试读写与按最近使用淘汰"""
+    print("\n" + "=" * 60)
+    print("测试 2: 读写与 LRU 淘汰")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = ResultCache(root, max_bytes=250)
+        cache.put("a", b"x" * 100, {"thinking": "A"})
+        cache.put("b", b"y" * 100, {"thinking": "B"})
+        assert cache.get("a") == (b"x" * 100, {"thinking": "A"})
+
+        # 写入 c 超出上限：最久未使用的 b 被淘汰
+        cache.put("c", b"z" * 100, {"thinking": "C"})
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+        assert cache.size_bytes() <= 250
+
+        # 新实例从磁盘重建索引
+        reopened = ResultCache(root, max_bytes=250)
+        assert reopened.get("c")[1] == {"thinking": "C"}
+        assert sorted(p for p in os.listdir(root)) == ["a.img", "a.json", "c.img", "c.json"]
+    print("✅ LRU 淘汰与重启后读取正常")
+    return True
+
+
+def test_disabled():
+    """测试上限为 0 时不写入"""
+    print("\n" + "=" * 60)
+    print("测试 3: 关闭缓存")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = ResultCache(root, max_bytes=0)
+        cache.put("a", b"x", {})
+        assert cache.get("a") is None and os.listdir(root) == []
+    print("✅ 上限为 0 时不缓存")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 结果缓存测试套件\n")
+
+    tests = [
+        ("请求指纹", test_fingerprint),
+        ("读写与 LRU 淘汰", test_roundtrip_and_lru),
+        ("关闭缓存", test_disabled),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
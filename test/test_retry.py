@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""测试 HTTP 重试策略（退避、Retry-After、重试预算、幂等性）"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.retry import RetryBudget, RetryPolicy, call_with_retry
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def scripted(*outcomes):
+    """按顺序返回响应或抛出异常的 send()"""
+    calls = []
+
+    def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return send, calls
+
+
+def test_backoff_is_bounded():
+    """测试全抖动退避不超过上限"""
+    print("=" * 60)
+    print("测试 1: 指数退避 + 抖动")
+    print("=" * 60)
+
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+    for attempt in range(10):
+        cap = min(4.0, 0.5 * 2 ** attempt)
+        for _ in range(50):
+            assert 0 <= policy.backoff(attempt) <= cap
+    print("✅ 退避时间均在 [0, min(max_delay, base×2^n)] 内")
+    return True
+
+
+def test_retry_after_header():
+    """测试 429 遵循 Retry-After"""
+    print("\n" + "=" * 60)
+    print("测试 2: Retry-After")
+    print("=" * 60)
+
+    policy = RetryPolicy(max_retry_after=60)
+    assert policy.delay_for(0, 429, {"Retry-After": "7"}) == 7
+    assert policy.delay_for(0, 503, {"Retry-After": "999"}) == 60
+    assert policy.retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+
+    sleeps = []
+    first = FakeResponse(429, {"Retry-After": "2"})
+    send, calls = scripted(first, FakeResponse(200))
+    resp = call_with_retry(send, policy, idempotent=False, sleep=sleeps.append)
+    assert resp.status_code == 200 and sleeps == [2.0] and first.closed
+    print(f"✅ 非幂等 POST 遇到 429 按 Retry-After 等待: {sleeps}")
+    return True
+
+
+def test_idempotency_rules():
+    """测试非幂等请求不会在网络错误 / 500 后重放"""
+    print("\n" + "=" * 60)
+    print("测试 3: 幂等性")
+    print("=" * 60)
+
+    policy = RetryPolicy(max_retries=3)
+    send, calls = scripted(FakeResponse(500), FakeResponse(200))
+    assert call_with_retry(send, policy, idempotent=False, sleep=lambda s: None).status_code == 500
+    assert len(calls) == 1
+
+    send, calls = scripted(ConnectionError("reset"), FakeResponse(200))
+    try:
+        call_with_retry(send, policy, idempotent=False, sleep=lambda s: None)
+        raise AssertionError("非幂等请求不应重试网络错误")
+    except ConnectionError:
+        pass
+
+    send, calls = scripted(ConnectionError("reset"), FakeResponse(502), FakeResponse(200))
+    resp = call_with_retry(send, policy, idempotent=True, sleep=lambda s: None)
+    assert resp.status_code == 200 and len(calls) == 3
+    print("✅ 带幂等键的请求可重试，普通 POST 仅在 429/503 时重试")
+    return True
+
+
+def test_max_retries_and_budget():
+    """测试最大重试次数与重试预算"""
+    print("\n" + "=" * 60)
+    print("测试 4: 重试上限与预算")
+    print("=" * 60)
+
+    policy = RetryPolicy(max_retries=2)
+    send, calls = scripted(*[FakeResponse(503)] * 5)
+    assert call_with_retry(send, policy, sleep=lambda s: None).status_code == 503
+    assert len(calls) == 3
+
+    budget = RetryBudget(ratio=0.0, min_retries=1)
+    send, calls = scripted(*[FakeResponse(503)] * 5)
+    call_with_retry(send, RetryPolicy(max_retries=4), budget=budget, sleep=lambda s: None)
+    assert len(calls) == 2, calls
+    assert not budget.try_spend()
+    print("✅ 达到上限或预算耗尽后返回最后一次响应")
+    return True
+
+
+if __name__ == "__main__":
+    print("\n🧪 HTTP 重试策略测试套件\n")
+
+    tests = [
+        ("指数退避", test_backoff_is_bounded),
+        ("Retry-After", test_retry_after_header),
+        ("幂等性", test_idempotency_rules),
+        ("重试上限与预算", test_max_retries_and_budget),
+    ]
+    results = []
+    for name, fn in tests:
+        try:
+            results.append((name, fn()))
+        except Exception as e:
+            print(f"❌ 测试失败: {e}")
+            results.append((name, False))
+
+    print("\n" + "=" * 60)
+    print("测试总结")
+    print("=" * 60)
+    for name, passed in results:
+        print(f"{name}: {'✅ 通过' if passed else '❌ 失败'}")
+
+    sys.exit(0 if all(r[1] for r in results) else 1)
@@ -1,22 +1,100 @@
-"""comflow/utils/async_runner.py - 异步任务运行器"""
+"""comflow/utils/async_runner.py - 异步任务运行器
+
+进程内只有一个常驻事件循环线程（首次使用时启动）。同步的 ComfyUI 节点通过
+submit() 提交协程并拿到 concurrent.futures.Future，或用 run_sync() 直接等待结果；
+所有协程共享同一个循环，因此 aiohttp 会话等循环绑定的资源可以跨调用复用。
+
+循环不在插件加载时启动：目前只有 http_client 的异步请求（fetch / fetch_sync / run_async）用到它，
+大多数工作流不会调用；首次启动约 1ms，相对一次网络请求可以忽略。get_loop() 在锁内检查并启动，
+并发的首次调用只会启动一个线程；循环线程意外退出后下次调用会重新启动。
+"""
 
-import threading
 import asyncio
-from typing import Any, Coroutine
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_shutdown_hooks: List[Callable[[], Awaitable[Any]]] = []
+
 
-def _runner(loop: asyncio.AbstractEventLoop, coro: Coroutine[Any, Any, Any]):
+def _run_loop(loop: asyncio.AbstractEventLoop, started: threading.Event):
     asyncio.set_event_loop(loop)
+    loop.call_soon(started.set)
     try:
-        loop.run_until_complete(coro)
+        loop.run_forever()
     finally:
-        loop.stop()
         loop.close()
 
-def run_async(coro) -> threading.Thread:
-    """在后台线程运行协程，避免阻塞主进程。
-    返回 Thread，以便调用方管理生命周期（开发占位）。
-    """
-    loop = asyncio.new_event_loop()
-    t = threading.Thread(target=_runner, args=(loop, coro), daemon=True)
-    t.start()
-    return t
\ No newline at end of file
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """获取常驻事件循环（首次调用时启动后台线程）"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed() or _thread is None or not _thread.is_alive():
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            _thread = threading.Thread(target=_run_loop, args=(loop, started),
+                                       name="kuai-async-loop", daemon=True)
+            _thread.start()
+            started.wait()
+            _loop = loop
+        return _loop
+
+
+def in_loop_thread() -> bool:
+    """当前是否运行在常驻循环线程中"""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro: Coroutine[Any, Any, Any]) -> Future:
+    """把协程提交到常驻循环，返回 concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+    """在常驻循环中执行协程并阻塞等待结果（不能在循环线程内调用）"""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync 不能在事件循环线程内调用，请直接 await")
+    return submit(coro).result(timeout)
+
+
+def run_async(coro: Coroutine[Any, Any, Any]) -> Future:
+    """在后台常驻循环运行协程，避免阻塞主进程（兼容旧接口，返回 Future）"""
+    return submit(coro)
+
+
+def on_shutdown(hook: Callable[[], Awaitable[Any]]):
+    """注册退出时在循环内执行的清理协程（例如关闭 aiohttp 会话）"""
+    _shutdown_hooks.append(hook)
+
+
+def shutdown(timeout: float = 5.0):
+    """执行清理钩子并停止常驻循环"""
+    global _loop
+    with _lock:
+        loop, _loop = _loop, None
+    if loop is None or loop.is_closed():
+        return
+
+    async def _cleanup():
+        for hook in _shutdown_hooks:
+            try:
+                await hook()
+            except Exception:
+                pass
+
+    try:
+        asyncio.run_coroutine_threadsafe(_cleanup(), loop).result(timeout)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+atexit.register(shutdown)
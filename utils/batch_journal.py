@@ -0,0 +1,120 @@
+"""utils/batch_journal.py - 批量任务断点续跑日志
+
+每个批量处理器在 output_dir 下维护一个只追加的 JSONL 日志（batch_journal.jsonl），
+每一行的状态变化（submitted / polling / completed / failed）立即写入并刷盘。
+ComfyUI 重启后重新运行同一个 CSV：
+- completed 的行直接跳过，复用上次的结果
+- submitted / polling 且已有远端 task_id 的行重新挂接该任务，不会重复付费
+- 新行和 failed 的行正常提交
+
+行以 CSV 内容的哈希标识（忽略 _row_number 等以下划线开头的内部字段），
+因此调整行顺序或在末尾追加新行不会影响已完成的行。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+JOURNAL_FILENAME = "batch_journal.jsonl"
+
+SUBMITTED = "submitted"
+POLLING = "polling"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class RemoteTaskFailed(RuntimeError):
+    """远端任务返回 failed；该行已连同任务信息记为 FAILED，批量处理器计为失败、不再重复记录"""
+
+
+def row_key(task: Dict[str, Any]) -> str:
+    """根据 CSV 行内容计算稳定的行标识"""
+    content = {k: v for k, v in task.items() if not str(k).startswith("_")}
+    raw = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class RowKeys:
+    """逐行计算行标识（按 CSV 顺序调用）；内容完全相同的行按出现次序追加 #n 区分
+
+    只记录已出现的行摘要，流式处理大批量任务时不需要先算出全部行的标识
+    """
+
+    def __init__(self):
+        self._seen = Counter()
+
+    def __call__(self, task: Dict[str, Any]) -> str:
+        key = row_key(task)
+        self._seen[key] += 1
+        count = self._seen[key]
+        return key if count == 1 else f"{key}#{count}"
+
+
+def row_keys(tasks: Iterable[Dict[str, Any]]) -> List[str]:
+    """计算所有行的标识（见 RowKeys）"""
+    keys = RowKeys()
+    return [keys(task) for task in tasks]
+
+
+class BatchJournal:
+    """只追加的批量任务日志，读取时按行合并出每个行标识的最新状态"""
+
+    def __init__(self, output_dir: str, reset: bool = False, filename: str = JOURNAL_FILENAME):
+        self.path = os.path.join(output_dir, filename)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(output_dir, exist_ok=True)
+        if reset and os.path.exists(self.path):
+            os.replace(self.path, self.path + ".bak")
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程被杀时最后一行可能不完整，忽略即可
+                    continue
+                key = record.get("key")
+                if key:
+                    self._entries.setdefault(key, {}).update(record)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回行的最新状态（合并后的记录），未记录过时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def entries(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """所有行的最新状态（传入 state 时只返回该状态的行）"""
+        with self._lock:
+            return [dict(e) for e in self._entries.values() if state is None or e.get("state") == state]
+
+    def state(self, key: str) -> str:
+        entry = self.get(key)
+        return entry.get("state", "") if entry else ""
+
+    def record(self, key: str, state: str, **fields):
+        """追加一条状态记录并立即刷盘"""
+        record = {"key": key, "state": state, "ts": time.strftime("%Y-%m-%d %H:%M:%S")}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries.setdefault(key, {}).update(record)
+
+    def summary(self) -> Dict[str, int]:
+        """各状态的行数"""
+        with self._lock:
+            return dict(Counter(e.get("state", "") for e in self._entries.values()))
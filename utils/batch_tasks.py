@@ -0,0 +1,174 @@
+"""utils/batch_tasks.py - 批量任务的流式读取
+
+CSVBatchReader 原来把所有行读进列表，再 json.dumps(indent=2) 成一个大字符串在节点之间传递，
+批量处理器再 json.loads 一遍；几万行的 CSV 会在内存中同时存在好几份。
+
+现在 CSVBatchReader 默认只输出一个很小的任务句柄（JSON 字符串，包含 CSV 路径、文件大小、
+修改时间和有效行数），批量处理器通过 open_tasks() 得到 TaskSource，每次迭代都从文件逐行读取、
+清洗，内存占用与 CSV 大小无关。旧工作流传入的 JSON 任务列表仍然可以直接使用。
+
+批量处理器只读取一遍 CSV：iter_rows() 在读取时逐行算出行标识和输出文件名前缀，
+TaskListWriter 把成功的行逐行写入 tasks.json，报告中只列出前 MAX_REPORTED 个失败 / 任务。
+"""
+
+import csv
+import json
+import os
+import textwrap
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .batch_journal import RowKeys
+from .log import get_logger
+
+# 任务句柄的标识字段
+HANDLE_KEY = "kuai_csv_tasks"
+# 批量报告中最多列出的失败 / 任务条数（其余见日志、batch_journal.jsonl 和 tasks.json）
+MAX_REPORTED = 50
+
+
+def iter_csv_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取 CSV：跳过空行，去除首尾空白，附加 _row_number（从 2 开始，第 1 行是标题）"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames:
+            raise ValueError("CSV 文件为空或格式不正确")
+
+        for row_num, row in enumerate(reader, start=2):
+            # 跳过空行
+            if not any(row.values()):
+                continue
+            cleaned_row = {k: v.strip() if isinstance(v, str) else v for k, v in row.items()}
+            cleaned_row["_row_number"] = row_num
+            yield cleaned_row
+
+
+def make_handle(path: str) -> str:
+    """流式统计 CSV 的有效行数，返回任务句柄字符串"""
+    count = sum(1 for _ in iter_csv_rows(path))
+    if not count:
+        raise ValueError("CSV 文件中没有有效的任务数据")
+    stat = os.stat(path)
+    return json.dumps({
+        HANDLE_KEY: 1,
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "count": count,
+    }, ensure_ascii=False)
+
+
+class TaskSource:
+    """批量任务来源：可多次迭代，CSV 句柄每次从文件头逐行读取
+
+    - len() 为任务数（句柄中记录的有效行数）
+    - 迭代时 CSV 若已被修改会打印警告，按当前内容读取
+    """
+
+    def __init__(self, path: Optional[str] = None, count: int = 0, size: Optional[int] = None,
+                 mtime: Optional[float] = None, rows: Optional[List[Dict[str, Any]]] = None):
+        self.path = path
+        self.count = len(rows) if rows is not None else int(count)
+        self.size = size
+        self.mtime = mtime
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._rows is not None:
+            return iter(self._rows)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"CSV 文件不存在: {self.path}")
+        stat = os.stat(self.path)
+        if (self.size, self.mtime) != (stat.st_size, stat.st_mtime):
+            get_logger("BatchTasks").warning(f"CSV 文件在读取后被修改，按当前内容处理: {self.path}")
+        return iter_csv_rows(self.path)
+
+
+class OutputPrefixes:
+    """逐行确定输出文件名前缀（按 CSV 顺序调用），保证各行互不相同
+
+    - output_prefix 缺失或为空时使用 <default>_<序号>
+    - 前缀已被前面的行占用时追加行序号（<前缀>_<序号>），仍冲突时继续追加 _2、_3 …
+    - 传入 exists 时，exists(前缀) 为真的前缀（如输出目录中已有上次运行的文件）也视为占用
+    - 只记录已分配的前缀；同一 CSV 每次运行得到相同的结果（断点续跑依赖这一点）
+    """
+
+    def __init__(self, default: str = "task", exists: Optional[Callable[[str], bool]] = None):
+        self.default = default
+        self.exists = exists
+        self._taken = set()
+
+    def _free(self, name: str) -> bool:
+        return name not in self._taken and not (self.exists and self.exists(name))
+
+    def __call__(self, idx: int, task: Dict[str, Any]) -> str:
+        name = (task.get("output_prefix") or "").strip() or f"{self.default}_{idx}"
+        candidate, n = name, 1
+        if not self._free(candidate):
+            candidate = f"{name}_{idx}"
+            while not self._free(candidate):
+                n += 1
+                candidate = f"{name}_{idx}_{n}"
+        self._taken.add(candidate)
+        return candidate
+
+
+def output_prefixes(tasks: Iterable[Dict[str, Any]], default: str = "task",
+                    exists: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """确定所有行的输出文件名前缀（见 OutputPrefixes）"""
+    prefixes = OutputPrefixes(default, exists)
+    return [prefixes(idx, task) for idx, task in enumerate(tasks, start=1)]
+
+
+def iter_rows(tasks: Iterable[Dict[str, Any]], default: str = "task",
+              exists: Optional[Callable[[str], bool]] = None) -> Iterator[Tuple[Dict[str, Any], str, str]]:
+    """逐行产出 (任务, 行标识, 输出文件名前缀)，只读取一遍任务来源"""
+    keys = RowKeys()
+    prefixes = OutputPrefixes(default, exists)
+    for idx, task in enumerate(tasks, start=1):
+        yield task, keys(task), prefixes(idx, task)
+
+
+class TaskListWriter:
+    """按调用顺序把任务信息写入 tasks.json（JSON 数组，格式同 json.dump(..., indent=2)）
+
+    每条先追加到 <path>.part，close() 时转换为 JSON 数组并替换 path，内存中不保留任务列表；
+    close(updated=...) 按 task_id 用更新后的任务信息替换（如下载完成后补充了 local_files）
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._part = path + ".part"
+        self._file = open(self._part, "w", encoding="utf-8")
+
+    def add(self, task_info: Dict[str, Any]):
+        self._file.write(json.dumps(task_info, ensure_ascii=False) + "\n")
+
+    def close(self, updated: Iterable[Dict[str, Any]] = ()):
+        self._file.close()
+        latest = {info.get("task_id"): info for info in updated}
+        tmp = self.path + ".tmp"
+        count = 0
+        with open(self._part, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+            dst.write("[")
+            for line in src:
+                info = json.loads(line)
+                info = latest.get(info.get("task_id"), info)
+                item = textwrap.indent(json.dumps(info, ensure_ascii=False, indent=2), "  ")
+                dst.write(("," if count else "") + "\n" + item)
+                count += 1
+            dst.write("\n]" if count else "]")
+        os.replace(tmp, self.path)
+        os.remove(self._part)
+
+
+def open_tasks(batch_tasks: str) -> TaskSource:
+    """解析批量处理器的 batch_tasks 输入（任务句柄或 JSON 任务列表）"""
+    data = json.loads(batch_tasks)
+    if isinstance(data, dict) and data.get(HANDLE_KEY):
+        return TaskSource(data["path"], data.get("count", 0), data.get("size"), data.get("mtime"))
+    if isinstance(data, list):
+        return TaskSource(rows=data)
+    raise ValueError("批量任务数据格式不正确，请连接 CSV 批量读取器的输出")
@@ -0,0 +1,221 @@
+"""utils/chat_history.py - 多轮对话历史存储
+
+NanoBananaMultiTurnChat 原来把每一轮图像的 base64 字符串都留在内存里，并在每次请求中全部重新发送，
+请求体和延迟随轮数线性增长，长时间编辑会话的内存也没有上限。
+
+- 文本历史完整保留；发送给模型时只附带最近 K 张历史图像（上下文窗口），更早的图像只保留文字
+- 图像按内容哈希（sha256）以原始字节存放在磁盘上，内存中只保留哈希
+- 每个会话（session_id）的历史写入 sessions/<session_id>.json，ComfyUI 重启后可以继续对话；
+  未指定 session_id 时使用随机的临时会话（tmp-*），只保存在内存中，图像只保留最近 TEMP_MAX_IMAGES 张
+- 重置对话时，以及每个进程创建会话时（至多每 PRUNE_INTERVAL 秒一次）删除过期的临时会话文件
+  和不再被任何会话引用的图像
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .log import get_logger
+from .paths import cache_dir
+
+log = get_logger("NanoBanana")
+
+_SESSION_NAME = re.compile(r"[^0-9A-Za-z_.\-一-鿿]+")
+_lock = threading.Lock()
+# 临时会话文件的保留时间（秒；旧版本会把临时会话写入磁盘）
+TEMP_SESSION_TTL = 7 * 24 * 3600
+# 清理时跳过最近写入的图像（可能属于尚未保存的当前轮次）
+PRUNE_MIN_AGE = 3600
+# 创建会话时自动清理的最小间隔（秒）
+PRUNE_INTERVAL = 3600
+# 临时会话在内存中保留的最近图像数（不少于节点的历史图像数上限 + 本轮输入图像）
+TEMP_MAX_IMAGES = 16
+_last_prune: Dict[str, float] = {}
+
+
+def _atomic_write(path: Path, data: bytes):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class ChatHistory:
+    """单个对话会话的历史：消息列表 + 按内容哈希存放的图像（临时会话的图像在内存中）"""
+
+    def __init__(self, session_id: str = "", root: Optional[Path] = None):
+        # 未指定会话 ID 时使用临时会话（只在本节点实例中有效，不写磁盘）
+        self.persistent = bool(session_id and session_id.strip())
+        self.session_id = session_id.strip() if self.persistent else f"tmp-{uuid.uuid4().hex[:12]}"
+        self.root = Path(root) if root is not None else cache_dir("chat_history")
+        self.image_dir = self.root / "images"
+        self.session_dir = self.root / "sessions"
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self.messages: List[Dict[str, Any]] = []
+        self.last_image: Optional[Dict[str, str]] = None
+        # 临时会话的图像：sha256 -> 字节（插入顺序即新旧顺序）
+        self._images: Dict[str, bytes] = {}
+        maybe_prune(self.root)
+        if self.persistent:
+            self._load()
+
+    @property
+    def session_path(self) -> Path:
+        name = _SESSION_NAME.sub("_", self.session_id)[:100] or "default"
+        return self.session_dir / f"{name}.json"
+
+    def _load(self):
+        try:
+            with open(self.session_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.messages = list(state.get("messages") or [])
+        self.last_image = state.get("last_image")
+        log.info(f"已恢复对话会话 '{self.session_id}'（{len(self.messages)} 条消息）")
+
+    def save(self):
+        """写入会话文件（临时会话只在内存中，不写入）"""
+        if not self.persistent:
+            return
+        state = {"session_id": self.session_id, "messages": self.messages, "last_image": self.last_image}
+        with _lock:
+            _atomic_write(self.session_path, json.dumps(state, ensure_ascii=False).encode("utf-8"))
+
+    def __len__(self):
+        return len(self.messages)
+
+    # ---- 图像存储 ----
+
+    def put_image(self, data: bytes, mime_type: str = "image/jpeg") -> Dict[str, str]:
+        """保存图像字节（相同内容只存一份），返回图像引用"""
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.persistent:
+            self._images.pop(digest, None)
+            self._images[digest] = data
+            while len(self._images) > TEMP_MAX_IMAGES:
+                del self._images[next(iter(self._images))]
+            return {"sha256": digest, "mime_type": mime_type}
+        path = self.image_dir / digest
+        if not path.exists():
+            with _lock:
+                _atomic_write(path, data)
+        return {"sha256": digest, "mime_type": mime_type}
+
+    def read_image(self, ref: Dict[str, str]) -> bytes:
+        if not self.persistent:
+            try:
+                return self._images[ref["sha256"]]
+            except KeyError:
+                raise FileNotFoundError(f"临时会话图像已释放: {ref['sha256'][:12]}") from None
+        return (self.image_dir / ref["sha256"]).read_bytes()
+
+    def inline_part(self, ref: Dict[str, str]) -> Dict[str, Any]:
+        """图像引用 → Gemini inline_data part"""
+        return {"inline_data": {
+            "mime_type": ref.get("mime_type", "image/jpeg"),
+            "data": base64.b64encode(self.read_image(ref)).decode("utf-8"),
+        }}
+
+    # ---- 消息 ----
+
+    def append(self, role: str, content: str, image: Optional[Dict[str, str]] = None):
+        msg = {"role": role, "content": content}
+        if image is not None:
+            msg["image"] = image
+            if role == "model":
+                self.last_image = image
+        self.messages.append(msg)
+
+    def reset(self):
+        self.messages = []
+        self.last_image = None
+        self._images.clear()
+        if not self.persistent:
+            return
+        try:
+            self.session_path.unlink()
+        except OSError:
+            pass
+        prune_images(self.root)
+
+    def contents(self, max_images: int) -> List[Dict[str, Any]]:
+        """构建 Gemini contents：文本全部保留，只附带最近 max_images 张图像"""
+        with_image = [i for i, msg in enumerate(self.messages) if msg.get("image")]
+        keep = set(with_image[len(with_image) - max_images:]) if max_images > 0 else set()
+        contents = []
+        for i, msg in enumerate(self.messages):
+            parts = []
+            if i in keep:
+                try:
+                    parts.append(self.inline_part(msg["image"]))
+                except OSError:
+                    # 临时会话只在内存中保留最近的图像，更早的图像缺失是预期的
+                    (log.warning if self.persistent else log.debug)(
+                        f"历史图像缺失，仅发送文本: {msg['image'].get('sha256', '')[:12]}")
+            parts.append({"text": msg["content"]})
+            contents.append({"role": msg["role"], "parts": parts})
+        return contents
+
+    def display(self) -> List[Dict[str, Any]]:
+        """对话历史的展示形式（不含图像数据）"""
+        out = []
+        for msg in self.messages:
+            item = {"role": msg["role"], "content": msg["content"]}
+            if msg.get("image"):
+                item["has_image"] = True
+            out.append(item)
+        return out
+
+
+def maybe_prune(root: Path) -> int:
+    """每个存储目录每 PRUNE_INTERVAL 秒至多执行一次 prune_images"""
+    key = str(Path(root).resolve())
+    now = time.time()
+    with _lock:
+        if now - _last_prune.get(key, 0) < PRUNE_INTERVAL:
+            return 0
+        _last_prune[key] = now
+    return prune_images(root)
+
+
+def prune_images(root: Path) -> int:
+    """删除所有已保存会话都不再引用的图像，返回删除数量"""
+    root = Path(root)
+    referenced = set()
+    now = time.time()
+    for session_path in (root / "sessions").glob("*.json"):
+        try:
+            if session_path.name.startswith("tmp-") and now - session_path.stat().st_mtime > TEMP_SESSION_TTL:
+                session_path.unlink()
+                continue
+            with open(session_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            # 无法读取的会话：保守起见不做清理
+            return 0
+        for msg in state.get("messages") or []:
+            if msg.get("image"):
+                referenced.add(msg["image"].get("sha256"))
+        if state.get("last_image"):
+            referenced.add(state["last_image"].get("sha256"))
+    removed = 0
+    with _lock:
+        for path in (root / "images").glob("*"):
+            if path.suffix == "" and path.name not in referenced:
+                try:
+                    if now - path.stat().st_mtime < PRUNE_MIN_AGE:
+                        continue
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
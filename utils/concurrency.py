@@ -0,0 +1,84 @@
+"""utils/concurrency.py - 有界并发执行工具"""
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def run_ordered(
+    items: Iterable[Any],
+    worker: Callable[[int, Any], Any],
+    max_in_flight: int = 1,
+    submit_delay: float = 0.0,
+    on_result: Optional[Callable[[int, Any, Any, Optional[BaseException]], None]] = None,
+    thread_name_prefix: str = "kuai-worker",
+    keep_items: bool = True,
+) -> List[Tuple[int, Any, Any, Optional[BaseException]]]:
+    """以有界并发执行 worker(idx, item)，结果按输入顺序返回。
+
+    - items: 任意可迭代对象，按需惰性消费（不会一次性提交全部任务）
+    - worker: 处理函数，idx 从 1 开始
+    - max_in_flight: 同时进行中的任务上限；为 1 时退化为顺序执行
+    - submit_delay: 两次提交之间的间隔（秒）
+    - on_result: 任务完成时回调 (idx, item, result, error)，按完成顺序调用
+    - keep_items: 为 False 时返回结果中的 item 为 None，已完成的输入不再保留在内存中（流式读取的大批量任务）
+    - worker 在调用方上下文（contextvars，如指标标签）的副本中执行
+    - 返回: [(idx, item, result, error)]，按 idx 排序；单个任务异常不会中断整体
+    """
+    return list(iter_ordered(items, worker, max_in_flight=max_in_flight, submit_delay=submit_delay,
+                             on_result=on_result, thread_name_prefix=thread_name_prefix, keep_items=keep_items))
+
+
+def iter_ordered(
+    items: Iterable[Any],
+    worker: Callable[[int, Any], Any],
+    max_in_flight: int = 1,
+    submit_delay: float = 0.0,
+    on_result: Optional[Callable[[int, Any, Any, Optional[BaseException]], None]] = None,
+    thread_name_prefix: str = "kuai-worker",
+    keep_items: bool = True,
+) -> Iterator[Tuple[int, Any, Any, Optional[BaseException]]]:
+    """与 run_ordered 相同，但按输入顺序逐个产出 (idx, item, result, error)
+
+    前面的任务都已完成时立即产出，不等待全部结束；只暂存提前完成、尚未轮到产出的结果，
+    大批量任务汇总时内存不随行数增长。调用方处理产出的结果期间，已提交的任务继续执行。
+    """
+    max_in_flight = max(1, int(max_in_flight or 1))
+    outcomes = {}
+    pending = {}
+    next_idx = 1
+
+    def _collect(done):
+        for fut in done:
+            idx, item = pending.pop(fut)
+            error = fut.exception()
+            result = None if error is not None else fut.result()
+            if on_result is not None:
+                on_result(idx, item, result, error)
+            outcomes[idx] = (idx, item if keep_items else None, result, error)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=thread_name_prefix) as pool:
+        submitted = 0
+        for idx, item in enumerate(items, start=1):
+            # 达到上限时等待任意一个任务完成
+            while len(pending) >= max_in_flight:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                _collect(done)
+                while next_idx in outcomes:
+                    yield outcomes.pop(next_idx)
+                    next_idx += 1
+
+            if submitted > 0 and submit_delay > 0:
+                time.sleep(submit_delay)
+
+            pending[pool.submit(contextvars.copy_context().run, worker, idx, item)] = (idx, item)
+            submitted += 1
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            _collect(done)
+            while next_idx in outcomes:
+                yield outcomes.pop(next_idx)
+                next_idx += 1
+
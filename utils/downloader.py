@@ -0,0 +1,415 @@
+"""utils/downloader.py - 文件下载引擎
+
+DownloadVideo 原来每次调用只下载一个 URL，用 8KB 的块直接写入目标文件：不支持断点续传，
+中途失败会留下不完整的文件，重复运行同一个 URL 还会重新下载。
+
+- 先 HEAD 获取大小 / ETag / 是否支持 Range；目标文件已存在且大小或 ETag 一致时直接跳过
+- 写入 <目标>.part，完成并校验大小后再改名为目标文件；进度保存在 <目标>.part.json，中断后从断点继续
+- 支持 Range 的大文件分段并行下载（每段独立的连接），小文件单连接流式下载
+- 1MB 读写缓冲
+- download_many 并发下载一批 URL，结果按输入顺序返回；相同的 (URL, 目标) 只下载一次
+- BatchDownloader 供批量处理器使用：任务一完成就提交下载，与其余任务的生成同时进行
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from . import metrics
+from .concurrency import run_ordered
+from .log import get_logger
+from .paths import cache_dir
+
+log = get_logger("Download")
+
+# 每次读写的块大小
+CHUNK_BYTES = 1024 * 1024
+# 单个分段的最小大小；文件小于 2 段时不分段
+SEGMENT_MIN_BYTES = 8 * 1024 * 1024
+# 单个文件的最大分段数
+MAX_SEGMENTS = 4
+# 分段下载时每写入多少字节保存一次进度
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+# status: downloaded / resumed / skipped / failed
+DownloadResult = namedtuple("DownloadResult", "url path status size error")
+RemoteInfo = namedtuple("RemoteInfo", "length etag ranges")
+
+_index_lock = threading.Lock()
+# 内存中的下载索引：{"path": 索引文件, "entries": {目标路径: {url, etag, size}}}
+_index: Dict[str, Any] = {}
+
+
+def _http():
+    """HTTP 传输层（延迟导入，依赖插件配置）"""
+    from . import http_client
+    return http_client
+
+
+# ---- 已完成下载的索引（用于 ETag 比对） ----
+#
+# index.jsonl 每完成一个下载追加一行（同一目标以最后一行为准）；进程内首次使用时读入内存，
+# 同时剔除文件已不存在或大小已变化的条目，重复 / 过期的行较多时压缩重写
+
+def _index_path() -> Path:
+    return cache_dir("downloads") / "index.jsonl"
+
+
+def _read_index(path: Path) -> Tuple[Dict[str, Dict], int]:
+    """读取索引文件，返回 ({目标路径: 条目}, 行数)"""
+    entries, lines = {}, 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries[entry.pop("path")] = entry
+                    lines += 1
+                except (ValueError, KeyError, AttributeError):
+                    continue
+    except OSError:
+        pass
+    return entries, lines
+
+
+def _entries() -> Dict[str, Dict]:
+    """内存中的索引（调用方持有 _index_lock）"""
+    path = _index_path()
+    if _index.get("path") != path:
+        entries, lines = _read_index(path)
+        live = {dest: entry for dest, entry in entries.items()
+                if os.path.isfile(dest) and os.path.getsize(dest) == entry.get("size")}
+        if lines > len(live):
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text("".join(json.dumps(dict(entry, path=dest), ensure_ascii=False) + "\n"
+                                   for dest, entry in live.items()), encoding="utf-8")
+            os.replace(tmp, path)
+        _index.update(path=path, entries=live)
+    return _index["entries"]
+
+
+def _index_entry(dest: Path) -> Dict:
+    with _index_lock:
+        return _entries().get(str(dest.resolve()), {})
+
+
+def _record_download(dest: Path, url: str, info: RemoteInfo, size: int):
+    entry = {"url": url, "etag": info.etag, "size": size}
+    with _index_lock:
+        entries = _entries()
+        entries[str(dest.resolve())] = entry
+        with open(_index_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(entry, path=str(dest.resolve())), ensure_ascii=False) + "\n")
+
+
+# ---- 远程信息 ----
+
+def probe(url: str, timeout: float = 30) -> Optional[RemoteInfo]:
+    """HEAD 获取 (大小, ETag, 是否支持 Range)；服务器不支持 HEAD 时返回 None"""
+    try:
+        resp = _http().request("HEAD", url, timeout=timeout)
+        if resp.status_code != 200:
+            return None
+        length = resp.headers.get("Content-Length")
+        return RemoteInfo(
+            int(length) if length and length.isdigit() else None,
+            resp.headers.get("ETag", ""),
+            resp.headers.get("Accept-Ranges", "").lower() == "bytes",
+        )
+    except Exception:
+        return None
+
+
+def _already_done(dest: Path, url: str, info: Optional[RemoteInfo]) -> bool:
+    """目标文件已存在且大小或 ETag 与远程一致"""
+    if not dest.exists():
+        return False
+    size = dest.stat().st_size
+    entry = _index_entry(dest)
+    if info is None:
+        # 无法获取远程信息：只有本模块完整下载过的同一 URL 才跳过
+        return entry.get("url") == url and entry.get("size") == size
+    if info.length is not None and size == info.length:
+        return True
+    return bool(info.etag) and entry.get("etag") == info.etag and entry.get("size") == size
+
+
+# ---- 断点状态 ----
+
+class _PartState:
+    """<目标>.part.json：URL、ETag、总大小和各分段已写入的位置"""
+
+    def __init__(self, path: Path, url: str, info: RemoteInfo, segments: List[List[int]]):
+        self.path = path
+        self.url = url
+        self.info = info
+        self.segments = segments  # [[start, end(含), next]]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path, url: str, info: RemoteInfo) -> Optional["_PartState"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("url") != url or data.get("length") != info.length or data.get("etag", "") != info.etag:
+            return None
+        return cls(path, url, info, data.get("segments") or [])
+
+    def save(self):
+        with self._lock:
+            data = {"url": self.url, "etag": self.info.etag, "length": self.info.length, "segments": self.segments}
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def remaining(self) -> int:
+        return sum(end + 1 - pos for _, end, pos in self.segments)
+
+
+def _plan_segments(length: int, max_segments: int) -> List[List[int]]:
+    count = max(1, min(max_segments, length // SEGMENT_MIN_BYTES))
+    size = math.ceil(length / count)
+    return [[start, min(start + size, length) - 1, start] for start in range(0, length, size)]
+
+
+# ---- 下载 ----
+
+def _fetch_segment(url: str, part: Path, state: _PartState, seg: List[int], timeout: float):
+    start, end, pos = seg
+    if pos > end:
+        return
+    resp = _http().get(url, timeout=timeout, stream=True, headers={"Range": f"bytes={pos}-{end}"})
+    try:
+        if resp.status_code != 206:
+            raise RuntimeError(f"服务器未按 Range 返回分段（HTTP {resp.status_code}）")
+        written = 0
+        with open(part, "r+b", buffering=CHUNK_BYTES) as f:
+            f.seek(pos)
+            for chunk in resp.iter_content(chunk_size=CHUNK_BYTES):
+                if not chunk:
+                    continue
+                chunk = chunk[:end + 1 - pos]
+                f.write(chunk)
+                pos += len(chunk)
+                written += len(chunk)
+                if written >= CHECKPOINT_BYTES:
+                    f.flush()
+                    seg[2] = pos
+                    state.save()
+                    written = 0
+                if pos > end:
+                    break
+            f.flush()
+        seg[2] = pos
+        if pos <= end:
+            raise RuntimeError(f"分段 {start}-{end} 下载不完整")
+    finally:
+        seg[2] = max(seg[2], min(pos, end + 1))
+        resp.close()
+
+
+def _download_segmented(url: str, part: Path, state_path: Path, info: RemoteInfo,
+                        timeout: float, max_segments: int) -> bool:
+    """分段并行下载，返回是否为续传"""
+    state = _PartState.load(state_path, url, info) if part.exists() else None
+    resumed = state is not None and state.remaining() < info.length
+    if state is None:
+        state = _PartState(state_path, url, info, _plan_segments(info.length, max_segments))
+        with open(part, "wb") as f:
+            f.truncate(info.length)
+        state.save()
+    try:
+        with ThreadPoolExecutor(max_workers=len(state.segments), thread_name_prefix="kuai-dl-seg") as pool:
+            futures = [pool.submit(_fetch_segment, url, part, state, seg, timeout) for seg in state.segments]
+            for fut in futures:
+                fut.result()
+    finally:
+        state.save()
+    return resumed
+
+
+def _download_stream(url: str, part: Path, info: Optional[RemoteInfo], timeout: float) -> bool:
+    """单连接流式下载；支持 Range 时从 .part 末尾续传，返回是否为续传"""
+    offset = part.stat().st_size if part.exists() and info is not None and info.ranges else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    resp = _http().get(url, timeout=timeout, stream=True, headers=headers)
+    try:
+        if resp.status_code == 416 and info is not None and offset == info.length:
+            return True
+        resp.raise_for_status()
+        resumed = offset > 0 and resp.status_code == 206
+        with open(part, "ab" if resumed else "wb", buffering=CHUNK_BYTES) as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_BYTES):
+                if chunk:
+                    f.write(chunk)
+        return resumed
+    finally:
+        resp.close()
+
+
+def download_file(url: str, dest, timeout: float = 180, max_segments: int = MAX_SEGMENTS) -> DownloadResult:
+    """下载单个 URL 到 dest（先写 .part，完成后改名）"""
+    started = time.perf_counter()
+    result = _download_file(url, dest, timeout, max_segments)
+    provider = metrics.provider_of(url)
+    metrics.observe("kuai_download_seconds", time.perf_counter() - started, provider=provider, status=result.status)
+    if result.status in ("downloaded", "resumed"):
+        metrics.inc("kuai_download_bytes_total", result.size, provider=provider)
+    return result
+
+
+def _download_file(url: str, dest, timeout: float, max_segments: int) -> DownloadResult:
+    dest = Path(dest)
+    try:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        info = probe(url, timeout=min(timeout, 30))
+        if _already_done(dest, url, info):
+            log.debug(f"已存在，跳过: {dest.name}")
+            return DownloadResult(url, str(dest), "skipped", dest.stat().st_size, None)
+
+        part = dest.with_name(dest.name + ".part")
+        state_path = dest.with_name(dest.name + ".part.json")
+        segmented = (info is not None and info.ranges and info.length is not None
+                     and max_segments > 1 and info.length >= 2 * SEGMENT_MIN_BYTES)
+        if segmented:
+            resumed = _download_segmented(url, part, state_path, info, timeout, max_segments)
+        else:
+            if state_path.exists():
+                # 分段下载留下的 .part 是预分配的完整大小，不能按末尾续传
+                part.unlink(missing_ok=True)
+                state_path.unlink()
+            resumed = _download_stream(url, part, info, timeout)
+
+        size = part.stat().st_size
+        if info is not None and info.length is not None and size != info.length:
+            raise RuntimeError(f"文件大小不一致: {size} != {info.length}")
+        os.replace(part, dest)
+        try:
+            state_path.unlink()
+        except OSError:
+            pass
+        _record_download(dest, url, info or RemoteInfo(size, "", False), size)
+        status = "resumed" if resumed else "downloaded"
+        log.debug(f"{'续传完成' if resumed else '下载完成'}: {dest.name}（{size / 1024 / 1024:.1f}MB）")
+        return DownloadResult(url, str(dest), status, size, None)
+    except Exception as e:
+        log.warning(f"下载失败: {url}: {e}")
+        return DownloadResult(url, str(dest), "failed", 0, e)
+
+
+def download_many(items: Sequence[Tuple[str, str]], max_workers: int = 4, timeout: float = 180,
+                  max_segments: int = MAX_SEGMENTS) -> List[DownloadResult]:
+    """并发下载 [(url, dest)]，结果按输入顺序返回
+
+    相同的 (url, dest) 只下载一次，结果复制给重复项（否则会同时写入同一个 .part 文件）
+    """
+    keys = [(url, str(Path(dest).resolve())) for url, dest in items]
+    unique: Dict[Tuple[str, str], int] = {}
+    pairs = []
+    for key, item in zip(keys, items):
+        if key not in unique:
+            unique[key] = len(pairs)
+            pairs.append(item)
+    outcomes = run_ordered(
+        pairs,
+        lambda _idx, item: download_file(item[0], item[1], timeout=timeout, max_segments=max_segments),
+        max_in_flight=max(1, min(int(max_workers), len(pairs) or 1)),
+        thread_name_prefix="kuai-dl",
+    )
+    results = [result if error is None else DownloadResult(item[0], str(item[1]), "failed", 0, error)
+               for _, item, result, error in outcomes]
+    return [results[unique[key]] for key in keys]
+
+
+# ---- 批量任务的媒体下载 ----
+
+# 任务信息字段 -> (文件名后缀, 默认扩展名)
+MEDIA_FIELDS = (
+    ("video_url", "", ".mp4"),
+    ("gif_url", "", ".gif"),
+    ("thumbnail_url", "_thumbnail", ".jpg"),
+)
+
+
+def media_targets(task_info: Dict, output_dir, output_prefix: str) -> List[Tuple[str, str, Path]]:
+    """任务信息中的媒体 URL -> [(字段, url, 目标路径)]；视频保存为 <output_prefix>.mp4"""
+    targets = []
+    for field, suffix, default_ext in MEDIA_FIELDS:
+        url = task_info.get(field)
+        if not url:
+            continue
+        ext = os.path.splitext(urlparse(url).path)[1].lower() if field != "video_url" else ""
+        targets.append((field, url, Path(output_dir) / f"{output_prefix}{suffix}{ext or default_ext}"))
+    return targets
+
+
+class BatchDownloader:
+    """批量处理器的下载流水线
+
+    submit() 立即返回，下载在后台线程池中进行；close() 等待全部下载完成，
+    返回 [(tag, DownloadResult)]（按提交顺序）。
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: float = 180, label: str = "Download"):
+        self.timeout = timeout
+        self.label = label
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="kuai-dl-batch")
+        self._submitted: List[Tuple[Any, Future]] = []
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url: str, dest, tag: Any = None) -> Future:
+        """提交下载；同一 (url, dest) 已在队列中时复用同一个下载"""
+        key = (url, str(Path(dest).resolve()))
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                get_logger(self.label).debug(f"加入下载队列: {Path(dest).name}")
+                future = self._pending[key] = self._pool.submit(download_file, url, dest, timeout=self.timeout)
+            self._submitted.append((tag, future))
+        return future
+
+    def submit_media(self, task_info: Dict, output_dir, output_prefix: str, skip_existing: bool = False) -> int:
+        """提交任务信息中的全部媒体 URL；skip_existing 时本地已有的文件不再检查远程（用于续跑时已过期的 URL）"""
+        count = 0
+        for field, url, dest in media_targets(task_info, output_dir, output_prefix):
+            if skip_existing and dest.exists():
+                task_info.setdefault("local_files", {})[field] = str(dest)
+                continue
+            self.submit(url, dest, tag=(task_info, field))
+            count += 1
+        return count
+
+    def close(self) -> List[Tuple[Any, DownloadResult]]:
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            submitted = list(self._submitted)
+        return [(tag, future.result()) for tag, future in submitted]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._pool.shutdown(wait=True)
+
+
+def apply_media_results(results: List[Tuple[Any, DownloadResult]]) -> Tuple[int, List[str]]:
+    """把 BatchDownloader.close() 的结果写回任务信息（local_files / download_errors），返回 (成功数, 错误列表)"""
+    ok, errors = 0, []
+    for (task_info, field), result in results:
+        if result.error is None:
+            task_info.setdefault("local_files", {})[field] = result.path
+            ok += 1
+        else:
+            task_info.setdefault("download_errors", {})[field] = str(result.error)
+            errors.append(f"{Path(result.path).name}: {result.error}")
+    return ok, errors
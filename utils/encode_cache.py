@@ -0,0 +1,132 @@
+"""utils/encode_cache.py - 参考图编码缓存
+
+NanoBanana 每次调用都要把参考图 tensor 转成 PIL 再编码为 JPEG/base64。批量任务里同一张
+产品参考图往往被上百行复用，这里按 (像素摘要, 格式, 质量) 缓存编码结果，相同像素只编码一次。
+
+- 像素摘要见 kuai_utils.tensor_digest；同一个 torch tensor 对象未被原地修改时直接复用摘要，不重复哈希
+- 缓存按 base64 字符串总长度限制内存（settings.ENCODE_CACHE_MAX_MB），LRU 淘汰
+- max_edge > 0 时先按比例缩小到最长边不超过 max_edge 再编码（缩放参数是缓存键的一部分）
+"""
+
+import base64
+import io
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from . import metrics
+from .kuai_utils import tensor_digest, to_pil_from_comfy
+
+# b64: base64 字符串；digest: 像素摘要（可用作其他缓存的键）
+EncodedImage = namedtuple("EncodedImage", "b64 digest")
+
+
+def fit_size(width: int, height: int, max_edge: int) -> Tuple[int, int]:
+    """按比例缩小到最长边不超过 max_edge（max_edge <= 0 或已经足够小时不变）"""
+    longest = max(width, height)
+    if max_edge <= 0 or longest <= max_edge:
+        return width, height
+    scale = max_edge / longest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class EncodeCache:
+    """按 (像素摘要, 格式, 质量) 缓存 base64 编码结果的 LRU 缓存"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[Tuple[str, str, Optional[int], int], str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # id(对象) -> (弱引用, 版本号, 摘要)
+        self._digests: Dict[int, Tuple[weakref.ref, int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, image_any) -> str:
+        """计算像素摘要；同一对象且未被原地修改（torch 的 _version 不变）时复用上次结果"""
+        version = getattr(image_any, "_version", None)
+        if version is None:
+            # 只有 torch tensor 带版本号，其他类型无法判断是否被修改，每次重新计算
+            return tensor_digest(image_any)
+        key = id(image_any)
+        with self._lock:
+            memo = self._digests.get(key)
+            if memo is not None and memo[0]() is image_any and memo[1] == version:
+                return memo[2]
+        digest = tensor_digest(image_any)
+        try:
+            ref = weakref.ref(image_any, lambda _r, k=key: self._digests.pop(k, None))
+        except TypeError:
+            return digest
+        with self._lock:
+            self._digests[key] = (ref, version, digest)
+        return digest
+
+    def encode(self, image_any, fmt: str = "JPEG", quality: Optional[int] = None,
+               max_edge: int = 0) -> EncodedImage:
+        """把 ComfyUI IMAGE / PIL.Image 编码为 base64（可先缩小到 max_edge），命中缓存时不再编码"""
+        digest = self.digest(image_any)
+        max_edge = max(0, int(max_edge or 0))
+        key = (digest, fmt.upper(), quality, max_edge)
+        with self._lock:
+            b64 = self._entries.get(key)
+            if b64 is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("kuai_encode_cache_total", result="hit")
+                return EncodedImage(b64, digest)
+            self.misses += 1
+        metrics.inc("kuai_encode_cache_total", result="miss")
+
+        started = time.perf_counter()
+        pil_img = to_pil_from_comfy(image_any)
+        if fmt.upper() == "JPEG" and pil_img.mode != "RGB":
+            pil_img = pil_img.convert("RGB")
+        target = fit_size(pil_img.width, pil_img.height, max_edge)
+        if target != pil_img.size:
+            pil_img = pil_img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+        buffer = io.BytesIO()
+        save_kwargs = {"quality": int(quality)} if quality is not None else {}
+        pil_img.save(buffer, format=fmt.upper(), **save_kwargs)
+        b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        metrics.observe("kuai_image_encode_seconds", time.perf_counter() - started, format=fmt.upper())
+
+        with self._lock:
+            if key not in self._entries and len(b64) <= self.max_bytes:
+                self._entries[key] = b64
+                self._size += len(b64)
+                while self._size > self.max_bytes:
+                    _, old = self._entries.popitem(last=False)
+                    self._size -= len(old)
+        return EncodedImage(b64, digest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_cache: Optional[EncodeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_encode_cache() -> EncodeCache:
+    """进程内共享的编码缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from ..config import settings
+            max_mb = float(getattr(settings, "ENCODE_CACHE_MAX_MB", 256))
+            _cache = EncodeCache(int(max_mb * 1024 * 1024))
+        return _cache
+
+
+def encode_image(image_any, fmt: str = "JPEG", quality: Optional[int] = None,
+                 max_edge: int = 0) -> EncodedImage:
+    """使用共享缓存编码图像，返回 EncodedImage(b64, digest)"""
+    return get_encode_cache().encode(image_any, fmt=fmt, quality=quality, max_edge=max_edge)
@@ -0,0 +1,321 @@
+"""utils/gemini_stream.py - Gemini 响应的流式读取
+
+Gemini 把生成的图像以 base64 放在 JSON 的 inlineData.data 中，4K 图像的响应体有数十 MB。
+`resp.json()` 先整体读入，再解码成 base64 字符串、字节、PIL 图像，每个请求峰值约为图像大小的 4 倍。
+
+这里边读响应边扫描：遇到 inlineData / inline_data 的 "data" 字符串时，直接把 base64 增量解码
+写入 InlineBlob（小图在内存，大图溢出到临时文件），JSON 中只留下占位符。剩余的 JSON 骨架很小，
+按普通 JSON 解析后再把占位符替换为 InlineBlob。
+
+同时支持 generateContent（单个 JSON）和 streamGenerateContent（分块的 JSON 数组或 alt=sse 事件流）。
+流式响应的每个响应块一到达就解析出来（iter_documents），文本可以通过回调实时输出；
+遇到安全拦截（promptFeedback.blockReason 或 finishReason 为 SAFETY 等）时立即中止读取。
+多个响应块通过 merge_responses 合并为一个响应。
+"""
+
+import base64
+import json
+import re
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from . import metrics
+
+# InlineBlob 超过该大小后写入临时文件
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# 每次从响应读取的字节数
+READ_CHUNK_BYTES = 64 * 1024
+
+# JSON 对象中的 "data" 键：字符串内部的引号都带反斜杠，前一个字符是 { , 或空白时一定在字符串之外
+_DATA_KEY = re.compile(rb'(?<=[{,\s])"data"\s*:\s*"')
+# "data" 所在对象是 inlineData / inline_data
+_INLINE_CONTEXT = re.compile(rb'"inline_?[dD]ata"\s*:\s*\{[^{}]*$')
+_ESCAPES = re.compile(rb"\\[nrt]|\s")
+_PLACEHOLDER = "__kuai_inline_blob_{}__"
+_PLACEHOLDER_RE = re.compile(r"^__kuai_inline_blob_(\d+)__$")
+# 保留未输出的尾部字节，保证跨块的 "data" 键不会被切断
+_KEEP_TAIL = 32
+_CONTEXT_BYTES = 512
+
+# 表示内容被安全策略拦截的 finishReason
+BLOCK_FINISH_REASONS = {
+    "SAFETY", "PROHIBITED_CONTENT", "BLOCKLIST", "SPII", "IMAGE_SAFETY", "IMAGE_PROHIBITED_CONTENT",
+}
+
+
+class GeminiBlockedError(RuntimeError):
+    """响应被安全策略拦截"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"内容被安全策略拦截: {reason}")
+        self.reason = reason
+
+
+class InlineBlob:
+    """解码后的内联数据（图像字节），替换响应 JSON 中的 base64 字符串"""
+
+    def __init__(self):
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.size = 0
+
+    def write(self, data: bytes):
+        if data:
+            self._file.write(data)
+            self.size += len(data)
+
+    def open(self):
+        """返回定位到开头的二进制文件对象（可直接交给 PIL.Image.open）"""
+        self._file.seek(0)
+        return self._file
+
+    def read_bytes(self) -> bytes:
+        return self.open().read()
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.read_bytes()).decode("utf-8")
+
+    def close(self):
+        self._file.close()
+
+    def __repr__(self):
+        return f"<InlineBlob {self.size} bytes>"
+
+
+class InlineDataExtractor:
+    """增量扫描响应字节：内联数据解码进 InlineBlob，返回去掉内联数据的 JSON 骨架"""
+
+    def __init__(self):
+        self.blobs: List[InlineBlob] = []
+        self._pending = b""
+        self._context = b""
+        self._blob: Optional[InlineBlob] = None
+        self._b64 = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        """输入一段响应字节，返回可以确定的 JSON 骨架字节"""
+        buf = self._pending + chunk
+        self._pending = b""
+        out = bytearray()
+        while buf:
+            if self._blob is not None:
+                end = buf.find(b'"')
+                if end < 0:
+                    self._write_b64(buf)
+                    break
+                self._write_b64(buf[:end])
+                self._finish_blob()
+                out += _PLACEHOLDER.format(len(self.blobs) - 1).encode("ascii") + b'"'
+                buf = buf[end + 1:]
+                continue
+
+            match = _DATA_KEY.search(buf)
+            while match is not None:
+                context = (self._context + bytes(out) + buf[:match.start()])[-_CONTEXT_BYTES:]
+                if _INLINE_CONTEXT.search(context):
+                    break
+                match = _DATA_KEY.search(buf, match.end())
+            if match is None:
+                keep = min(len(buf), _KEEP_TAIL)
+                out += buf[:len(buf) - keep]
+                self._pending = buf[len(buf) - keep:]
+                break
+            out += buf[:match.end()]
+            buf = buf[match.end():]
+            self._blob = InlineBlob()
+
+        self._context = (self._context + bytes(out))[-_CONTEXT_BYTES:]
+        return bytes(out)
+
+    def close(self) -> bytes:
+        """响应读取结束，返回剩余的骨架字节"""
+        rest, self._pending = self._pending, b""
+        if self._blob is not None:
+            raise ValueError("响应在内联数据中途结束")
+        return rest
+
+    def _write_b64(self, data: bytes):
+        data = self._b64 + data
+        # 末尾单个反斜杠属于下一块中的转义序列
+        if data.endswith(b"\\") and not data.endswith(b"\\\\"):
+            self._b64 = b"\\"
+            data = data[:-1]
+        else:
+            self._b64 = b""
+        data = _ESCAPES.sub(b"", data.replace(b"\\/", b"/"))
+        usable = len(data) - len(data) % 4
+        self._blob.write(base64.b64decode(data[:usable]))
+        self._b64 = data[usable:] + self._b64
+
+    def _finish_blob(self):
+        rest = _ESCAPES.sub(b"", self._b64.replace(b"\\/", b"/"))
+        if rest:
+            self._blob.write(base64.b64decode(rest + b"=" * (-len(rest) % 4)))
+        self._b64 = b""
+        self.blobs.append(self._blob)
+        self._blob = None
+
+    def attach(self, node):
+        """把解析后 JSON 中的占位符替换为 InlineBlob"""
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "data" and isinstance(value, str):
+                    m = _PLACEHOLDER_RE.match(value)
+                    if m:
+                        node[key] = self.blobs[int(m.group(1))]
+                        continue
+                self.attach(value)
+        elif isinstance(node, list):
+            for value in node:
+                self.attach(value)
+        return node
+
+
+class DocumentFramer:
+    """把 JSON 骨架字节切分为完整的响应块：单个 JSON 对象、JSON 数组中的对象或 SSE 事件"""
+
+    def __init__(self):
+        self._mode: Optional[str] = None
+        self._buf = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._start = 0
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buf += data
+        if self._mode is None:
+            head = bytes(self._buf).lstrip()
+            if not head:
+                return []
+            self._mode = "json" if head[:1] in (b"[", b"{") else "sse"
+        return self._feed_json() if self._mode == "json" else self._feed_sse(final=False)
+
+    def close(self) -> List[bytes]:
+        if self._mode == "sse":
+            return self._feed_sse(final=True)
+        if self._depth:
+            raise ValueError("响应不完整：JSON 未结束")
+        return []
+
+    def _feed_json(self) -> List[bytes]:
+        docs = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif c == 0x5C:  # \\
+                    self._escape = True
+                elif c == 0x22:  # "
+                    self._in_str = False
+            elif c == 0x22:
+                self._in_str = True
+            elif c == 0x7B:  # {
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif c == 0x7D:  # }
+                self._depth -= 1
+                if self._depth == 0:
+                    docs.append(bytes(buf[self._start:i + 1]))
+            i += 1
+        # 丢弃已输出的部分，只保留未结束的响应块
+        keep = self._start if self._depth else i
+        del buf[:keep]
+        self._start = 0
+        self._pos = i - keep
+        return docs
+
+    def _feed_sse(self, final: bool) -> List[bytes]:
+        text = bytes(self._buf).replace(b"\r\n", b"\n")
+        events = text.split(b"\n\n")
+        rest = b"" if final else events.pop()
+        self._buf = bytearray(rest)
+        docs = []
+        for event in events:
+            lines = [line[5:].lstrip() for line in event.split(b"\n") if line.startswith(b"data:")]
+            payload = b"\n".join(lines).strip()
+            if payload and payload != b"[DONE]":
+                docs.append(payload)
+        return docs
+
+
+def block_reason(doc: Dict[str, Any]) -> str:
+    """返回响应块中的安全拦截原因，未拦截返回空字符串"""
+    reason = (doc.get("promptFeedback") or {}).get("blockReason")
+    if reason:
+        return str(reason)
+    for cand in doc.get("candidates") or []:
+        if cand.get("finishReason") in BLOCK_FINISH_REASONS:
+            return str(cand["finishReason"])
+    return ""
+
+
+def iter_documents(resp, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[Dict[str, Any]]:
+    """边读边解析响应块，每个块一完整就返回（内联数据为 InlineBlob）"""
+    extractor = InlineDataExtractor()
+    framer = DocumentFramer()
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        if chunk:
+            for raw in framer.feed(extractor.feed(chunk)):
+                yield extractor.attach(json.loads(raw.decode("utf-8")))
+    for raw in framer.feed(extractor.close()) + framer.close():
+        yield extractor.attach(json.loads(raw.decode("utf-8")))
+
+
+def merge_responses(docs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """把流式响应块合并为一个 generateContent 响应（parts 依次拼接，相邻文本合并）"""
+    merged: Dict[str, Any] = {}
+    candidate: Dict[str, Any] = {}
+    parts: List[Dict[str, Any]] = []
+    for doc in docs:
+        if not isinstance(doc, dict):
+            continue
+        for key, value in doc.items():
+            if key != "candidates":
+                merged[key] = value
+        for cand in (doc.get("candidates") or [])[:1]:
+            for key, value in cand.items():
+                if key != "content":
+                    candidate[key] = value
+            for part in (cand.get("content") or {}).get("parts") or []:
+                if "text" in part and parts and set(parts[-1]) == {"text"} and set(part) == {"text"}:
+                    parts[-1] = {"text": parts[-1]["text"] + part["text"]}
+                else:
+                    parts.append(part)
+    if candidate or parts:
+        candidate["content"] = {"role": "model", "parts": parts}
+        merged["candidates"] = [candidate]
+    return merged
+
+
+def read_json_response(resp, on_text: Optional[Callable[[str], None]] = None,
+                       abort_on_block: bool = True, chunk_size: int = READ_CHUNK_BYTES) -> Dict[str, Any]:
+    """流式读取 Gemini 响应并返回合并后的 JSON，内联数据为 InlineBlob
+
+    - on_text: 每个响应块中的文本到达时回调（用于实时输出进度）
+    - abort_on_block: 遇到安全拦截立即停止读取并抛出 GeminiBlockedError
+    """
+    docs = []
+    started = time.perf_counter()
+    try:
+        for doc in iter_documents(resp, chunk_size):
+            if "error" in doc:
+                raise RuntimeError(f"流式响应返回错误: {json.dumps(doc['error'], ensure_ascii=False)}")
+            docs.append(doc)
+            if on_text is not None:
+                for cand in (doc.get("candidates") or [])[:1]:
+                    for part in (cand.get("content") or {}).get("parts") or []:
+                        if part.get("text"):
+                            on_text(part["text"])
+            reason = block_reason(doc)
+            if reason and abort_on_block:
+                raise GeminiBlockedError(reason)
+    finally:
+        resp.close()
+        metrics.observe("kuai_response_read_seconds", time.perf_counter() - started)
+    return merge_responses(docs)
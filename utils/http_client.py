@@ -1,25 +1,241 @@
-"""comflow/utils/http_client.py - 异步 HTTP 客户端封装"""
+"""comflow/utils/http_client.py - HTTP 传输层
+
+所有节点的 HTTP 请求都经由此模块发出：
+- 同步请求：按主机复用 requests.Session（keep-alive 连接池），批量任务不再反复握手
+- HTTP/2：settings.HTTP2 开启且安装了 httpx[http2] 时使用 httpx.Client
+- 重试：见 retry.py（指数退避 + 抖动、Retry-After、按接口的重试预算、幂等键）
+- 异步请求：fetch() 在 async_runner 的常驻事件循环中复用 aiohttp.ClientSession（可选依赖）
+- 指标：每次发送（含重试）记录总耗时、首字节耗时、响应体耗时和字节数，见 metrics.py
+超时按请求传入，不修改任何共享会话的状态。
+"""
 
-import aiohttp
 import asyncio
+import threading
+import time
+import weakref
 from typing import Any, Dict, Optional, Union
-from ComfyUI_KuAi_Power.config import settings
-from .async_runner import run_async
-
-# 模块级复用的会话（连接池）
-_session: Optional[aiohttp.ClientSession] = None
-
-def _get_session(timeout: Optional[int] = None) -> aiohttp.ClientSession:
-    """获取或创建全局复用的 ClientSession（带连接池与超时）。"""
-    global _session
-    to = aiohttp.ClientTimeout(total=timeout or settings.HTTP_TIMEOUT)
-    if _session is None or _session.closed:
-        # 使用默认连接器；如需更细的池控制可增加 limit/keepalive 等参数
-        _session = aiohttp.ClientSession(timeout=to)
-    else:
-        # 更新会话超时（若调用时传入覆盖值）
-        _session._default_timeout = to  # 使用内部属性以更新默认超时（aiohttp内部API，谨慎使用）
-    return _session
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import settings
+from . import metrics
+from .async_runner import on_shutdown, run_async, run_sync
+from .retry import RetryPolicy, REJECTED_STATUSES, call_with_retry, get_budget
+from .log import get_logger
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+log = get_logger("KuAi")
+
+_lock = threading.Lock()
+# 每个主机一个连接池
+_sessions: Dict[str, requests.Session] = {}
+_http2_clients: Dict[str, Any] = {}
+_http2_unavailable = False
+
+# 异步会话（连接池）绑定到创建它的事件循环，按循环分别复用
+_async_sessions = weakref.WeakKeyDictionary()
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _pool_size() -> int:
+    return max(1, int(getattr(settings, "HTTP_POOL_MAXSIZE", 16)))
+
+
+def get_session(url: str) -> requests.Session:
+    """获取目标主机的 requests.Session（带 keep-alive 连接池）"""
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size(), max_retries=0)
+            session.mount(key + "/", adapter)
+            _sessions[key] = session
+        return session
+
+
+def _get_http2_client(url: str):
+    """获取目标主机的 HTTP/2 客户端；不可用时返回 None"""
+    global _http2_unavailable
+    if not HAS_HTTPX or _http2_unavailable:
+        return None
+    key = _host_key(url)
+    with _lock:
+        client = _http2_clients.get(key)
+        if client is None:
+            try:
+                limits = httpx.Limits(max_connections=_pool_size(), max_keepalive_connections=_pool_size())
+                client = httpx.Client(http2=True, limits=limits)
+            except ImportError:
+                # 未安装 h2，回退到 HTTP/1.1
+                _http2_unavailable = True
+                log.warning("HTTP/2 需要安装 httpx[http2]，已回退到 HTTP/1.1")
+                return None
+            _http2_clients[key] = client
+        return client
+
+
+def default_retry_policy() -> RetryPolicy:
+    """根据全局配置构建默认重试策略"""
+    return RetryPolicy(
+        max_retries=int(getattr(settings, "HTTP_RETRY", 0)),
+        max_delay=float(getattr(settings, "HTTP_RETRY_MAX_DELAY", 30.0)),
+    )
+
+
+def _retry_exceptions():
+    excs = (requests.ConnectionError, requests.Timeout)
+    if HAS_HTTPX:
+        excs += (httpx.TransportError,)
+    return excs
+
+
+def _send(method: str, url: str, timeout, stream: bool, kwargs: Dict[str, Any]):
+    if getattr(settings, "HTTP2", False) and not stream:
+        client = _get_http2_client(url)
+        if client is not None:
+            kwargs = dict(kwargs)
+            data = kwargs.pop("data", None)
+            if isinstance(data, (str, bytes)):
+                kwargs["content"] = data
+            elif data is not None:
+                kwargs["data"] = data
+            return client.request(method, url, timeout=timeout, **kwargs)
+
+    return get_session(url).request(method, url, timeout=timeout, stream=stream, **kwargs)
+
+
+def _body_size(kwargs: Dict[str, Any]) -> int:
+    data = kwargs.get("data")
+    return len(data) if isinstance(data, (str, bytes, bytearray)) else 0
+
+
+def _observed_send(method: str, url: str, timeout, stream: bool, kwargs: Dict[str, Any]):
+    """发送一次请求并记录指标；首字节耗时取 response.elapsed（发出请求到解析完响应头）"""
+    if not metrics.enabled():
+        return _send(method, url, timeout, stream, kwargs)
+    labels = metrics.http_labels(method, url)
+    started = time.perf_counter()
+    try:
+        resp = _send(method, url, timeout, stream, kwargs)
+    except Exception:
+        metrics.observe("kuai_http_request_seconds", time.perf_counter() - started, status="error", **labels)
+        raise
+    total = time.perf_counter() - started
+    metrics.observe("kuai_http_request_seconds", total, status=str(resp.status_code), **labels)
+    sent = _body_size(kwargs)
+    if sent:
+        metrics.inc("kuai_http_sent_bytes_total", sent, **labels)
+    try:
+        ttfb = resp.elapsed.total_seconds()
+    except (AttributeError, RuntimeError):
+        ttfb = None
+    if ttfb is not None:
+        metrics.observe("kuai_http_ttfb_seconds", ttfb, **labels)
+        if not stream:
+            metrics.observe("kuai_http_body_seconds", max(0.0, total - ttfb), **labels)
+    if not stream:
+        metrics.inc("kuai_http_received_bytes_total", len(resp.content), **labels)
+    return resp
+
+
+def request(method: str, url: str, timeout: Optional[float] = None, stream: bool = False,
+            retry: Union[RetryPolicy, bool, None] = None, idempotency_key: str = "", **kwargs):
+    """发送同步 HTTP 请求，返回 requests.Response（HTTP/2 时为兼容的 httpx.Response）。
+
+    - timeout: 本次请求超时（秒），默认 settings.HTTP_TIMEOUT
+    - stream: 流式读取响应体（始终走 requests 连接池）
+    - retry: 重试策略；None 使用默认策略（settings.HTTP_RETRY），False 不重试
+    - idempotency_key: 幂等键，作为 Idempotency-Key 请求头发送；带幂等键的 POST
+      在网络错误 / 5xx 时可安全重试，不会产生重复的付费任务
+    - 其余参数与 requests.request 一致（headers / params / data / json / files）
+    """
+    method = method.upper()
+    if timeout is None:
+        timeout = settings.HTTP_TIMEOUT
+    if idempotency_key:
+        kwargs["headers"] = dict(kwargs.get("headers") or {}, **{"Idempotency-Key": idempotency_key})
+
+    if retry is False:
+        return _observed_send(method, url, timeout, stream, kwargs)
+
+    policy = retry if isinstance(retry, RetryPolicy) else default_retry_policy()
+    idempotent = method in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE") or bool(idempotency_key)
+
+    # 文件对象在重试前需要回到起点
+    files = kwargs.get("files") or {}
+    attempts = [0]
+
+    def send():
+        for spec in files.values():
+            fileobj = spec[1] if isinstance(spec, tuple) else spec
+            if hasattr(fileobj, "seek"):
+                fileobj.seek(0)
+        if attempts[0]:
+            metrics.inc("kuai_http_retries_total", **metrics.http_labels(method, url))
+        attempts[0] += 1
+        return _observed_send(method, url, timeout, stream, kwargs)
+
+    return call_with_retry(
+        send, policy,
+        budget=get_budget(url, ratio=float(getattr(settings, "HTTP_RETRY_BUDGET_RATIO", 0.2))),
+        idempotent=idempotent,
+        retry_exceptions=_retry_exceptions(),
+        describe=f"{method} {url}",
+    )
+
+
+def get(url: str, **kwargs):
+    """GET 请求（参数同 request）"""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs):
+    """POST 请求（参数同 request）"""
+    return request("POST", url, **kwargs)
+
+
+def _get_session():
+    """获取或创建当前事件循环复用的 aiohttp.ClientSession（带连接池）。"""
+    if aiohttp is None:
+        raise RuntimeError("异步请求需要安装 aiohttp")
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=_pool_size(), keepalive_timeout=30)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.HTTP_TIMEOUT),
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+async def _close_sessions():
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+on_shutdown(_close_sessions)
+
 
 async def fetch(
     url: str,
@@ -33,34 +249,49 @@ async def fetch(
     - method: GET/POST/PUT/DELETE
     - headers: 可选请求头（可包含认证，如 Authorization）
     - json/data: 二者选其一，json 优先
-    - timeout: 覆盖默认超时（秒）
-    - 重试：基于 settings.HTTP_RETRY，遇到网络错误/超时进行重试
+    - timeout: 覆盖默认超时（秒），仅作用于本次请求
+    - 重试：与同步 request() 规则相同——基于 settings.HTTP_RETRY 按指数退避 + 抖动重试，
+      429/503 遵循 Retry-After；网络错误和 5xx 只对幂等请求（GET 等，或带 Idempotency-Key
+      请求头的 POST）重试；受按接口的重试预算限制
     """
-    session = _get_session(timeout)
-    attempts = max(0, int(getattr(settings, "HTTP_RETRY", 0))) + 1
-    last_err: Optional[Exception] = None
+    session = _get_session()
+    method = method.upper()
+    request_timeout = aiohttp.ClientTimeout(total=timeout or settings.HTTP_TIMEOUT)
+    policy = default_retry_policy()
+    budget = get_budget(url, ratio=float(getattr(settings, "HTTP_RETRY_BUDGET_RATIO", 0.2)))
+    idempotent = (method in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+                  or any(key.lower() == "idempotency-key" for key in (headers or {})))
+    budget.record_request()
 
-    for i in range(attempts):
+    attempt = 0
+    while True:
+        can_retry = attempt < policy.max_retries
         try:
-            async with session.request(method.upper(), url, headers=headers, json=json, data=data) as resp:
-                text = await resp.text()
-                try:
-                    return await resp.json()
-                except Exception:
-                    return text
-        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
-            last_err = e
-            # 简单退避：异步等待短暂时间（避免立即重试打爆服务）
-            if i < attempts - 1:
-                await asyncio.sleep(min(0.5 * (i + 1), 2.0))
-        except Exception as e:
-            # 其他异常不重试，直接抛出
-            raise e
-
-    # 所有重试失败，抛出最后一个错误
-    raise last_err if last_err else RuntimeError("HTTP 请求失败且无详细错误")
+            async with session.request(method, url, headers=headers, json=json, data=data,
+                                       timeout=request_timeout) as resp:
+                retryable = resp.status in policy.retry_statuses and (idempotent or resp.status in REJECTED_STATUSES)
+                if not (retryable and can_retry and budget.try_spend()):
+                    text = await resp.text()
+                    try:
+                        return await resp.json()
+                    except Exception:
+                        return text
+                delay = policy.delay_for(attempt, resp.status, resp.headers)
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            if not (idempotent and can_retry and budget.try_spend()):
+                raise
+            delay = policy.backoff(attempt)
+        metrics.inc("kuai_http_retries_total", **metrics.http_labels(method, url))
+        await asyncio.sleep(delay)
+        attempt += 1
+
 
 def fetch_async_in_thread(*args, **kwargs):
-    """在独立事件循环/线程中执行 fetch 并返回任务对象（开发占位）。"""
+    """在常驻事件循环中执行 fetch，返回 concurrent.futures.Future。"""
     coro = fetch(*args, **kwargs)
-    return run_async(coro)
\ No newline at end of file
+    return run_async(coro)
+
+
+def fetch_sync(*args, **kwargs) -> Union[Dict[str, Any], str]:
+    """同步执行 fetch 并返回结果（供同步节点调用）。"""
+    return run_sync(fetch(*args, **kwargs))
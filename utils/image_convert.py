@@ -0,0 +1,142 @@
+"""utils/image_convert.py - ComfyUI IMAGE 与图片之间的转换
+
+ComfyUI 的 IMAGE 是 [B, H, W, C] 的 float32（0~1）。旧的转换写法
+`np.clip(arr * 255.0, 0, 255).astype(np.uint8)` 和 `np.array(pil).astype(np.float32) / 255.0`
+每一步都会分配一份整图大小的临时数组，4K 图像每次转换多出数百 MB 的瞬时内存。
+
+这里的实现：
+- 一次分配输出（uint8 或 float32），按行分块在固定大小（约 4MB）的临时缓冲上原地计算
+- CPU 上的 torch tensor 通过 .numpy() 共享内存读取，不做额外拷贝
+- 解码 PNG/JPEG 字节时直接写入预先分配的 torch tensor
+- 整个 [B, H, W, C] 批次一次转换
+结果与旧写法逐像素一致（截断取整）。未安装 torch 时返回 numpy 数组。
+"""
+
+import io
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+# 分块时每块的元素数（float32 约 4MB）
+CHUNK_ELEMENTS = 1 << 20
+
+
+def as_numpy(image_any) -> np.ndarray:
+    """取得图像数据的 numpy 视图（CPU tensor 共享内存，不拷贝）"""
+    if isinstance(image_any, np.ndarray):
+        return image_any
+    if isinstance(image_any, Image.Image):
+        return np.asarray(image_any)
+    if torch is not None and isinstance(image_any, torch.Tensor):
+        return image_any.detach().cpu().numpy()
+    return np.asarray(image_any)
+
+
+def _rows(arr: np.ndarray) -> np.ndarray:
+    """把 [..., W, C] 视为二维的行数组（连续数组时是视图）"""
+    row = arr.shape[-2] * arr.shape[-1] if arr.ndim >= 3 else arr.shape[-1]
+    return arr.reshape(-1, max(1, row))
+
+
+def float_to_uint8(arr: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """0~1 浮点图像 → uint8（×255、裁剪、截断），分块原地计算"""
+    if arr.dtype == np.uint8:
+        if out is None:
+            return arr
+        np.copyto(out, arr)
+        return out
+    if out is None:
+        out = np.empty(arr.shape, dtype=np.uint8)
+    src, dst = _rows(arr), _rows(out)
+    step = max(1, CHUNK_ELEMENTS // src.shape[1])
+    scratch = np.empty((min(step, src.shape[0]), src.shape[1]), dtype=np.float32)
+    for start in range(0, src.shape[0], step):
+        stop = min(start + step, src.shape[0])
+        buf = scratch[:stop - start]
+        np.multiply(src[start:stop], np.float32(255.0), out=buf, casting="unsafe")
+        np.clip(buf, 0, 255, out=buf)
+        np.copyto(dst[start:stop], buf, casting="unsafe")
+    return out
+
+
+def uint8_to_float(arr: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """uint8 图像 → 0~1 float32，直接写入输出数组，不产生中间数组"""
+    if out is None:
+        out = np.empty(arr.shape, dtype=np.float32)
+    np.divide(arr, np.float32(255.0), out=out, casting="unsafe")
+    return out
+
+
+def _empty_image(shape):
+    """分配 float32 输出：有 torch 时为 tensor，返回 (结果, 共享内存的 numpy 视图)"""
+    if torch is not None:
+        tensor = torch.empty(shape, dtype=torch.float32)
+        return tensor, tensor.numpy()
+    arr = np.empty(shape, dtype=np.float32)
+    return arr, arr
+
+
+def pil_to_tensor(pil_image: Image.Image):
+    """PIL 图像 → [1, H, W, 3] float32 IMAGE"""
+    if pil_image.mode != "RGB":
+        pil_image = pil_image.convert("RGB")
+    pixels = np.asarray(pil_image)
+    result, view = _empty_image((1,) + pixels.shape)
+    uint8_to_float(pixels, out=view[0])
+    return result
+
+
+def pils_to_tensor(pil_images: List[Image.Image]):
+    """多张同尺寸 PIL 图像 → [B, H, W, 3] float32 IMAGE（一次分配）"""
+    if not pil_images:
+        raise ValueError("图像列表为空")
+    pil_images = [p if p.mode == "RGB" else p.convert("RGB") for p in pil_images]
+    w, h = pil_images[0].size
+    result, view = _empty_image((len(pil_images), h, w, 3))
+    for i, pil_image in enumerate(pil_images):
+        if pil_image.size != (w, h):
+            raise ValueError(f"图像尺寸不一致: {pil_image.size} != {(w, h)}")
+        uint8_to_float(np.asarray(pil_image), out=view[i])
+    return result
+
+
+def decode_to_tensor(data):
+    """解码 PNG/JPEG 等图片字节（或二进制文件对象），直接写入 [1, H, W, 3] float32 IMAGE"""
+    source = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    with metrics.span("kuai_image_decode_seconds"), Image.open(source) as pil_image:
+        return pil_to_tensor(pil_image)
+
+
+def tensor_to_uint8(images) -> np.ndarray:
+    """IMAGE（[B,H,W,C] 或 [H,W,C]）→ 同形状 uint8 数组，整批一次转换"""
+    return float_to_uint8(as_numpy(images))
+
+
+def _uint8_to_pil(arr: np.ndarray) -> Image.Image:
+    if arr.ndim == 3 and arr.shape[2] == 1:
+        arr = np.repeat(arr, 3, axis=2)
+    return Image.fromarray(arr)
+
+
+def tensor_to_pil(images, index: int = 0) -> Image.Image:
+    """IMAGE → PIL 图像（批量输入时取第 index 张，只转换这一张）"""
+    arr = as_numpy(images)
+    if arr.ndim == 4:
+        arr = arr[index]
+    return _uint8_to_pil(float_to_uint8(arr))
+
+
+def tensor_to_pil_list(images) -> List[Image.Image]:
+    """[B,H,W,C] IMAGE → PIL 图像列表"""
+    arr = tensor_to_uint8(images)
+    if arr.ndim == 3:
+        arr = arr[None]
+    return [_uint8_to_pil(frame) for frame in arr]
@@ -1,5 +1,6 @@
 import os
 import io
+import hashlib
 import typing
 import numpy as np
 import requests
@@ -12,36 +13,34 @@ def env_or(value: str, env_name: str) -> str:
     return os.environ.get(env_name, "").strip()
 
 def to_pil_from_comfy(image_any, index: int = 0) -> Image.Image:
-    """将 ComfyUI IMAGE 转换为 PIL.Image"""
+    """将 ComfyUI IMAGE 转换为 PIL.Image（批量输入只转换第 index 张）"""
+    if isinstance(image_any, Image.Image):
+        return image_any
+    from .image_convert import as_numpy, tensor_to_pil
     try:
-        import torch
-        is_torch = True
+        arr = as_numpy(image_any)
     except Exception:
-        is_torch = False
+        raise ValueError("无法将输入转换为 PIL.Image")
+    if arr.dtype == object or arr.ndim < 2:
+        raise ValueError("无法将输入转换为 PIL.Image")
+    return tensor_to_pil(arr, index)
 
-    arr = image_any
-    if is_torch:
-        import torch
-        if isinstance(arr, torch.Tensor):
-            if arr.dim() == 4:
-                arr = arr[index]
-            arr = arr.detach().cpu().numpy()
+def tensor_digest(image_any) -> str:
+    """按像素内容计算图像摘要（包含形状和数据类型），用于缓存键。
 
-    if isinstance(arr, np.ndarray):
-        if arr.ndim == 4:
-            arr = arr[index]
-        if arr.dtype != np.uint8:
-            arr = np.clip(arr * 255.0, 0, 255).astype(np.uint8)
-        if arr.ndim == 3 and arr.shape[2] in (1, 3, 4):
-            if arr.shape[2] == 1:
-                arr = np.repeat(arr, 3, axis=2)
-            return Image.fromarray(arr)
-        return Image.fromarray(arr)
-
-    if isinstance(arr, Image.Image):
-        return arr
-
-    raise ValueError("无法将输入转换为 PIL.Image")
+    接受 torch.Tensor / np.ndarray / PIL.Image；内容相同的图像得到相同摘要。
+    """
+    if isinstance(image_any, Image.Image):
+        arr = np.asarray(image_any)
+    elif isinstance(image_any, np.ndarray):
+        arr = image_any
+    else:
+        arr = image_any.detach().cpu().numpy()
+    arr = np.ascontiguousarray(arr)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{arr.shape}|{arr.dtype}|".encode("ascii"))
+    h.update(memoryview(arr).cast("B"))
+    return h.hexdigest()
 
 def save_image_to_buffer(pil: Image.Image, fmt: str, quality: int) -> io.BytesIO:
     """保存 PIL 到内存缓冲"""
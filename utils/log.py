@@ -0,0 +1,248 @@
+"""utils/log.py - 结构化日志与批量进度汇总
+
+批量处理器原来每行打印多行明细和分隔线，NanoBanana 每次调用都打印种子；几千行的批量任务中，
+控制台 I/O 会拖慢工作线程，输出也无法检索。
+
+- get_logger(tag) 返回 "kuai.<tag>" logger，文本格式与原来的 print 一致："[tag] 消息"
+- 工作线程只把记录放入队列（不做格式化和 I/O），由单独的监听线程格式化并写出
+- KUAI_LOG_LEVEL（默认 INFO）：逐行 / 逐次调用 / 逐次轮询的明细为 DEBUG，默认不输出
+- KUAI_LOG_FORMAT=json：每条记录输出一行 JSON（时间、级别、标签、消息，以及 extra={"fields": {...}} 中的字段）
+- KUAI_LOG_FILE：同时写入该文件
+- ProgressReporter：批量任务按间隔（KUAI_LOG_PROGRESS_SEC，默认 10 秒）输出一条进度汇总
+  （完成 / 失败 / 跳过、行/秒、进行中、预计剩余时间），代替逐行输出
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+ROOT_LOGGER = "kuai"
+RED = "\033[91m"
+RESET = "\033[0m"
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """入队前只合并消息参数；格式化（时间、JSON、异常堆栈）在监听线程中完成"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """写入当前的 sys.stdout（ComfyUI 会替换 stdout 以在前端显示日志）"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def _tag(record) -> str:
+    return record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + ".") else record.name
+
+
+class TextFormatter(logging.Formatter):
+    """"[tag] 消息"；终端中 WARNING 以上标红"""
+
+    def __init__(self, color: bool = False):
+        super().__init__()
+        self.color = color
+
+    def format(self, record):
+        text = f"[{_tag(record)}] {record.getMessage()}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        if self.color and record.levelno >= logging.WARNING:
+            text = f"{RED}{text}{RESET}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "tag": _tag(record),
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            data.update(fields)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _level() -> int:
+    name = os.environ.get("KUAI_LOG_LEVEL", "INFO").strip().upper()
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def configure(force: bool = False) -> logging.Logger:
+    """按环境变量配置 "kuai" logger（只执行一次；force=True 时按当前环境变量重新配置）"""
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    with _setup_lock:
+        if _listener is not None and not force:
+            return root
+        if _listener is not None:
+            _listener.stop()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+
+        as_json = os.environ.get("KUAI_LOG_FORMAT", "").strip().lower() == "json"
+        console = _StdoutHandler()
+        console.setFormatter(JsonFormatter() if as_json else TextFormatter(color=_isatty()))
+        handlers = [console]
+        log_file = os.environ.get("KUAI_LOG_FILE", "").strip()
+        if log_file:
+            file_handler = logging.FileHandler(log_file, encoding="utf-8")
+            file_handler.setFormatter(JsonFormatter() if as_json else TextFormatter())
+            handlers.append(file_handler)
+
+        records = queue.SimpleQueue()
+        root.addHandler(_EnqueueHandler(records))
+        root.setLevel(_level())
+        # 不传给根 logger，避免与 ComfyUI 自己的日志配置重复输出
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(records, *handlers)
+        _listener.start()
+    return root
+
+
+def _isatty() -> bool:
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def flush():
+    """等待队列中的记录全部写出（停止后重新启动监听线程）"""
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+@atexit.register
+def _shutdown():
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+def get_logger(tag: str) -> logging.Logger:
+    """获取 "kuai.<tag>" logger"""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{tag}")
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{secs:02d}s" if minutes else f"{secs}s"
+
+
+class ProgressReporter:
+    """批量任务进度汇总：每隔 interval 秒最多输出一条 INFO 日志
+
+        progress = ProgressReporter(log, total=len(tasks))
+        progress.start()                   # 一行开始处理
+        progress.finish(ok=True)           # 一行结束（skipped=True 表示断点续跑跳过）
+        progress.close()                   # 输出最终汇总
+
+    行/秒只统计实际处理的行（跳过的行不计入），用于估计剩余时间
+    """
+
+    def __init__(self, logger: logging.Logger, total: int, interval: Optional[float] = None,
+                 unit: str = "行", clock=time.monotonic):
+        self.logger = logger
+        self.total = int(total)
+        self.interval = float(interval if interval is not None else os.environ.get("KUAI_LOG_PROGRESS_SEC", "10"))
+        self.unit = unit
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self._last_emit = self.started_at
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, ok: bool = True, skipped: bool = False):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.done += 1
+            self.failed += 0 if ok else 1
+            self.skipped += 1 if skipped else 0
+            now = self._clock()
+            if now - self._last_emit < self.interval or self.done >= self.total:
+                return
+            self._last_emit = now
+            fields = self._fields(now)
+        self._emit("进度", fields)
+
+    def close(self) -> Dict[str, Any]:
+        """输出最终汇总并返回统计字段"""
+        with self._lock:
+            fields = self._fields(self._clock())
+        self._emit("完成", fields)
+        return fields
+
+    def _fields(self, now: float) -> Dict[str, Any]:
+        elapsed = max(1e-9, now - self.started_at)
+        processed = self.done - self.skipped
+        rate = processed / elapsed
+        remaining = max(0, self.total - self.done)
+        return {
+            "event": "progress",
+            "done": self.done,
+            "total": self.total,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "in_flight": self.in_flight,
+            "rows_per_sec": round(rate, 3),
+            "elapsed_sec": round(elapsed, 1),
+            "eta_sec": round(remaining / rate, 1) if rate > 0 and remaining else None,
+        }
+
+    def _emit(self, title: str, fields: Dict[str, Any]):
+        parts = [f"{title} {fields['done']}/{fields['total']}（失败 {fields['failed']}，跳过 {fields['skipped']}）",
+                 f"{fields['rows_per_sec']:.2f} {self.unit}/秒", f"用时 {_format_duration(fields['elapsed_sec'])}"]
+        if title == "进度":
+            parts.append(f"进行中 {fields['in_flight']}")
+            if fields["eta_sec"] is not None:
+                parts.append(f"预计剩余 {_format_duration(fields['eta_sec'])}")
+        self.logger.info(" | ".join(parts), extra={"fields": fields})
@@ -0,0 +1,392 @@
+"""utils/metrics.py - 请求级埋点与指标导出
+
+在热路径上记录耗时与计数，按 provider（API 主机）、model、endpoint 等标签聚合：
+
+- 直方图：每次 HTTP 请求（含每次重试）的总耗时、首字节耗时（连接 + 上传 + 服务端处理）、响应体下载耗时，
+  图像编码 / 解码、Gemini 响应读取、限流等待、视频任务从提交到结束的等待时间、文件下载
+- 计数器：收发字节数、轮询次数、重试次数、编码缓存命中
+
+记录一次观测只是一次加锁的字典查找和 bisect，不产生 I/O。导出方式：
+- Prometheus 文本格式：prometheus_text()；在 ComfyUI 中注册为 GET /kuai/metrics
+- JSON 快照：snapshot()；在 ComfyUI 中注册为 GET /kuai/metrics.json
+- 环境变量 KUAI_METRICS_FILE 指定文件时，每 KUAI_METRICS_INTERVAL 秒（默认 15）原子写入一次
+  （.json 后缀写 JSON 快照，否则写 Prometheus 文本，可配合 node_exporter 的 textfile collector）
+
+model 标签来自 tags() / tagged() 设置的上下文（节点在创建 / 查询任务时设置）；run_ordered 的工作线程
+和轮询线程沿用提交时的上下文。
+环境变量 KUAI_METRICS=0 关闭埋点。
+"""
+
+import atexit
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .log import get_logger
+
+log = get_logger("KuAi")
+
+# 秒；覆盖从毫秒级的编码到数十分钟的视频渲染
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   120.0, 300.0, 600.0, 1800.0)
+
+DESCRIPTIONS = {
+    "kuai_http_request_seconds": "单次 HTTP 请求耗时（每次重试单独记录；流式响应不含响应体读取）",
+    "kuai_http_ttfb_seconds": "发出请求到收到响应头的耗时（连接 + 上传 + 服务端处理）",
+    "kuai_http_body_seconds": "非流式响应体的下载耗时",
+    "kuai_http_sent_bytes_total": "请求体字节数",
+    "kuai_http_received_bytes_total": "非流式响应体字节数",
+    "kuai_http_retries_total": "HTTP 重试次数",
+    "kuai_rate_limit_wait_seconds": "限流器等待时间",
+    "kuai_image_encode_seconds": "参考图编码（缩放 + JPEG/PNG + base64）耗时，仅统计未命中缓存的编码",
+    "kuai_encode_cache_total": "参考图编码缓存命中 / 未命中次数",
+    "kuai_image_decode_seconds": "生成图像解码为 IMAGE tensor 的耗时",
+    "kuai_response_read_seconds": "Gemini 响应体流式读取与解析耗时",
+    "kuai_poll_queries_total": "视频任务轮询查询次数",
+    "kuai_task_wait_seconds": "视频任务从开始轮询到结束（完成 / 失败 / 超时）的时间",
+    "kuai_download_seconds": "媒体文件下载耗时",
+    "kuai_download_bytes_total": "媒体文件下载字节数",
+}
+
+_ENABLED = os.environ.get("KUAI_METRICS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+_tags: contextvars.ContextVar = contextvars.ContextVar("kuai_metric_tags", default=())
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+class Histogram:
+    """累计分桶直方图（Prometheus 语义：le 为上界）"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """按桶内线性插值估计分位数（与 Prometheus histogram_quantile 相同）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower, seen = 0.0, 0
+        for bound, n in zip(self.buckets, self.counts):
+            if n and seen + n >= rank:
+                return lower + (bound - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return self.buckets[-1]
+
+
+class Registry:
+    """指标注册表：以 (名称, 标签) 为键的计数器和直方图"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _collect(self):
+        """按名称和标签排序的 (计数器, 直方图副本)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, _copy(hist)) for key, hist in self._histograms.items()]
+        return counters, sorted(histograms, key=lambda item: item[0])
+
+    def snapshot(self) -> Dict[str, Any]:
+        counters, histograms = self._collect()
+        return {
+            "generated_at": time.time(),
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in counters],
+            "histograms": [{
+                "name": name, "labels": dict(labels), "count": hist.count, "sum": hist.sum,
+                "p50": hist.quantile(0.5), "p95": hist.quantile(0.95), "p99": hist.quantile(0.99),
+                "buckets": {_format_bound(bound): n for bound, n in hist.cumulative()},
+            } for (name, labels), hist in histograms],
+        }
+
+    def prometheus_text(self) -> str:
+        counters, histograms = self._collect()
+
+        lines, declared = [], set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), hist in histograms:
+            declare(name, "histogram")
+            for bound, n in hist.cumulative():
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_bound(bound)),))} {n}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    merged = dict(_tags.get())
+    merged.update(labels)
+    return tuple(sorted((k, str(v)) for k, v in merged.items() if v is not None and v != ""))
+
+
+def _copy(hist: Histogram) -> Histogram:
+    clone = Histogram(hist.buckets)
+    clone.counts, clone.sum, clone.count = list(hist.counts), hist.sum, hist.count
+    return clone
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else f"{bound:g}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+REGISTRY = Registry()
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    """计数器加 value；标签会合并当前 tags() 上下文"""
+    if _ENABLED:
+        REGISTRY.inc(name, value, **labels)
+
+
+def observe(name: str, seconds: float, **labels):
+    """记录一次观测到直方图；标签会合并当前 tags() 上下文"""
+    if _ENABLED:
+        REGISTRY.observe(name, seconds, **labels)
+
+
+def snapshot() -> Dict[str, Any]:
+    return REGISTRY.snapshot()
+
+
+def prometheus_text() -> str:
+    return REGISTRY.prometheus_text()
+
+
+# ---- 标签上下文与计时 ----
+
+class tags:
+    """在上下文中附加标签（如 model），期间记录的所有指标都带上这些标签
+
+        with metrics.tags(model=model):
+            http_client.post(...)
+    """
+
+    def __init__(self, **labels):
+        self._labels = {k: str(v) for k, v in labels.items() if v is not None and v != ""}
+        self._token = None
+
+    def __enter__(self):
+        merged = dict(_tags.get())
+        merged.update(self._labels)
+        self._token = _tags.set(tuple(merged.items()))
+        return self
+
+    def __exit__(self, *exc):
+        _tags.reset(self._token)
+
+
+def tagged(**label_args):
+    """装饰器：以调用参数的值作为标签，如 @metrics.tagged(model="model_name")"""
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            with tags(**{label: bound.arguments.get(arg) for label, arg in label_args.items()}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_tags() -> Dict[str, str]:
+    """当前上下文的标签（提交到其他线程执行的工作可据此恢复上下文）"""
+    return dict(_tags.get())
+
+
+class span:
+    """计时上下文：退出时把耗时记入直方图 name；发生异常时附加 outcome="error"
+
+        with metrics.span("kuai_image_decode_seconds"):
+            ...
+    """
+
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels["outcome"] = "error"
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+# ---- HTTP 标签 ----
+
+_MODEL_PATH = re.compile(r"^(/v1beta/models/)([^/:]+)(:\w+)$")
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w\-.]{16,}$|^\d+$")
+
+
+def http_labels(method: str, url: str) -> Dict[str, str]:
+    """provider（主机）、endpoint（路径模板）、method；Gemini 路径中的模型名作为 model 标签
+
+    API 路径（/v1、/v1beta、/api）中的 ID 段替换为 {id}；其他路径（CDN 上的媒体文件等）
+    统一记为 "other"，避免标签基数随 URL 增长
+    """
+    parts = urlsplit(url)
+    labels = {"provider": parts.hostname or "", "method": method}
+    path = parts.path or "/"
+    match = _MODEL_PATH.match(path)
+    if match:
+        labels["endpoint"] = f"{match.group(1)}{{model}}{match.group(3)}"
+        labels["model"] = match.group(2)
+    elif path.startswith(("/v1/", "/v1beta/", "/api/")):
+        labels["endpoint"] = "/".join("{id}" if _ID_SEGMENT.match(seg) else seg for seg in path.split("/"))
+    else:
+        labels["endpoint"] = "other"
+    return labels
+
+
+def provider_of(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+# ---- 导出 ----
+
+def write_file(path: str):
+    """原子写入指标文件（.json 为 JSON 快照，否则为 Prometheus 文本）"""
+    if path.endswith(".json"):
+        content = json.dumps(snapshot(), ensure_ascii=False)
+    else:
+        content = prometheus_text()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+_exporter_started = False
+
+
+def start_file_exporter(path: Optional[str] = None, interval: Optional[float] = None) -> bool:
+    """按 KUAI_METRICS_FILE / KUAI_METRICS_INTERVAL 定期写指标文件；未配置时返回 False"""
+    global _exporter_started
+    path = path or os.environ.get("KUAI_METRICS_FILE", "").strip()
+    if not path or not _ENABLED or _exporter_started:
+        return False
+    interval = float(interval or os.environ.get("KUAI_METRICS_INTERVAL", "15") or 15)
+    _exporter_started = True
+
+    def export():
+        try:
+            write_file(path)
+        except OSError as e:
+            log.warning(f"指标文件写入失败: {e}")
+
+    def loop():
+        while True:
+            time.sleep(max(1.0, interval))
+            export()
+
+    threading.Thread(target=loop, name="kuai-metrics-export", daemon=True).start()
+    atexit.register(export)
+    log.info(f"指标每 {interval:g} 秒写入: {path}")
+    return True
+
+
+def register_routes() -> bool:
+    """在 ComfyUI 服务器上注册 /kuai/metrics 与 /kuai/metrics.json；不在 ComfyUI 中运行时返回 False"""
+    # ComfyUI 在加载插件前已导入 server 模块；其他环境中不导入任何东西
+    server = sys.modules.get("server")
+    if not _ENABLED or not hasattr(server, "PromptServer"):
+        return False
+    try:
+        from aiohttp import web
+        routes = server.PromptServer.instance.routes
+    except Exception:
+        return False
+
+    @routes.get("/kuai/metrics")
+    async def _prometheus(request):
+        return web.Response(body=prometheus_text().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    @routes.get("/kuai/metrics.json")
+    async def _json(request):
+        return web.json_response(snapshot(), dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    return True
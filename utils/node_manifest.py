@@ -0,0 +1,234 @@
+"""utils/node_manifest.py - 节点清单与按需加载
+
+插件加载时 auto_register_nodes() 会导入 nodes/ 下的全部模块，连带导入 torch、numpy、PIL、requests
+以及（通过 config.py）pydantic_settings，拖慢 ComfyUI 启动。
+
+按需加载模式下，第一次启动仍然完整导入并把每个节点的静态信息（所属模块、INPUT_TYPES、INPUT_LABELS、
+RETURN_TYPES 等类属性）写入缓存目录下的 nodes_manifest.json。之后的启动只读取清单，为每个节点生成一个
+代理类注册给 ComfyUI；节点第一次执行（或调用 IS_CHANGED / VALIDATE_INPUTS）时才导入真实模块。
+
+- 清单以 nodes/、utils/ 下所有 .py 及 config.py 的大小和修改时间作为指纹，代码变化后自动重建
+- 导入失败的模块（如缺少依赖）记录在清单中，每次启动仍然立即尝试导入，安装依赖后自动恢复
+- INPUT_TYPES 依赖运行环境的节点（如列出 input 目录文件）在类上声明 DYNAMIC_INPUTS = True，
+  代理类调用 INPUT_TYPES 时会导入真实模块
+- 环境变量 KUAI_LAZY_NODES=0 关闭按需加载
+"""
+
+import copy
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from .log import get_logger
+from .paths import cache_dir
+
+log = get_logger("ComfyUI_KuAi_Power")
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = "nodes_manifest.json"
+
+# ComfyUI 按类属性读取的可选钩子，真实类定义了才在代理类上生成
+HOOKS = ("IS_CHANGED", "VALIDATE_INPUTS", "check_lazy_status")
+
+_load_lock = threading.Lock()
+
+
+def lazy_enabled() -> bool:
+    return os.environ.get("KUAI_LAZY_NODES", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def fingerprint(root: Path) -> str:
+    """nodes/、utils/ 下所有 .py 及 config.py 的 (路径, 大小, 修改时间) 摘要"""
+    digest = hashlib.sha1(f"{MANIFEST_VERSION}:{sys.version}".encode())
+    files = [root / "config.py"]
+    for sub in ("nodes", "utils"):
+        files.extend(sorted((root / sub).rglob("*.py")))
+    for path in files:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        digest.update(f"{path.relative_to(root)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+# ---- JSON 编码（保留元组，RETURN_TYPES 和 INPUT_TYPES 中的 (类型, 选项) 都是元组） ----
+
+def _encode(value):
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"无法写入清单的值: {type(value).__name__}")
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if set(value) == {"__tuple__"}:
+            return tuple(_decode(v) for v in value["__tuple__"])
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+def _hook_params(func):
+    """钩子方法的参数列表 [(名称, 种类, 默认值)]；ComfyUI 会按 VALIDATE_INPUTS 的参数名决定传入哪些输入"""
+    params = []
+    for param in inspect.signature(func).parameters.values():
+        default = None if param.default is inspect.Parameter.empty else {"value": _encode(param.default)}
+        params.append([param.name, int(param.kind), default])
+    return params
+
+
+def _hook_signature(params) -> inspect.Signature:
+    cls_param = inspect.Parameter("cls", inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    return inspect.Signature([cls_param] + [
+        inspect.Parameter(name, inspect._ParameterKind(kind),
+                          default=inspect.Parameter.empty if default is None else _decode(default["value"]))
+        for name, kind, default in params
+    ])
+
+
+def describe_class(cls) -> Dict[str, Any]:
+    """提取节点类的静态信息；INPUT_TYPES 无法序列化时按动态节点处理"""
+    attrs = {}
+    for name in dir(cls):
+        if not name.isupper() or name.startswith("_"):
+            continue
+        value = getattr(cls, name)
+        if callable(value):
+            continue
+        try:
+            attrs[name] = _encode(value)
+        except TypeError:
+            continue
+    entry = {
+        "attrs": attrs,
+        "hooks": {},
+        "dynamic": bool(getattr(cls, "DYNAMIC_INPUTS", False)),
+    }
+    for hook in HOOKS:
+        if hasattr(cls, hook):
+            try:
+                entry["hooks"][hook] = _hook_params(getattr(cls, hook))
+            except (TypeError, ValueError):
+                entry["hooks"][hook] = None
+    if not entry["dynamic"]:
+        try:
+            entry["input_types"] = _encode(cls.INPUT_TYPES())
+        except Exception:
+            entry["dynamic"] = True
+    if hasattr(cls, "INPUT_LABELS"):
+        try:
+            entry["input_labels"] = _encode(cls.INPUT_LABELS())
+        except Exception:
+            pass
+    return entry
+
+
+def build_manifest(root: Path, classes: Dict[str, type], modules: Dict[str, str],
+                   display_names: Dict[str, str], failed: Sequence[str] = ()) -> Dict[str, Any]:
+    nodes = {}
+    for name, cls in classes.items():
+        # 代理类直接沿用已有条目，不触发真实模块的导入
+        entry = getattr(cls, "_manifest_entry", None) or describe_class(cls)
+        entry["module"] = modules[name]
+        entry["display_name"] = display_names.get(name, name)
+        nodes[name] = entry
+    return {"fingerprint": fingerprint(root), "nodes": nodes, "failed": list(failed)}
+
+
+def manifest_path() -> Path:
+    return cache_dir() / MANIFEST_FILENAME
+
+
+def load_manifest(root: Path) -> Optional[Dict[str, Any]]:
+    """读取清单；不存在、损坏或指纹不一致时返回 None"""
+    try:
+        with open(manifest_path(), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("fingerprint") != fingerprint(root) or not (manifest.get("nodes") or manifest.get("failed")):
+        return None
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Any]):
+    path = manifest_path()
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# ---- 代理类 ----
+
+class ModuleLoader:
+    """按模块导入真实节点类，同一个模块只导入一次"""
+
+    def __init__(self, package: str):
+        self.package = package
+        self._classes: Dict[str, Dict[str, type]] = {}
+
+    def load(self, module: str, name: str) -> type:
+        with _load_lock:
+            if module not in self._classes:
+                mod = importlib.import_module(module, package=self.package)
+                self._classes[module] = dict(getattr(mod, "NODE_CLASS_MAPPINGS", {}))
+                log.info(f"按需加载 {module.lstrip('.')}（{len(self._classes[module])} 个节点）")
+            return self._classes[module][name]
+
+
+def make_proxy(name: str, entry: Dict[str, Any], loader: Callable[[str, str], type]) -> type:
+    """根据清单条目生成代理类：静态信息来自清单，执行时委托给真实节点"""
+    module = entry["module"]
+
+    def real_class():
+        return loader(module, name)
+
+    namespace = {key: _decode(value) for key, value in entry["attrs"].items()}
+    namespace["__doc__"] = f"{name}（按需加载代理）"
+    namespace["_manifest_entry"] = entry
+
+    input_types = _decode(entry.get("input_types", {}))
+    input_labels = _decode(entry.get("input_labels", {}))
+
+    if entry.get("dynamic"):
+        namespace["INPUT_TYPES"] = classmethod(lambda cls: real_class().INPUT_TYPES())
+    else:
+        namespace["INPUT_TYPES"] = classmethod(lambda cls: copy.deepcopy(input_types))
+    if "input_labels" in entry:
+        namespace["INPUT_LABELS"] = classmethod(lambda cls: dict(input_labels))
+
+    for hook, params in entry.get("hooks", {}).items():
+        def call_hook(cls, *args, _hook=hook, **kwargs):
+            return getattr(real_class(), _hook)(*args, **kwargs)
+        if params is not None:
+            call_hook.__signature__ = _hook_signature(params)
+        namespace[hook] = classmethod(call_hook)
+
+    def __init__(self):
+        self._node = None
+
+    def __getattr__(self, item):
+        # 只有代理类上不存在的属性（FUNCTION 指向的方法等）才会走到这里
+        if item == "_node":
+            raise AttributeError(item)
+        if self._node is None:
+            self._node = real_class()()
+        return getattr(self._node, item)
+
+    namespace["__init__"] = __init__
+    namespace["__getattr__"] = __getattr__
+    return type(name, (object,), namespace)
@@ -0,0 +1,18 @@
+"""utils/paths.py - 插件本地数据目录"""
+
+import os
+from pathlib import Path
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+
+
+def cache_dir(*parts: str) -> Path:
+    """返回插件缓存目录下的子目录（不存在时创建）。
+
+    默认位于插件目录下的 .cache/，可通过环境变量 KUAI_CACHE_DIR 覆盖。
+    """
+    base = os.environ.get("KUAI_CACHE_DIR", "").strip()
+    path = Path(base).expanduser() if base else PLUGIN_ROOT / ".cache"
+    path = path.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,162 @@
+"""utils/poll_schedule.py - 自适应轮询间隔
+
+根据本地记录的历史渲染耗时（按 模型 + 时长 分组）估计任务的完成窗口：
+窗口之前稀疏轮询，窗口之内密集轮询，超出窗口后回落到基础间隔。
+没有足够历史数据时与固定间隔轮询完全一致。
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .log import get_logger
+from .paths import cache_dir
+
+# 尚未开始渲染的状态，不进入密集轮询
+QUEUED_STATUSES = ("queued", "pending", "not_start", "submitted")
+
+MIN_SAMPLES = 3
+MAX_SAMPLES = 50
+
+
+def stats_key(model: str, duration: Any = "") -> str:
+    """统计分组键，例如 "sora-2-pro-all|25" """
+    model = str(model or "").strip()
+    duration = str(duration or "").strip()
+    return f"{model}|{duration}" if duration else model
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class RenderTimeStats:
+    """按分组记录已完成任务的渲染耗时，并持久化到本地 JSON 文件"""
+
+    def __init__(self, path: Optional[str] = None, max_samples: int = MAX_SAMPLES):
+        self.path = path or str(cache_dir() / "render_times.json")
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = self._load()
+
+    def _load(self) -> Dict[str, List[float]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {k: [float(x) for x in v] for k, v in data.items() if isinstance(v, list)}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._samples, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def record(self, key: str, seconds: float):
+        """记录一次完成耗时（秒）"""
+        if not key or seconds <= 0:
+            return
+        with self._lock:
+            samples = self._samples.setdefault(key, [])
+            samples.append(round(float(seconds), 1))
+            del samples[:-self.max_samples]
+            try:
+                self._save()
+            except OSError as e:
+                get_logger("KuAi").warning(f"保存渲染耗时统计失败: {e}")
+
+    def window(self, key: str) -> Optional[Tuple[float, float]]:
+        """返回预计完成窗口 (p10, p90)；样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, []))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return (_quantile(samples, 0.1), _quantile(samples, 0.9))
+
+
+def _progress(data: Optional[Dict[str, Any]]) -> Optional[float]:
+    """提取服务端返回的进度百分比（若有）"""
+    if not isinstance(data, dict):
+        return None
+    detail = data.get("detail") if isinstance(data.get("detail"), dict) else {}
+    for value in (data.get("progress"), detail.get("progress_pct"), detail.get("progress")):
+        try:
+            p = float(str(value).rstrip("%"))
+        except (TypeError, ValueError):
+            continue
+        # 兼容 0-1 与 0-100 两种表示
+        p = p * 100 if 0 < p <= 1 else p
+        if 0 < p < 100:
+            return p
+    return None
+
+
+class AdaptiveSchedule:
+    """单个任务的轮询间隔策略"""
+
+    def __init__(self, base_interval: float, key: str = "", stats: Optional[RenderTimeStats] = None,
+                 min_interval: float = 3.0):
+        self.base = max(0.0, float(base_interval))
+        self.key = key
+        self.stats = stats
+        self.dense = min(self.base, max(float(min_interval), self.base / 3))
+        self.sparse = self.base * 4
+
+    def _resolve_key(self, data: Optional[Dict[str, Any]]):
+        # 查询节点不知道模型时，从响应中补全分组键
+        if not self.key and isinstance(data, dict) and data.get("model"):
+            self.key = stats_key(data.get("model"), data.get("duration") or data.get("seconds"))
+
+    def next_delay(self, elapsed: float, status: str = "", data: Optional[Dict[str, Any]] = None) -> float:
+        """根据已等待时间、任务状态与历史耗时给出下一次查询间隔（秒）"""
+        self._resolve_key(data)
+        if status in QUEUED_STATUSES:
+            return self.base
+
+        progress = _progress(data)
+        if progress is not None and elapsed > 0:
+            remaining = elapsed * (100 - progress) / progress
+            return min(max(remaining, self.dense), self.sparse)
+
+        window = self.stats.window(self.key) if (self.stats and self.key) else None
+        if window is None:
+            return self.base
+
+        lo, hi = window
+        if elapsed < lo:
+            # 窗口之前：直接等到窗口开始（单次等待不超过 sparse）
+            return min(max(lo - elapsed, self.dense), self.sparse)
+        if elapsed <= hi:
+            return self.dense
+        return self.base
+
+    def completed(self, elapsed: float):
+        """任务完成时记录耗时"""
+        if self.stats and self.key:
+            self.stats.record(self.key, elapsed)
+
+
+_stats: Optional[RenderTimeStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_render_stats() -> RenderTimeStats:
+    """获取进程内共享的渲染耗时统计"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = RenderTimeStats()
+        return _stats
+
+
+def adaptive_schedule(base_interval: float, model: str = "", duration: Any = "") -> AdaptiveSchedule:
+    """创建使用共享统计的自适应轮询策略"""
+    key = stats_key(model, duration) if model else ""
+    return AdaptiveSchedule(base_interval, key=key, stats=get_render_stats())
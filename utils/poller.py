@@ -0,0 +1,212 @@
+"""utils/poller.py - 共享视频任务轮询调度器
+
+所有等待视频任务完成的节点（Sora / Veo / Grok 及其批量处理器）都通过同一个
+TaskPoller 注册任务：调度器用最小堆维护每个任务的下次查询时间，由单个后台线程
+依次向 /v1/video/query 发起查询，并通过 Future 返回最终结果。
+提交任务时的指标标签（metrics.tags，如 model）随任务保存，轮询线程中的查询沿用这些标签。
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics
+from .poll_schedule import AdaptiveSchedule
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+# status: 最终状态（completed / failed / timeout）；data: 最后一次查询的原始响应
+PollResult = namedtuple("PollResult", "task_id status data timed_out polls elapsed")
+
+
+def default_status(data: Dict[str, Any]) -> str:
+    """从查询响应中提取任务状态（兼容 Sora 的 detail.status）"""
+    status = data.get("status")
+    if not status and isinstance(data.get("detail"), dict):
+        status = data["detail"].get("status")
+    return status or ""
+
+
+def http_query(api_base: str, api_key: str, task_id: str, timeout: int = 60) -> Dict[str, Any]:
+    """调用 /v1/video/query 查询单个任务"""
+    from . import http_client
+    from .kuai_utils import http_headers_json, raise_for_bad_status
+
+    endpoint = api_base.rstrip("/") + "/v1/video/query"
+    resp = http_client.get(endpoint, headers=http_headers_json(api_key), params={"id": task_id}, timeout=int(timeout))
+    raise_for_bad_status(resp, "Video query failed")
+    return resp.json()
+
+
+class _PollEntry:
+    """单个已注册任务的轮询状态"""
+
+    def __init__(self, task_id, api_base, api_key, poll_interval, timeout, status_fn,
+                 on_update, max_errors, request_timeout, schedule):
+        self.task_id = task_id
+        self.api_base = api_base
+        self.api_key = api_key
+        self.poll_interval = max(0.0, float(poll_interval))
+        self.started = time.monotonic()
+        self.deadline = self.started + max(0.0, float(timeout))
+        self.status_fn = status_fn or default_status
+        self.on_update = on_update
+        self.max_errors = max_errors
+        self.request_timeout = request_timeout
+        self.schedule = schedule
+        self.future: Future = Future()
+        self.polls = 0
+        self.errors = 0
+        self.last_data: Optional[Dict[str, Any]] = None
+        self.last_status = ""
+        # 在提交线程中取得，轮询线程记录指标时恢复
+        self.tags = metrics.current_tags()
+        self.tags.setdefault("provider", metrics.provider_of(api_base))
+
+
+class TaskPoller:
+    """多任务共享的轮询调度器（单工作线程 + 最小堆）"""
+
+    def __init__(self, query_fn: Optional[Callable[..., Dict[str, Any]]] = None):
+        self._query_fn = query_fn or http_query
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self,
+        task_id: str,
+        api_base: str,
+        api_key: str,
+        poll_interval: float = 15,
+        timeout: float = 1200,
+        initial_delay: float = 0.0,
+        status_fn: Optional[Callable[[Dict[str, Any]], str]] = None,
+        on_update: Optional[Callable[[str, str, Dict[str, Any], int], None]] = None,
+        max_errors: Optional[int] = 3,
+        request_timeout: int = 60,
+        schedule: Optional[AdaptiveSchedule] = None,
+    ) -> Future:
+        """注册一个任务，返回在任务结束或超时时完成的 Future[PollResult]。
+
+        - initial_delay: 首次查询前的等待时间（秒）
+        - on_update: 每次查询成功后回调 (task_id, status, data, polls)
+        - max_errors: 连续查询失败达到该次数后 Future 抛出异常；None 表示一直重试到超时
+        - schedule: 自适应轮询策略（见 poll_schedule），为空时使用固定间隔 poll_interval
+        """
+        entry = _PollEntry(task_id, api_base, api_key, poll_interval, timeout, status_fn,
+                           on_update, max_errors, request_timeout, schedule)
+        self._schedule(entry, entry.started + max(0.0, float(initial_delay)))
+        return entry.future
+
+    def pending(self) -> int:
+        """当前等待中的任务数"""
+        with self._cond:
+            return len(self._heap)
+
+    def _schedule(self, entry: _PollEntry, due: float):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._seq), entry))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="kuai-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due = self._heap[0][0]
+                    now = time.monotonic()
+                    if due > now:
+                        self._cond.wait(due - now)
+                        continue
+                    _, _, entry = heapq.heappop(self._heap)
+                    break
+
+            if entry.future.cancelled():
+                continue
+            try:
+                self._poll_once(entry)
+            except Exception as e:  # 防御：回调异常等不应终止调度线程
+                self._resolve(entry, error=e)
+
+    def _poll_once(self, entry: _PollEntry):
+        entry.polls += 1
+        try:
+            with metrics.tags(**entry.tags):
+                data = self._query_fn(entry.api_base, entry.api_key, entry.task_id, entry.request_timeout)
+        except Exception as e:
+            metrics.inc("kuai_poll_queries_total", outcome="error", **entry.tags)
+            entry.errors += 1
+            if entry.max_errors and entry.errors >= entry.max_errors:
+                self._resolve(entry, error=RuntimeError(f"查询失败: {str(e)}"))
+                return
+        else:
+            metrics.inc("kuai_poll_queries_total", outcome="ok", **entry.tags)
+            entry.errors = 0
+            entry.last_data = data
+            entry.last_status = entry.status_fn(data)
+            if entry.on_update is not None:
+                try:
+                    entry.on_update(entry.task_id, entry.last_status, data, entry.polls)
+                except Exception:
+                    pass
+            if entry.last_status in TERMINAL_STATUSES:
+                if entry.last_status == "completed" and entry.schedule is not None:
+                    entry.schedule.completed(time.monotonic() - entry.started)
+                self._resolve(entry, status=entry.last_status)
+                return
+
+        now = time.monotonic()
+        if now >= entry.deadline:
+            self._resolve(entry, status="timeout")
+            return
+        # 超时前保证最后一次查询落在截止时间点上
+        self._schedule(entry, min(now + self._next_delay(entry), entry.deadline))
+
+    def _next_delay(self, entry: _PollEntry) -> float:
+        if entry.schedule is None:
+            return entry.poll_interval
+        elapsed = time.monotonic() - entry.started
+        return entry.schedule.next_delay(elapsed, entry.last_status, entry.last_data)
+
+    def _resolve(self, entry: _PollEntry, status: str = "", error: Optional[BaseException] = None):
+        metrics.observe("kuai_task_wait_seconds", time.monotonic() - entry.started,
+                        status=status or "error", **entry.tags)
+        try:
+            if error is not None:
+                entry.future.set_exception(error)
+            else:
+                entry.future.set_result(PollResult(
+                    task_id=entry.task_id,
+                    status=status,
+                    data=entry.last_data,
+                    timed_out=(status == "timeout"),
+                    polls=entry.polls,
+                    elapsed=time.monotonic() - entry.started,
+                ))
+        except InvalidStateError:
+            # 调用方已取消
+            pass
+
+
+_poller: Optional[TaskPoller] = None
+_poller_lock = threading.Lock()
+
+
+def get_poller() -> TaskPoller:
+    """获取进程内共享的 TaskPoller"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = TaskPoller()
+        return _poller
@@ -0,0 +1,106 @@
+"""utils/rate_limit.py - 客户端令牌桶限流
+
+进程内所有节点和批量处理器共享限流器，按 (api_base, api_key, model) 分桶：
+同一个账号同一个模型的请求速率不会超过配置的配额，多个工作流同时运行也一样。
+
+- RATE_LIMIT_RPM / RATE_LIMIT_BURST：默认每分钟请求数与突发容量
+- RATE_LIMIT_MODELS：按模型覆盖，格式 "model=rpm[:burst],..."，
+  例如 "sora-2=10,gemini-3-pro-image-preview=30:3"
+- rpm <= 0 表示不限流
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from . import metrics
+from .log import get_logger
+
+log = get_logger("KuAi")
+
+
+class TokenBucket:
+    """线程安全的令牌桶。
+
+    acquire() 采用预约方式：先扣减令牌（允许为负）再在锁外等待，
+    因此并发调用方按到达顺序依次获得配额，不会互相饿死。
+    """
+
+    def __init__(self, rate: float, burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = float(rate)          # 每秒补充的令牌数
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """预约令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """阻塞直到获得令牌，返回实际等待的秒数"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+def parse_model_limits(spec: str) -> Dict[str, Tuple[float, int]]:
+    """解析 "model=rpm[:burst],..." 格式的按模型配置"""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        model, value = item.split("=", 1)
+        rpm, _, burst = value.partition(":")
+        try:
+            limits[model.strip()] = (float(rpm), int(burst) if burst.strip() else 0)
+        except ValueError:
+            log.warning(f"忽略无效的限流配置 '{item.strip()}'")
+    return limits
+
+
+_buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+_lock = threading.Lock()
+
+
+def _limits_for(model: str) -> Tuple[float, int]:
+    from ..config import settings
+
+    rpm = float(getattr(settings, "RATE_LIMIT_RPM", 0))
+    burst = int(getattr(settings, "RATE_LIMIT_BURST", 1))
+    override = parse_model_limits(getattr(settings, "RATE_LIMIT_MODELS", "")).get(model)
+    if override:
+        rpm, burst = override[0], override[1] or burst
+    return rpm, burst
+
+
+def get_limiter(api_base: str, api_key: str, model: str = "") -> TokenBucket:
+    """获取 (api_base, api_key, model) 对应的共享令牌桶"""
+    key = ((api_base or "").rstrip("/").lower(), api_key or "", model or "")
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            rpm, burst = _limits_for(key[2])
+            bucket = _buckets[key] = TokenBucket(rpm / 60.0, burst)
+        return bucket
+
+
+def throttle(api_base: str, api_key: str, model: str = "", label: Optional[str] = None) -> float:
+    """发送计费请求前调用：按配额等待，返回等待秒数"""
+    wait = get_limiter(api_base, api_key, model).acquire()
+    metrics.observe("kuai_rate_limit_wait_seconds", wait, provider=metrics.provider_of(api_base), model=model)
+    if wait >= 1.0:
+        log.debug(f"限流: {label or model or api_base} 等待 {wait:.1f} 秒")
+    return wait
@@ -0,0 +1,108 @@
+"""utils/reference_prep.py - NanoBanana 参考图预处理
+
+参考图原来以原始分辨率、PIL 默认质量编码为 JPEG 后放进请求，一次最多 14 张；6K 的产品图会让请求体
+远大于模型实际使用的分辨率。这里在编码前按模型把参考图缩小到合适的最长边，并按模型选择 JPEG 质量，
+多张参考图在线程池中并行编码（PIL 缩放和编码时会释放 GIL），最后输出本次请求节省的字节数。
+
+- 每个模型的默认 (最长边, JPEG 质量) 见 MODEL_PROFILES
+- 同时按原来的方式（原始分辨率、PIL 默认质量）编码一份作为基准：预处理结果不比基准小时（例如小图以
+  更高质量编码）直接发送基准编码，请求体不会比原来大；节省的字节数按基准编码的实际大小计算
+- settings.REFERENCE_MAX_EDGE / REFERENCE_JPEG_QUALITY 可统一覆盖（0 表示按模型默认）
+- 编码结果进入 encode_cache，批量任务中同一张参考图只处理一次
+"""
+
+import os
+from collections import namedtuple
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .concurrency import run_ordered
+from .encode_cache import encode_image, fit_size
+from .image_convert import as_numpy
+from .log import get_logger
+
+log = get_logger("NanoBanana")
+
+# 模型 -> (参考图最长边 px, JPEG 质量)
+MODEL_PROFILES = {
+    "gemini-3-pro-image-preview": (3072, 92),
+    "gemini-3.1-flash-image-preview": (2048, 90),
+    "gemini-2.5-flash-image": (1024, 88),
+}
+DEFAULT_PROFILE = (2048, 90)
+# 并行编码的线程数上限
+MAX_WORKERS = 8
+
+# b64: base64 列表（按输入顺序，失败的图像被跳过）；digests: 结果缓存使用的摘要（包含预处理参数）
+# original_bytes: 基准编码（原始分辨率、PIL 默认质量）的 base64 大小；sent_bytes: 实际发送的 base64 大小
+PreparedReferences = namedtuple("PreparedReferences", "b64 digests original_bytes sent_bytes")
+
+
+def reference_profile(model_name: str) -> Tuple[int, int]:
+    """返回模型的 (最长边, JPEG 质量)，配置项非 0 时覆盖默认值"""
+    max_edge, quality = MODEL_PROFILES.get(model_name, DEFAULT_PROFILE)
+    try:
+        from ..config import settings
+        max_edge = int(getattr(settings, "REFERENCE_MAX_EDGE", 0) or max_edge)
+        quality = int(getattr(settings, "REFERENCE_JPEG_QUALITY", 0) or quality)
+    except ImportError:
+        pass
+    return max_edge, max(1, min(quality, 95))
+
+
+def image_size(image_any) -> Tuple[int, int]:
+    """返回 (宽, 高)，不做像素转换"""
+    if isinstance(image_any, Image.Image):
+        return image_any.size
+    shape = as_numpy(image_any).shape
+    if len(shape) == 4:
+        return shape[2], shape[1]
+    return shape[1], shape[0]
+
+
+def prepare_references(images: Sequence, model_name: str,
+                       max_workers: Optional[int] = None) -> PreparedReferences:
+    """并行缩放并编码参考图，返回 PreparedReferences"""
+    images = [img for img in images if img is not None]
+    if not images:
+        return PreparedReferences([], [], 0, 0)
+    max_edge, quality = reference_profile(model_name)
+
+    def _encode(_idx, img):
+        baseline = encode_image(img, fmt="JPEG")
+        prepared = encode_image(img, fmt="JPEG", quality=quality, max_edge=max_edge)
+        return baseline, prepared
+
+    # 同一个图像对象连到多个输入时只编码一次
+    unique = list({id(img): img for img in images}.values())
+    workers = max_workers or min(len(unique), os.cpu_count() or 4, MAX_WORKERS)
+    outcomes = {id(img): (encoded, error) for _, img, encoded, error in
+                run_ordered(unique, _encode, max_in_flight=workers, thread_name_prefix="nanobanana-ref")}
+
+    b64_list: List[str] = []
+    digests: List[str] = []
+    original_bytes = sent_bytes = resized = kept = 0
+    for idx, img in enumerate(images, start=1):
+        encoded, error = outcomes[id(img)]
+        if error is not None:
+            log.warning(f"转换参考图{idx}失败: {error}")
+            continue
+        baseline, prepared = encoded
+        original_bytes += len(baseline.b64)
+        if len(prepared.b64) < len(baseline.b64):
+            width, height = image_size(img)
+            resized += fit_size(width, height, max_edge) != (width, height)
+            b64_list.append(prepared.b64)
+            digests.append(f"{prepared.digest}:{max_edge}:{quality}")
+        else:
+            kept += 1
+            b64_list.append(baseline.b64)
+            digests.append(f"{baseline.digest}:0:default")
+        sent_bytes += len(b64_list[-1])
+
+    if b64_list:
+        mb = 1024 * 1024
+        log.info(f"参考图 {len(b64_list)} 张（{resized} 张缩小到最长边 {max_edge}px，JPEG 质量 {quality}；"
+                 f"{kept} 张保留原编码）：发送 {sent_bytes / mb:.2f}MB，节省 {(original_bytes - sent_bytes) / mb:.2f}MB")
+    return PreparedReferences(b64_list, digests, original_bytes, sent_bytes)
@@ -0,0 +1,142 @@
+"""utils/result_cache.py - NanoBanana 生成结果磁盘缓存
+
+以完整请求指纹（规范化的 Gemini payload，参考图按像素内容摘要）为键，
+把生成的图像字节和文本结果保存在缓存目录中。固定种子、相同提示词 / 模型 /
+参考图 / imageConfig 的重复运行直接返回缓存结果，ComfyUI 重启后依然有效。
+
+- 每个条目两个文件：<key>.img（图像原始字节）和 <key>.json（文本结果，最后写入作为提交标记）
+- 总大小超过上限时按最近使用时间（LRU）淘汰
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .paths import cache_dir
+
+
+def request_fingerprint(api_base: str, model_name: str, payload: Dict[str, Any],
+                        reference_digests: Optional[List[str]] = None) -> str:
+    """计算请求指纹：payload 中的内联图片数据替换为像素摘要后做规范化 JSON 哈希"""
+    digests = iter(reference_digests or [])
+
+    def canonical(node):
+        if isinstance(node, dict):
+            out = {}
+            for k, v in node.items():
+                if k in ("inline_data", "inlineData") and isinstance(v, dict):
+                    data = v.get("data", "")
+                    digest = next(digests, None) or hashlib.sha256(str(data).encode("utf-8")).hexdigest()
+                    out[k] = {key: val for key, val in v.items() if key != "data"}
+                    out[k]["digest"] = digest
+                else:
+                    out[k] = canonical(v)
+            return out
+        if isinstance(node, list):
+            return [canonical(v) for v in node]
+        return node
+
+    raw = json.dumps(
+        {"api_base": (api_base or "").rstrip("/").lower(), "model": model_name, "payload": canonical(payload)},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """大小受限的磁盘 LRU 缓存（线程安全）"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.root / f"{key}.img", self.root / f"{key}.json"
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        entries = []
+        for meta_path in self.root.glob("*.json"):
+            key = meta_path.stem
+            blob_path = self._paths(key)[0]
+            try:
+                stat = meta_path.stat()
+                entries.append((stat.st_mtime, key, stat.st_size + blob_path.stat().st_size))
+            except OSError:
+                continue
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """读取缓存条目，返回 (图像字节, 文本结果)；未命中返回 None"""
+        blob_path, meta_path = self._paths(key)
+        with self._lock:
+            self._load_index()
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                blob = blob_path.read_bytes()
+            except (OSError, ValueError):
+                return None
+            # 更新最近使用时间
+            try:
+                os.utime(meta_path)
+            except OSError:
+                pass
+            if key in self._index:
+                self._index.move_to_end(key)
+            return blob, meta
+
+    def put(self, key: str, blob: bytes, meta: Dict[str, Any]):
+        """写入缓存条目并按需淘汰最久未使用的条目"""
+        if self.max_bytes <= 0:
+            return
+        blob_path, meta_path = self._paths(key)
+        meta_raw = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._load_index()
+            # 先写图像、后写文本结果：只有 .json 存在的条目才算完整
+            for path, data in ((blob_path, blob), (meta_path, meta_raw)):
+                tmp = path.with_suffix(path.suffix + ".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            self._index[key] = len(blob) + len(meta_raw)
+            self._index.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._index.values())
+        while total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            for path in self._paths(key):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            self._load_index()
+            return sum(self._index.values())
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """进程内共享的 NanoBanana 结果缓存（位于 KUAI_CACHE_DIR/nanobanana_results）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from ..config import settings
+            max_mb = float(getattr(settings, "NANOBANANA_CACHE_MAX_MB", 1024))
+            _cache = ResultCache(cache_dir("nanobanana_results"), int(max_mb * 1024 * 1024))
+        return _cache
@@ -0,0 +1,162 @@
+"""utils/retry.py - HTTP 重试策略
+
+- 指数退避 + 全抖动（full jitter），避免多个批量任务同时重试
+- 429 / 503 响应优先遵循服务端的 Retry-After
+- 按接口（主机 + 路径）维护重试预算，服务端持续故障时不会被重试放大流量
+- 非幂等请求（POST）只有携带幂等键时才会在网络错误 / 5xx 后重试；
+  429 / 503 表示请求未被处理，始终可以重试
+"""
+
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Mapping, Optional, Tuple, Type
+from urllib.parse import urlsplit
+
+from .log import get_logger
+
+log = get_logger("KuAi")
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# 服务端明确表示未处理请求的状态码
+REJECTED_STATUSES = (429, 503)
+
+
+def new_idempotency_key() -> str:
+    """生成客户端幂等键（同一逻辑请求的所有重试共用）"""
+    return uuid.uuid4().hex
+
+
+class RetryBudget:
+    """滑动窗口重试预算：窗口内重试次数不超过 min_retries + ratio × 请求数"""
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for q in (self._requests, self._retries):
+            while q and now - q[0] > self.window:
+                q.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """申请一次重试，预算不足时返回 False"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy:
+    """重试策略：最大重试次数、退避参数与可重试的状态码"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+                 retry_statuses: Tuple[int, ...] = RETRYABLE_STATUSES, max_retry_after: float = 60.0):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试（从 0 开始）的退避时间：[0, min(max_delay, base × 2^attempt)] 内随机"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def retry_after(self, headers: Optional[Mapping[str, str]]) -> Optional[float]:
+        """解析 Retry-After（秒数或 HTTP 日期）"""
+        value = (headers or {}).get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(0.0, seconds), self.max_retry_after)
+
+    def delay_for(self, attempt: int, status: Optional[int] = None,
+                  headers: Optional[Mapping[str, str]] = None) -> float:
+        if status in REJECTED_STATUSES:
+            after = self.retry_after(headers)
+            if after is not None:
+                return after
+        return self.backoff(attempt)
+
+
+_budgets: Dict[str, RetryBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def endpoint_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.netloc.lower()}{parts.path}"
+
+
+def get_budget(url: str, ratio: float = 0.2) -> RetryBudget:
+    """获取接口（主机 + 路径）对应的重试预算"""
+    key = endpoint_key(url)
+    with _budgets_lock:
+        budget = _budgets.get(key)
+        if budget is None:
+            budget = _budgets[key] = RetryBudget(ratio=ratio)
+        return budget
+
+
+def call_with_retry(
+    send: Callable[[], object],
+    policy: RetryPolicy,
+    budget: Optional[RetryBudget] = None,
+    idempotent: bool = True,
+    retry_exceptions: Tuple[Type[BaseException], ...] = (OSError,),
+    describe: str = "",
+    sleep: Callable[[float], None] = time.sleep,
+):
+    """执行 send()，按策略对网络错误和可重试状态码进行重试，返回最后一次响应。
+
+    - send: 发送一次请求并返回响应对象（需有 status_code / headers）
+    - idempotent: 请求是否可安全重放（GET 或带幂等键的 POST）
+    - retry_exceptions: 视为网络错误的异常类型
+    """
+    if budget is not None:
+        budget.record_request()
+
+    attempt = 0
+    while True:
+        try:
+            resp = send()
+        except retry_exceptions as e:
+            if not idempotent or attempt >= policy.max_retries or (budget and not budget.try_spend()):
+                raise
+            delay = policy.backoff(attempt)
+            log.warning(f"请求异常 {type(e).__name__}，{delay:.1f} 秒后重试 ({attempt + 1}/{policy.max_retries}) {describe}")
+        else:
+            status = getattr(resp, "status_code", None)
+            retryable = status in policy.retry_statuses and (idempotent or status in REJECTED_STATUSES)
+            if not retryable or attempt >= policy.max_retries or (budget and not budget.try_spend()):
+                return resp
+            delay = policy.delay_for(attempt, status, getattr(resp, "headers", None))
+            close = getattr(resp, "close", None)
+            if close is not None:
+                close()
+            log.warning(f"HTTP {status}，{delay:.1f} 秒后重试 ({attempt + 1}/{policy.max_retries}) {describe}")
+
+        sleep(delay)
+        attempt += 1